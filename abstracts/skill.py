@@ -78,7 +78,7 @@ class SkillStoreABC(ABC):
     @staticmethod
     @abstractmethod
     async def save_agent_skill_data(
-        agent_id: str, skill: str, key: str, data: Dict[str, Any]
+        agent_id: str, skill: str, key: str, data: Dict[str, Any], buffer: bool = False
     ) -> None:
         """Save or update skill data for an agent.
 
@@ -87,6 +87,8 @@ class SkillStoreABC(ABC):
             skill: Name of the skill
             key: Data key
             data: JSON data to store
+            buffer: Write it when the agent turn ends, only for data that
+                may be lost or seen late, like caches
         """
         pass
 
@@ -115,6 +117,7 @@ class SkillStoreABC(ABC):
         skill: str,
         key: str,
         data: Dict[str, Any],
+        buffer: bool = False,
     ) -> None:
         """Save or update skill data for a thread.
 
@@ -124,5 +127,7 @@ class SkillStoreABC(ABC):
             skill: Name of the skill
             key: Data key
             data: JSON data to store
+            buffer: Write it when the agent turn ends, only for data that
+                may be lost or seen late, like caches
         """
         pass
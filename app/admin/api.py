@@ -39,7 +39,7 @@ from models.agent import (
     AgentTable,
     AgentUpdate,
 )
-from models.db import get_db
+from models.db import get_replica_db
 from skills import __all__ as skill_categories
 from utils.middleware import create_jwt_middleware
 from utils.slack_alert import send_slack_message
@@ -553,7 +553,7 @@ async def update_agent(
     dependencies=[Depends(verify_jwt)],
     operation_id="get_agents",
 )
-async def get_agents(db: AsyncSession = Depends(get_db)) -> list[AgentResponse]:
+async def get_agents(db: AsyncSession = Depends(get_replica_db)) -> list[AgentResponse]:
     """Get all agents with their quota information.
 
     **Returns:**
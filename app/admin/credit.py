@@ -23,12 +23,12 @@ from models.credit import (
     CreditAccount,
     CreditAccountTable,
     CreditEvent,
-    CreditEventTable,
+    CreditRollupTable,
     Direction,
     EventType,
     OwnerType,
 )
-from models.db import get_db
+from models.db import get_db, get_replica_db
 from utils.middleware import create_jwt_middleware
 
 logger = logging.getLogger(__name__)
@@ -304,16 +304,22 @@ async def get_agent_statistics(
         + agent_account.credits
     )
 
-    # Calculate total income (sum of total_amount) and net income (sum of fee_agent_amount) at SQL level
-    # Query to get the sum of total_amount and fee_agent_amount
+    # Total income is the sum of total_amount of the events the agent earned a fee
+    # from, net income the sum of the fees. Read from the daily rollups, where
+    # agent accounts only receive fees of message and skill call events.
     stmt = (
         select(
-            func.sum(CreditEventTable.total_amount).label("total_income"),
-            func.sum(CreditEventTable.fee_agent_amount).label("net_income"),
+            func.sum(CreditRollupTable.total_amount).label("total_income"),
+            func.sum(CreditRollupTable.amount).label("net_income"),
+        )
+        .where(CreditRollupTable.account_id == agent_account.id)
+        .where(CreditRollupTable.direction == Direction.INCOME)
+        .where(
+            CreditRollupTable.event_type.in_([EventType.MESSAGE, EventType.SKILL_CALL])
         )
-        .where(CreditEventTable.fee_agent_account == agent_account.id)
-        .where(CreditEventTable.fee_agent_amount > 0)
     )
+    # on the primary with the balance, totals from a lagging replica could
+    # disagree with it
     result = await db.execute(stmt)
     row = result.first()
 
@@ -344,7 +350,7 @@ async def list_user_events(
     limit: Annotated[
         int, Query(description="Maximum number of events to return", ge=1, le=100)
     ] = 20,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> CreditEventsResponse:
     """List all events for a user account with optional event type filtering.
 
@@ -386,7 +392,7 @@ async def list_user_expense_events(
     limit: Annotated[
         int, Query(description="Maximum number of events to return", ge=1, le=100)
     ] = 20,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> CreditEventsResponse:
     """List all expense events for a user account.
 
@@ -428,7 +434,7 @@ async def list_user_income_events(
     limit: Annotated[
         int, Query(description="Maximum number of events to return", ge=1, le=100)
     ] = 20,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> CreditEventsResponse:
     """List all income events for a user account.
 
@@ -471,7 +477,7 @@ async def list_agent_income_events(
     limit: Annotated[
         int, Query(description="Maximum number of events to return", ge=1, le=100)
     ] = 20,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> CreditEventsResponse:
     """List all income events for an agent account.
 
@@ -521,6 +527,7 @@ async def fetch_credit_event(
     Raises:
         404: If the credit event is not found
     """
+    # on the primary, it is checked right after a write to stay idempotent
     return await fetch_credit_event_by_upstream_tx_id(db, upstream_tx_id)
 
 
@@ -609,7 +616,7 @@ async def list_all_credit_events(
         Optional[datetime],
         Query(description="End datetime for filtering events, exclusive"),
     ] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> CreditEventsResponse:
     """
     List all credit events for admin monitoring with cursor pagination.
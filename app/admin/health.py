@@ -1,8 +1,27 @@
 from fastapi import APIRouter
 
+from app.core.mailbox import thread_mailbox
+from models.db import pool_stats
+from models.llm import llm_transport_stats
+from skills import import_times
+from skills.circuit_breaker import circuit_states
+
 health_router = APIRouter()
 
 
 @health_router.get("/health", include_in_schema=False)
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "threads": thread_mailbox.stats(),
+        "db": pool_stats(),
+        "llm": llm_transport_stats(),
+        # seconds spent importing each skill package used so far
+        "skill_imports": import_times,
+    }
+
+
+@health_router.get("/health/circuits", include_in_schema=False)
+async def circuits():
+    """Skill upstreams whose circuit breaker is open or half open."""
+    return await circuit_states()
@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.db import get_db
+from models.db import get_replica_db
 from models.llm import LLMModelInfo, get_available_models
 from models.skill import Skill, SkillTable
 
@@ -19,7 +19,7 @@ metadata_router_readonly = APIRouter(tags=["Metadata"])
     summary="Get all skills",
     description="Returns a list of all available skills in the system",
 )
-async def get_skills(db: AsyncSession = Depends(get_db)):
+async def get_skills(db: AsyncSession = Depends(get_replica_db)):
     """
     Get all skills available in the system.
 
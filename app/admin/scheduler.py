@@ -1,18 +1,34 @@
 """Scheduler for periodic tasks."""
 
 import asyncio
+import gzip
 import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
 
 from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy import update
+from psycopg import sql
+from sqlalchemy import text, update
 
 from app.config.config import config
 from app.core.credit import refill_all_free_credits
 from app.services.twitter.oauth2_refresh import refresh_expiring_tokens
 from models.agent import AgentQuotaTable
-from models.db import get_session, init_db
+from models.chat import ChatMessageTable  # noqa: F401, a partitioned table
+from models.checkpoint import sweep_checkpoint_payloads
+from models.db import get_pool, get_session, init_db
+from models.db_mig import (
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    partitioned_tables,
+    quote_ident,
+)
+from utils.s3 import s3_ready, store_file
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +57,84 @@ async def reset_monthly_quotas():
         await session.commit()
 
 
+async def sweep_payloads():
+    """Delete the stored tool outputs of agent memory threads that are gone."""
+    refs, payloads = await sweep_checkpoint_payloads(
+        timedelta(hours=config.checkpoint_payload_grace_hours)
+    )
+    if refs or payloads:
+        logger.info(f"Swept {refs} payload references and {payloads} payloads")
+
+
+async def _export_partition(name: str, path: str) -> None:
+    """Copy the rows of a partition into a gzipped csv file."""
+    async with get_pool().connection() as conn:
+        async with conn.cursor().copy(
+            sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(
+                sql.Identifier(name)
+            )
+        ) as copy:
+            with gzip.open(path, "wb") as f:
+                async for data in copy:
+                    f.write(data)
+
+
+async def archive_partition(table_name: str, name: str) -> None:
+    """Archive a partition to the archive directory or S3, then drop it."""
+    filename = f"{name}.csv.gz"
+    if config.db_archive_dir:
+        os.makedirs(config.db_archive_dir, exist_ok=True)
+        await _export_partition(name, os.path.join(config.db_archive_dir, filename))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, filename)
+            await _export_partition(name, path)
+            await store_file(
+                path, f"archive/{table_name}/{filename}", "application/gzip"
+            )
+    async with get_session() as session:
+        await session.execute(
+            text(
+                f"ALTER TABLE {quote_ident(table_name)} "
+                f"DETACH PARTITION {quote_ident(name)}"
+            )
+        )
+        await session.execute(text(f"DROP TABLE {quote_ident(name)}"))
+        await session.commit()
+    logger.info(f"Archived partition {name} of {table_name}")
+
+
+async def maintain_partitions():
+    """Create the coming monthly partitions, archive and drop the expired ones.
+
+    Partitions are archived when all their rows are older than
+    DB_ARCHIVE_AFTER_MONTHS months, and only if an archive destination is set.
+    """
+    today = datetime.now(timezone.utc).date()
+    archive = config.db_archive_after_months > 0
+    if archive and not config.db_archive_dir and not s3_ready():
+        logger.warning("No archive directory or S3, old partitions are kept")
+        archive = False
+    cutoff = month_start(today, -config.db_archive_after_months)
+    for table in partitioned_tables():
+        async with get_session() as session:
+            conn = await session.connection()
+            if not await is_partitioned(conn, table.name):
+                continue
+            await ensure_partitions(conn, table.name, today=today)
+            partitions = await list_partitions(conn, table.name)
+            await session.commit()
+        if not archive:
+            continue
+        for name, upper in partitions:
+            if upper is None or upper.date() > cutoff:
+                continue
+            try:
+                await archive_partition(table.name, name)
+            except Exception as e:
+                logger.error(f"Failed to archive partition {name}: {e}")
+
+
 def create_scheduler():
     """Create and configure the APScheduler with all periodic tasks."""
     # Job Store
@@ -92,6 +186,24 @@ def create_scheduler():
         replace_existing=True,
     )
 
+    # Create and archive monthly partitions every day at UTC 01:30
+    scheduler.add_job(
+        maintain_partitions,
+        trigger=CronTrigger(hour=1, minute=30, timezone="UTC"),
+        id="maintain_partitions",
+        name="Maintain monthly partitions",
+        replace_existing=True,
+    )
+
+    # Delete the stored tool outputs of deleted memory threads every day at UTC 02:30
+    scheduler.add_job(
+        sweep_payloads,
+        trigger=CronTrigger(hour=2, minute=30, timezone="UTC"),
+        id="sweep_checkpoint_payloads",
+        name="Sweep checkpoint payloads",
+        replace_existing=True,
+    )
+
     return scheduler
 
 
@@ -104,7 +216,7 @@ def start_scheduler():
 
 if __name__ == "__main__":
     # Initialize infrastructure
-    init_db(**config.db)
+    init_db(**config.db, role="scheduler")
 
     scheduler = start_scheduler()
     try:
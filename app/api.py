@@ -26,10 +26,12 @@ from app.admin import (
 )
 from app.config.config import config
 from app.core.api import core_router
+from app.core.telemetry import metrics_app
 from app.entrypoints.web import chat_router, chat_router_readonly
 from app.services.twitter.oauth2 import router as twitter_oauth2_router
 from app.services.twitter.oauth2_callback import router as twitter_callback_router
 from models.db import init_db
+from models.llm import load_model_catalogue
 from models.redis import init_redis
 
 # init logger
@@ -60,7 +62,7 @@ async def lifespan(app: FastAPI):
         app: FastAPI application instance
     """
     # Initialize database
-    await init_db(**config.db)
+    await init_db(**config.db, role="api")
 
     # Initialize Redis if configured
     if config.redis_host:
@@ -69,6 +71,9 @@ async def lifespan(app: FastAPI):
             port=config.redis_port,
         )
 
+    # Load the model catalogue before serving agents
+    await load_model_catalogue()
+
     logger.info("API server start")
     yield
     # Clean up will run after the API server shutdown
@@ -119,3 +124,6 @@ app.include_router(core_router)
 app.include_router(twitter_callback_router)
 app.include_router(twitter_oauth2_router)
 app.include_router(health_router)
+
+
+app.mount("/metrics", metrics_app())
@@ -12,9 +12,11 @@ from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy import select
 
 from app.config.config import config
+from app.core.telemetry import start_metrics_server
 from app.entrypoints.autonomous import run_autonomous_task
 from models.agent import Agent, AgentTable
 from models.db import get_session, init_db
+from models.llm import load_model_catalogue
 from models.redis import init_redis
 
 logger = logging.getLogger(__name__)
@@ -146,7 +148,7 @@ if __name__ == "__main__":
 
     async def main():
         # Initialize database
-        await init_db(**config.db)
+        await init_db(**config.db, role="autonomous")
         # Initialize Redis if configured
         if config.redis_host:
             await init_redis(
@@ -154,6 +156,11 @@ if __name__ == "__main__":
                 port=config.redis_port,
             )
 
+        # Load the model catalogue before serving agents
+        await load_model_catalogue()
+
+        start_metrics_server()
+
         # Add job to schedule agent autonomous tasks every 5 minutes
         # Run it immediately on startup and then every 5 minutes
         jobs = scheduler.get_jobs()
@@ -61,6 +61,26 @@ class Config:
             raise ValueError("db config is not set")
         # ==== this part can be load from env or aws secrets manager
         self.db["auto_migrate"] = self.load("DB_AUTO_MIGRATE", "true") == "true"
+        # Optional read replica for readonly routes, see models/db.py
+        self.db["replica_host"] = self.load("DB_REPLICA_HOST")
+        self.db["replica_port"] = self.load("DB_REPLICA_PORT")
+        self.db["replica_max_lag"] = float(self.load("DB_REPLICA_MAX_LAG", "5"))
+        # Database pool sizes, by default they depend on the process role,
+        # see POOL_SIZES in models/db.py
+        pool_size = self.load("DB_POOL_SIZE")
+        self.db["pool_size"] = int(pool_size) if pool_size else None
+        max_overflow = self.load("DB_POOL_MAX_OVERFLOW")
+        self.db["max_overflow"] = int(max_overflow) if max_overflow else None
+        checkpoint_pool_size = self.load("DB_CHECKPOINT_POOL_SIZE")
+        self.db["checkpoint_pool_size"] = (
+            int(checkpoint_pool_size) if checkpoint_pool_size else None
+        )
+        # Connect through PgBouncer in transaction pooling mode
+        self.db["pgbouncer"] = self.load("DB_PGBOUNCER", "false") == "true"
+        # Monthly partitions older than this are archived and dropped, 0 keeps them
+        self.db_archive_after_months = int(self.load("DB_ARCHIVE_AFTER_MONTHS", "0"))
+        # Archives go to this directory, or to S3 if it is empty
+        self.db_archive_dir = self.load("DB_ARCHIVE_DIR")
         self.debug = self.load("DEBUG") == "true"
         self.debug_checkpoint = (
             self.load("DEBUG_CHECKPOINT", "false") == "true"
@@ -99,11 +119,70 @@ class Config:
         self.reigent_api_key = self.load("REIGENT_API_KEY")
         self.system_prompt = self.load("SYSTEM_PROMPT")
         self.input_token_limit = int(self.load("INPUT_TOKEN_LIMIT", "60000"))
+        # Fraction of the memory token limit kept when memory is trimmed, see create_agent
+        self.memory_trim_target = float(self.load("MEMORY_TRIM_TARGET", "1.0"))
+        # Compress checkpoints and store large tool outputs out of line, only
+        # turn it on when every process runs a version that reads them
+        self.checkpoint_compact = self.load("CHECKPOINT_COMPACT", "false") == "true"
+        # Tool outputs at least this long are stored out of line in agent memory
+        self.checkpoint_offload_threshold = int(
+            self.load("CHECKPOINT_OFFLOAD_THRESHOLD", "8192")
+        )
+        # Hours before payloads of deleted threads are swept
+        self.checkpoint_payload_grace_hours = int(
+            self.load("CHECKPOINT_PAYLOAD_GRACE_HOURS", "24")
+        )
+        # Tool outputs over this many tokens are shaped before the LLM reads them
+        self.tool_output_token_limit = int(self.load("TOOL_OUTPUT_TOKEN_LIMIT", "4000"))
+        # Agent turns on the same memory thread run one at a time, see app/core/mailbox.py
+        self.thread_lease_ttl = float(self.load("THREAD_LEASE_TTL", "60"))
+        self.thread_wait_timeout = float(self.load("THREAD_WAIT_TIMEOUT", "300"))
+        self.thread_coalesce = self.load("THREAD_COALESCE", "false") == "true"
+        # Label agent turn metrics by agent, only for a few agents, each adds series
+        self.metrics_agent_label = self.load("METRICS_AGENT_LABEL", "false") == "true"
+        # Port of the metrics server of the processes without an API, 0 turns it off
+        self.metrics_port = int(self.load("METRICS_PORT", "9464"))
+        # Seconds an agent turn may take, tools still running past it are cancelled
+        self.agent_turn_deadline = float(self.load("AGENT_TURN_DEADLINE", "180"))
+        # Seconds a skill call may take, unless its category sets its own deadline
+        self.skill_deadline_seconds = float(self.load("SKILL_DEADLINE_SECONDS", "60"))
+        # Skill upstream circuit breakers, see skills/circuit_breaker.py
+        self.skill_circuit_error_rate = float(
+            self.load("SKILL_CIRCUIT_ERROR_RATE", "0.5")
+        )
+        self.skill_circuit_min_calls = int(self.load("SKILL_CIRCUIT_MIN_CALLS", "10"))
+        self.skill_circuit_window = int(self.load("SKILL_CIRCUIT_WINDOW", "60"))
+        self.skill_circuit_open_seconds = int(
+            self.load("SKILL_CIRCUIT_OPEN_SECONDS", "30")
+        )
+        self.skill_slow_call_seconds = float(self.load("SKILL_SLOW_CALL_SECONDS", "15"))
+        # Seconds each skill loader may take when an agent is initialized
+        self.skill_load_timeout = float(self.load("SKILL_LOAD_TIMEOUT", "30"))
+        # LLM http connection pools, shared by all agents of a provider endpoint
+        self.llm_http_max_connections = int(
+            self.load("LLM_HTTP_MAX_CONNECTIONS", "100")
+        )
+        self.llm_http_max_keepalive_connections = int(
+            self.load("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+        )
+        self.llm_http_keepalive_expiry = float(
+            self.load("LLM_HTTP_KEEPALIVE_EXPIRY", "30")
+        )
         # Telegram server settings
         self.tg_base_url = self.load("TG_BASE_URL")
         self.tg_server_host = self.load("TG_SERVER_HOST", "127.0.0.1")
         self.tg_server_port = self.load("TG_SERVER_PORT", "8081")
         self.tg_new_agent_poll_interval = self.load("TG_NEW_AGENT_POLL_INTERVAL", "60")
+        self.tg_sync_concurrency = int(self.load("TG_SYNC_CONCURRENCY") or "8")
+        self.tg_sync_rate = float(
+            self.load("TG_SYNC_RATE") or "10"
+        )  # bot initializations started per second
+        self.tg_queue_concurrency = int(self.load("TG_QUEUE_CONCURRENCY", "50"))
+        self.tg_queue_max_pending_per_chat = int(
+            self.load("TG_QUEUE_MAX_PENDING_PER_CHAT", "20")
+        )
+        # seconds to finish the queued messages on shutdown
+        self.tg_queue_drain_timeout = float(self.load("TG_QUEUE_DRAIN_TIMEOUT", "25"))
         # Twitter
         self.twitter_oauth2_client_id = self.load("TWITTER_OAUTH2_CLIENT_ID")
         self.twitter_oauth2_client_secret = self.load("TWITTER_OAUTH2_CLIENT_SECRET")
@@ -0,0 +1,326 @@
+"""Agent memory checkpointer.
+
+Every graph step writes the whole messages channel into checkpoint_blobs, so
+big tool outputs (protocol lists, wallet histories, search results) are
+written again and again as long as they stay in memory. This checkpointer:
+
+- compresses serialized blobs with zstd
+- stores tool message contents above a threshold once, in the
+  checkpoint_payloads table keyed by content hash, and keeps only the hash
+  in the checkpoint
+- puts the contents back when a checkpoint is loaded, with one batched query
+  for the payloads that are not in the process cache
+
+Rehydration is eager: every turn the memory manager counts the tokens of all
+messages in memory and the model reads the ones it keeps, so each content is
+read anyway. Loading them on demand would only turn the one batched query
+into a query per message, in the middle of the turn.
+
+Compressed and offloaded checkpoints can only be read by processes running
+this code, it reads both formats. Writing them is turned on with
+CHECKPOINT_COMPACT=true, do that once no process of an older version is left.
+
+Payloads are deleted with the memory of their threads, see
+delete_thread_payloads, and by a daily sweep for threads deleted otherwise.
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Optional, Sequence
+
+import zstandard
+from langchain_core.messages import BaseMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from app.config.config import config
+from app.core.telemetry import stage, turn_labels
+from models.checkpoint import get_checkpoint_payloads, save_checkpoint_payloads
+
+logger = logging.getLogger(__name__)
+
+# Blobs smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 512
+COMPRESS_LEVEL = 3
+# Type prefix of compressed blobs, blobs without it are read as they are
+ZSTD_PREFIX = "zstd+"
+# Response metadata key holding the hash of an out-of-line tool message content
+PAYLOAD_REF_KEY = "intentkit_payload_ref"
+
+
+class CompressedSerializer(JsonPlusSerializer):
+    """JsonPlus serializer that compresses large blobs with zstd."""
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if (
+            config.checkpoint_compact
+            and data is not None
+            and len(data) >= COMPRESS_MIN_SIZE
+        ):
+            return ZSTD_PREFIX + type_, zstandard.compress(data, COMPRESS_LEVEL)
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, blob = data
+        if type_.startswith(ZSTD_PREFIX):
+            return super().loads_typed(
+                (type_[len(ZSTD_PREFIX) :], zstandard.decompress(blob))
+            )
+        return super().loads_typed(data)
+
+
+class _PayloadCache:
+    """Process cache of tool message contents by hash, bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._items: OrderedDict[str, str] = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        if key in self._items:
+            self._items.move_to_end(key)
+            return
+        self._items[key] = value
+        self._size += len(value)
+        while self._size > self._max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+
+_payload_cache = _PayloadCache(64 * 1024 * 1024)
+
+# Payload references already stored by this process, by (thread, hash)
+_stored_refs: OrderedDict[tuple[str, str], None] = OrderedDict()
+_STORED_REFS_MAX = 100_000
+
+
+async def _save_payloads(
+    thread_id: str, payloads: dict[str, tuple[bytes, int]], refs: set[str]
+) -> None:
+    """Store new payloads and the references of a thread not stored yet."""
+    refs = {key for key in refs if (thread_id, key) not in _stored_refs}
+    if not refs and not payloads:
+        return
+    await save_checkpoint_payloads(thread_id, payloads, refs)
+    for key in refs | payloads.keys():
+        _stored_refs[(thread_id, key)] = None
+    while len(_stored_refs) > _STORED_REFS_MAX:
+        _stored_refs.popitem(last=False)
+
+
+async def store_payload(content: str, thread_id: str) -> str:
+    """Store a text of a thread in the payload table, returns its content hash."""
+    data = content.encode()
+    key = hashlib.sha256(data).hexdigest()
+    payloads = {}
+    if _payload_cache.get(key) is None:
+        payloads[key] = (zstandard.compress(data, COMPRESS_LEVEL), len(data))
+    await _save_payloads(thread_id, payloads, {key})
+    _payload_cache.put(key, content)
+    return key
+
+
+async def load_payload(key: str) -> Optional[str]:
+    """Get a text from the payload table by its content hash."""
+    content = _payload_cache.get(key)
+    if content is None:
+        payloads = await get_checkpoint_payloads([key])
+        if key not in payloads:
+            return None
+        content = zstandard.decompress(payloads[key]).decode()
+        _payload_cache.put(key, content)
+    return content
+
+
+async def offload_messages(messages: list, thread_id: str) -> list:
+    """Replace large tool message contents with a reference to the payload table.
+
+    The messages are copied, the running graph keeps its own objects.
+    """
+    if not config.checkpoint_compact:
+        return messages
+    threshold = config.checkpoint_offload_threshold
+    payloads: dict[str, tuple[bytes, int]] = {}
+    contents: dict[str, str] = {}
+    refs: set[str] = set()
+    result = []
+    for message in messages:
+        if (
+            isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+            and len(message.content) >= threshold
+        ):
+            data = message.content.encode()
+            key = hashlib.sha256(data).hexdigest()
+            if _payload_cache.get(key) is None:
+                payloads[key] = (zstandard.compress(data, COMPRESS_LEVEL), len(data))
+                contents[key] = message.content
+            refs.add(key)
+            message = message.model_copy(
+                update={
+                    "content": "",
+                    "response_metadata": {
+                        **message.response_metadata,
+                        PAYLOAD_REF_KEY: key,
+                    },
+                }
+            )
+        result.append(message)
+    if not refs:
+        return messages
+    await _save_payloads(thread_id, payloads, refs)
+    for key, content in contents.items():
+        _payload_cache.put(key, content)
+    return result
+
+
+async def rehydrate_messages(messages: list) -> list:
+    """Put back the tool message contents stored out of line."""
+    refs = {
+        message.response_metadata[PAYLOAD_REF_KEY]
+        for message in messages
+        if isinstance(message, BaseMessage)
+        and PAYLOAD_REF_KEY in message.response_metadata
+    }
+    if not refs:
+        return messages
+    missing = [key for key in refs if _payload_cache.get(key) is None]
+    if missing:
+        for key, content in (await get_checkpoint_payloads(missing)).items():
+            _payload_cache.put(key, zstandard.decompress(content).decode())
+    result = []
+    for message in messages:
+        if (
+            isinstance(message, BaseMessage)
+            and PAYLOAD_REF_KEY in message.response_metadata
+        ):
+            metadata = dict(message.response_metadata)
+            key = metadata.pop(PAYLOAD_REF_KEY)
+            content = _payload_cache.get(key)
+            if content is None:
+                logger.error(f"checkpoint payload {key} not found")
+                content = "tool output is no longer available"
+            message = message.model_copy(
+                update={"content": content, "response_metadata": metadata}
+            )
+        result.append(message)
+    return result
+
+
+def _turn_labels(config: RunnableConfig) -> dict[str, str]:
+    configurable = config.get("configurable", {})
+    agent = configurable.get("agent")
+    return turn_labels(
+        getattr(agent, "id", ""),
+        getattr(agent, "model", None),
+        configurable.get("entrypoint"),
+    )
+
+
+def _thread_id(config: RunnableConfig) -> str:
+    return config["configurable"]["thread_id"]
+
+
+async def _rehydrate_tuple(checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+    """Put back the out-of-line tool outputs of a checkpoint and its pending writes."""
+    checkpoint = checkpoint_tuple.checkpoint
+    messages = checkpoint["channel_values"].get("messages")
+    if messages:
+        checkpoint = {
+            **checkpoint,
+            "channel_values": {
+                **checkpoint["channel_values"],
+                "messages": await rehydrate_messages(messages),
+            },
+        }
+    pending_writes = []
+    for task_id, channel, value in checkpoint_tuple.pending_writes or []:
+        if channel == "messages" and isinstance(value, list):
+            value = await rehydrate_messages(value)
+        elif channel == "messages" and isinstance(value, BaseMessage):
+            value = (await rehydrate_messages([value]))[0]
+        pending_writes.append((task_id, channel, value))
+    return checkpoint_tuple._replace(
+        checkpoint=checkpoint, pending_writes=pending_writes
+    )
+
+
+class AgentCheckpointer(AsyncPostgresSaver):
+    """Postgres checkpointer with compressed blobs and out-of-line tool outputs."""
+
+    def __init__(self, conn, **kwargs):
+        super().__init__(conn, serde=CompressedSerializer(), **kwargs)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with stage("checkpoint_write", _turn_labels(config)):
+            messages = checkpoint["channel_values"].get("messages")
+            if messages and "messages" in new_versions:
+                offloaded = await offload_messages(messages, _thread_id(config))
+                if offloaded is not messages:
+                    checkpoint = {
+                        **checkpoint,
+                        "channel_values": {
+                            **checkpoint["channel_values"],
+                            "messages": offloaded,
+                        },
+                    }
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with stage("checkpoint_write", _turn_labels(config)):
+            thread_id = _thread_id(config)
+            result = []
+            for channel, value in writes:
+                if channel == "messages" and isinstance(value, list):
+                    value = await offload_messages(value, thread_id)
+                elif channel == "messages" and isinstance(value, ToolMessage):
+                    value = (await offload_messages([value], thread_id))[0]
+                result.append((channel, value))
+            await super().aput_writes(config, result, task_id, task_path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoint_tuple = await super().aget_tuple(config)
+        if not checkpoint_tuple:
+            return checkpoint_tuple
+        return await _rehydrate_tuple(checkpoint_tuple)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in super().alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield await _rehydrate_tuple(checkpoint_tuple)
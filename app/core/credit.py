@@ -1,12 +1,12 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
 from typing import List, Optional, Tuple
 
 from epyxid import XID
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import desc, select, update
+from sqlalchemy import desc, func, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.agent import Agent
@@ -57,14 +57,16 @@ async def recharge(
     Returns:
         Updated user credit account
     """
-    # Check for idempotency - prevent duplicate transactions
-    await CreditEvent.check_upstream_tx_id_exists(
-        session, UpstreamType.API, upstream_tx_id
-    )
-
     if amount <= Decimal("0"):
         raise ValueError("Recharge amount must be positive")
 
+    # Claim the upstream transaction before any account changes,
+    # a duplicate fails here, and concurrent retries wait for the first one
+    event_id = str(XID())
+    await CreditEvent.claim_upstream_tx(
+        session, UpstreamType.API, upstream_tx_id, event_id
+    )
+
     # 1. Update user account - add credits
     user_account = await CreditAccount.income_in_session(
         session=session,
@@ -84,7 +86,6 @@ async def recharge(
     )
 
     # 3. Create credit event record
-    event_id = str(XID())
     event = CreditEventTable(
         id=event_id,
         event_type=EventType.RECHARGE,
@@ -104,6 +105,7 @@ async def recharge(
     )
     session.add(event)
     await session.flush()
+    await CreditEvent.add_rollups(session, event)
 
     # 4. Create credit transaction records
     # 4.1 User account transaction (credit)
@@ -156,14 +158,16 @@ async def reward(
     Returns:
         Updated user credit account
     """
-    # Check for idempotency - prevent duplicate transactions
-    await CreditEvent.check_upstream_tx_id_exists(
-        session, UpstreamType.API, upstream_tx_id
-    )
-
     if amount <= Decimal("0"):
         raise ValueError("Reward amount must be positive")
 
+    # Claim the upstream transaction before any account changes,
+    # a duplicate fails here, and concurrent retries wait for the first one
+    event_id = str(XID())
+    await CreditEvent.claim_upstream_tx(
+        session, UpstreamType.API, upstream_tx_id, event_id
+    )
+
     # 1. Update user account - add reward credits
     user_account = await CreditAccount.income_in_session(
         session=session,
@@ -183,7 +187,6 @@ async def reward(
     )
 
     # 3. Create credit event record
-    event_id = str(XID())
     event = CreditEventTable(
         id=event_id,
         event_type=EventType.REWARD,
@@ -203,6 +206,7 @@ async def reward(
     )
     session.add(event)
     await session.flush()
+    await CreditEvent.add_rollups(session, event)
 
     # 4. Create credit transaction records
     # 4.1 User account transaction (credit)
@@ -257,11 +261,6 @@ async def adjustment(
     Returns:
         Updated user credit account
     """
-    # Check for idempotency - prevent duplicate transactions
-    await CreditEvent.check_upstream_tx_id_exists(
-        session, UpstreamType.API, upstream_tx_id
-    )
-
     if amount == Decimal("0"):
         raise ValueError("Adjustment amount cannot be zero")
 
@@ -275,6 +274,13 @@ async def adjustment(
     credit_debit_user = CreditDebit.CREDIT if is_income else CreditDebit.DEBIT
     credit_debit_platform = CreditDebit.DEBIT if is_income else CreditDebit.CREDIT
 
+    # Claim the upstream transaction before any account changes,
+    # a duplicate fails here, and concurrent retries wait for the first one
+    event_id = str(XID())
+    await CreditEvent.claim_upstream_tx(
+        session, UpstreamType.API, upstream_tx_id, event_id
+    )
+
     # 1. Update user account
     if is_income:
         user_account = await CreditAccount.income_in_session(
@@ -315,7 +321,6 @@ async def adjustment(
         )
 
     # 3. Create credit event record
-    event_id = str(XID())
     event = CreditEventTable(
         id=event_id,
         event_type=EventType.ADJUSTMENT,
@@ -335,6 +340,7 @@ async def adjustment(
     )
     session.add(event)
     await session.flush()
+    await CreditEvent.add_rollups(session, event)
 
     # 4. Create credit transaction records
     # 4.1 User account transaction
@@ -735,11 +741,6 @@ async def expense_message(
     Returns:
         Updated user credit account
     """
-    # Check for idempotency - prevent duplicate transactions
-    await CreditEvent.check_upstream_tx_id_exists(
-        session, UpstreamType.EXECUTOR, message_id
-    )
-
     if base_llm_amount < Decimal("0"):
         raise ValueError("Base LLM amount must be non-negative")
 
@@ -757,6 +758,13 @@ async def expense_message(
         fee_agent_amount = base_amount * agent.fee_percentage / Decimal("100")
     total_amount = base_amount + fee_platform_amount + fee_agent_amount
 
+    # Claim the upstream transaction before any account changes,
+    # a duplicate fails here, and concurrent retries wait for the first one
+    event_id = str(XID())
+    await CreditEvent.claim_upstream_tx(
+        session, UpstreamType.EXECUTOR, message_id, event_id
+    )
+
     # 1. Update user account - deduct credits
     user_account, credit_type = await CreditAccount.expense_in_session(
         session=session,
@@ -783,7 +791,6 @@ async def expense_message(
         )
 
     # 3. Create credit event record
-    event_id = str(XID())
     event = CreditEventTable(
         id=event_id,
         account_id=user_account.id,
@@ -809,6 +816,7 @@ async def expense_message(
     )
     session.add(event)
     await session.flush()
+    await CreditEvent.add_rollups(session, event)
 
     # 4. Create credit transaction records
     # 4.1 User account transaction (debit)
@@ -961,15 +969,18 @@ async def expense_skill(
     Returns:
         CreditEvent: The created credit event
     """
-    # Check for idempotency - prevent duplicate transactions
     upstream_tx_id = f"{message_id}_{skill_call_id}"
-    await CreditEvent.check_upstream_tx_id_exists(
-        session, UpstreamType.EXECUTOR, upstream_tx_id
-    )
 
     # Calculate skill cost using the skill_cost function
     skill_cost_info = await skill_cost(skill_name, user_id, agent)
 
+    # Claim the upstream transaction before any account changes,
+    # a duplicate fails here, and concurrent retries wait for the first one
+    event_id = str(XID())
+    await CreditEvent.claim_upstream_tx(
+        session, UpstreamType.EXECUTOR, upstream_tx_id, event_id
+    )
+
     # 1. Update user account - deduct credits
     user_account, credit_type = await CreditAccount.expense_in_session(
         session=session,
@@ -1004,7 +1015,6 @@ async def expense_skill(
         )
 
     # 3. Create credit event record
-    event_id = str(XID())
     event = CreditEventTable(
         id=event_id,
         account_id=user_account.id,
@@ -1034,6 +1044,7 @@ async def expense_skill(
     )
     session.add(event)
     await session.flush()
+    await CreditEvent.add_rollups(session, event)
 
     # 4. Create credit transaction records
     # 4.1 User account transaction (debit)
@@ -1092,131 +1103,213 @@ async def expense_skill(
     return CreditEvent.model_validate(event)
 
 
-async def refill_free_credits_for_account(
-    session: AsyncSession,
-    account: CreditAccount,
-):
-    """
-    Refill free credits for a single account based on its refill_amount and free_quota.
-
-    Args:
-        session: Async session to use for database operations
-        account: The credit account to refill
+# Refill the accounts of one chunk in a single statement.
+# The ids are XIDs generated by the caller, so they sort by time like the ids of
+# every other credit event. The events and transactions are derived from the
+# updated rows, so the chunk is all or nothing. The daily rollups are updated
+# like CreditEvent.add_rollups does for a single event. The upstream_tx_id is
+# unique per run and account, and is claimed like CreditEvent.claim_upstream_tx
+# does. Accounts already claimed by this run are skipped, which makes a failed
+# run resumable and an overlapping run harmless.
+_REFILL_CHUNK_SQL = text(
     """
-    # Skip if refill_amount is zero or free_credits already equals or exceeds free_quota
-    if (
-        account.refill_amount <= Decimal("0")
-        or account.free_credits >= account.free_quota
-    ):
-        return
-
-    # Calculate the amount to add
-    # If adding refill_amount would exceed free_quota, only add what's needed to reach free_quota
-    amount_to_add = min(
-        account.refill_amount, account.free_quota - account.free_credits
-    )
-
-    if amount_to_add <= Decimal("0"):
-        return  # Nothing to add
-
-    # 1. Update user account - add free credits
-    updated_account = await CreditAccount.income_in_session(
-        session=session,
-        owner_type=account.owner_type,
-        owner_id=account.owner_id,
-        amount=amount_to_add,
-        credit_type=CreditType.FREE,
+    WITH batch AS (
+        SELECT *
+        FROM unnest(
+            CAST(:account_ids AS VARCHAR[]), CAST(:amounts AS NUMERIC[]),
+            CAST(:event_ids AS VARCHAR[]), CAST(:user_tx_ids AS VARCHAR[]),
+            CAST(:platform_tx_ids AS VARCHAR[])
+        ) AS b(account_id, amount, event_id, user_tx_id, platform_tx_id)
+    ),
+    claimed AS (
+        INSERT INTO credit_event_upstreams (upstream_type, upstream_tx_id, event_id)
+        SELECT CAST(:upstream_type AS VARCHAR),
+               CAST(:run_key AS VARCHAR) || b.account_id, b.event_id
+        FROM batch AS b
+        ORDER BY b.account_id
+        ON CONFLICT DO NOTHING
+        RETURNING event_id
+    ),
+    refilled AS (
+        UPDATE credit_accounts AS a
+        SET free_credits = a.free_credits + b.amount,
+            income_at = now(),
+            updated_at = now()
+        FROM batch AS b
+        JOIN claimed AS c ON c.event_id = b.event_id
+        WHERE a.id = b.account_id
+        RETURNING a.id, a.owner_id, b.amount, b.event_id, b.user_tx_id,
+                  b.platform_tx_id,
+                  a.credits + a.free_credits + a.reward_credits AS balance_after
+    ),
+    events AS (
+        INSERT INTO credit_events (
+            id, account_id, event_type, user_id, upstream_type, upstream_tx_id,
+            direction, credit_type, total_amount, balance_after, base_amount,
+            base_discount_amount, base_original_amount, base_llm_amount,
+            base_skill_amount, fee_platform_amount, fee_dev_amount,
+            fee_agent_amount, note
+        )
+        SELECT r.event_id, r.id,
+               CAST(:event_type AS VARCHAR), r.owner_id,
+               CAST(:upstream_type AS VARCHAR),
+               CAST(:run_key AS VARCHAR) || r.id,
+               CAST(:direction AS VARCHAR), CAST(:credit_type AS VARCHAR),
+               r.amount, r.balance_after, r.amount, 0, r.amount, 0, 0, 0, 0, 0,
+               'Hourly free credits refill of ' || r.amount
+        FROM refilled AS r
+        RETURNING id, total_amount
+    ),
+    transactions AS (
+        INSERT INTO credit_transactions (
+            id, account_id, event_id, tx_type, credit_debit, change_amount,
+            credit_type
+        )
+        SELECT r.user_tx_id, r.id, r.event_id,
+               CAST(:tx_type AS VARCHAR), CAST(:credit AS VARCHAR),
+               r.amount, CAST(:credit_type AS VARCHAR)
+        FROM refilled AS r
+        UNION ALL
+        SELECT r.platform_tx_id, CAST(:platform_account AS VARCHAR), r.event_id,
+               CAST(:tx_type AS VARCHAR), CAST(:debit AS VARCHAR),
+               r.amount, CAST(:credit_type AS VARCHAR)
+        FROM refilled AS r
+    ),
+    rollups AS (
+        INSERT INTO credit_rollups (
+            account_id, day, event_type, direction, event_count, total_amount,
+            amount
+        )
+        SELECT r.id, CAST(timezone('UTC', now()) AS DATE),
+               CAST(:event_type AS VARCHAR), CAST(:direction AS VARCHAR),
+               1, r.amount, r.amount
+        FROM refilled AS r
+        ORDER BY r.id
+        ON CONFLICT (account_id, day, event_type, direction) DO UPDATE
+        SET event_count = credit_rollups.event_count + excluded.event_count,
+            total_amount = credit_rollups.total_amount + excluded.total_amount,
+            amount = credit_rollups.amount + excluded.amount,
+            updated_at = now()
     )
+    SELECT count(*) AS refilled, COALESCE(sum(total_amount), 0) AS total
+    FROM events
+    """
+)
 
-    # 2. Update platform refill account - deduct credits
-    platform_account = await CreditAccount.deduction_in_session(
-        session=session,
-        owner_type=OwnerType.PLATFORM,
-        owner_id=DEFAULT_PLATFORM_ACCOUNT_REFILL,
-        credit_type=CreditType.FREE,
-        amount=amount_to_add,
-    )
 
-    # 3. Create credit event record
-    event_id = str(XID())
-    event = CreditEventTable(
-        id=event_id,
-        account_id=updated_account.id,
-        event_type=EventType.REFILL,
-        user_id=account.owner_id,
-        upstream_type=UpstreamType.SCHEDULER,
-        upstream_tx_id=str(XID()),
-        direction=Direction.INCOME,
-        credit_type=CreditType.FREE,
-        total_amount=amount_to_add,
-        balance_after=updated_account.credits
-        + updated_account.free_credits
-        + updated_account.reward_credits,
-        base_amount=amount_to_add,
-        base_original_amount=amount_to_add,
-        note=f"Hourly free credits refill of {amount_to_add}",
-    )
-    session.add(event)
-    await session.flush()
+async def refill_free_credits_chunk(
+    session: AsyncSession,
+    after_id: str,
+    batch_size: int,
+    run_key: str,
+) -> Tuple[Optional[str], int, Decimal]:
+    """
+    Refill free credits for the next chunk of eligible accounts.
+    Eligible accounts are those with refill_amount > 0 and free_credits < free_quota.
 
-    # 4. Create credit transaction records
-    # 4.1 User account transaction (credit)
-    user_tx = CreditTransactionTable(
-        id=str(XID()),
-        account_id=updated_account.id,
-        event_id=event_id,
-        tx_type=TransactionType.REFILL,
-        credit_debit=CreditDebit.CREDIT,
-        change_amount=amount_to_add,
-        credit_type=CreditType.FREE,
-    )
-    session.add(user_tx)
+    The chunk is refilled in one statement and the platform refill account is
+    debited once with the sum. The caller commits the session.
 
-    # 4.2 Platform refill account transaction (debit)
-    platform_tx = CreditTransactionTable(
-        id=str(XID()),
-        account_id=platform_account.id,
-        event_id=event_id,
-        tx_type=TransactionType.REFILL,
-        credit_debit=CreditDebit.DEBIT,
-        change_amount=amount_to_add,
-        credit_type=CreditType.FREE,
-    )
-    session.add(platform_tx)
+    Args:
+        session: Async session to use for database operations
+        after_id: Only accounts with a greater id are refilled
+        batch_size: Max number of accounts in the chunk
+        run_key: Prefix of the upstream_tx_id of the events of this run
 
-    # Commit changes
-    await session.commit()
-    logger.info(
-        f"Refilled {amount_to_add} free credits for account {account.owner_type} {account.owner_id}"
-    )
+    Returns:
+        The last account id of the chunk, or None if there is no account left,
+        the number of refilled accounts and the total amount refilled
+    """
+    batch = (
+        await session.execute(
+            select(
+                CreditAccountTable.id,
+                func.least(
+                    CreditAccountTable.refill_amount,
+                    CreditAccountTable.free_quota - CreditAccountTable.free_credits,
+                ),
+            )
+            .where(
+                CreditAccountTable.id > after_id,
+                CreditAccountTable.refill_amount > 0,
+                CreditAccountTable.free_credits < CreditAccountTable.free_quota,
+            )
+            .order_by(CreditAccountTable.id)
+            .limit(batch_size)
+            .with_for_update()
+        )
+    ).all()
+    if not batch:
+        return None, 0, Decimal("0")
+
+    row = (
+        await session.execute(
+            _REFILL_CHUNK_SQL,
+            {
+                "account_ids": [account_id for account_id, _ in batch],
+                "amounts": [amount for _, amount in batch],
+                "event_ids": [str(XID()) for _ in batch],
+                "user_tx_ids": [str(XID()) for _ in batch],
+                "platform_tx_ids": [str(XID()) for _ in batch],
+                "run_key": run_key,
+                "upstream_type": UpstreamType.SCHEDULER.value,
+                "event_type": EventType.REFILL.value,
+                "direction": Direction.INCOME.value,
+                "credit_type": CreditType.FREE.value,
+                "tx_type": TransactionType.REFILL.value,
+                "credit": CreditDebit.CREDIT.value,
+                "debit": CreditDebit.DEBIT.value,
+                "platform_account": DEFAULT_PLATFORM_ACCOUNT_REFILL,
+            },
+        )
+    ).one()
+    if row.refilled > 0:
+        await session.execute(
+            update(CreditAccountTable)
+            .where(CreditAccountTable.id == DEFAULT_PLATFORM_ACCOUNT_REFILL)
+            .values(
+                free_credits=CreditAccountTable.free_credits - row.total,
+                expense_at=datetime.now(timezone.utc),
+            )
+        )
+    return batch[-1].id, row.refilled, row.total
 
 
-async def refill_all_free_credits():
+async def refill_all_free_credits(batch_size: int = 1000):
     """
     Find all eligible accounts and refill their free credits.
     Eligible accounts are those with refill_amount > 0 and free_credits < free_quota.
+
+    Accounts are refilled in chunks of batch_size, each chunk in one transaction,
+    see refill_free_credits_chunk.
+    A run is keyed by the current hour, running it again in the same hour only
+    refills the accounts that were missed, so a failed run can be resumed.
     """
+    run_key = f"refill:{datetime.now(timezone.utc).strftime('%Y%m%d%H')}:"
+
+    # make sure the platform refill account exists before the bulk statements
     async with get_session() as session:
-        # Find all accounts that need refilling
-        stmt = select(CreditAccountTable).where(
-            CreditAccountTable.refill_amount > 0,
-            CreditAccountTable.free_credits < CreditAccountTable.free_quota,
+        await CreditAccount.get_or_create_in_session(
+            session, OwnerType.PLATFORM, DEFAULT_PLATFORM_ACCOUNT_REFILL
         )
-        result = await session.execute(stmt)
-        accounts_data = result.scalars().all()
-
-        # Convert to Pydantic models
-        accounts = [CreditAccount.model_validate(account) for account in accounts_data]
+        await session.commit()
 
-    # Process each account
+    after_id = ""
     refilled_count = 0
-    for account in accounts:
-        async with get_session() as session:
-            try:
-                await refill_free_credits_for_account(session, account)
-                refilled_count += 1
-            except Exception as e:
-                logger.error(f"Error refilling account {account.id}: {str(e)}")
-            # Continue with other accounts even if one fails
-            continue
-    logger.info(f"Refilled {refilled_count} accounts")
+    refilled_total = Decimal("0")
+    while True:
+        try:
+            async with get_session() as session:
+                last_id, refilled, total = await refill_free_credits_chunk(
+                    session, after_id, batch_size, run_key
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error refilling accounts after {after_id}: {str(e)}")
+            raise
+        if last_id is None:
+            break
+        after_id = last_id
+        refilled_count += refilled
+        refilled_total += total
+    logger.info(f"Refilled {refilled_count} accounts, total {refilled_total}")
@@ -10,32 +10,15 @@ This module provides functionality for initializing and executing AI agents. It
 The module uses a global cache to store initialized agents for better performance.
 """
 
-import importlib
+import asyncio
 import logging
 import textwrap
 import time
 import traceback
 from datetime import datetime
+from typing import Awaitable, Callable, Optional
 
 import sqlalchemy
-from coinbase_agentkit import (
-    AgentKit,
-    AgentKitConfig,
-    CdpWalletProvider,
-    CdpWalletProviderConfig,
-    basename_action_provider,
-    cdp_api_action_provider,
-    cdp_wallet_action_provider,
-    erc20_action_provider,
-    morpho_action_provider,
-    pyth_action_provider,
-    superfluid_action_provider,
-    wallet_action_provider,
-    weth_action_provider,
-    wow_action_provider,
-)
-from coinbase_agentkit.action_providers.erc721 import erc721_action_provider
-from coinbase_agentkit_langchain import get_langchain_tools
 from epyxid import XID
 from fastapi import HTTPException
 from langchain_core.messages import (
@@ -45,7 +28,6 @@ from langchain_core.messages import (
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.graph.graph import CompiledGraph
 from sqlalchemy import func, update
 from sqlalchemy.exc import SQLAlchemyError
@@ -53,28 +35,29 @@ from sqlalchemy.exc import SQLAlchemyError
 from abstracts.graph import AgentState
 from app.config.config import config
 from app.core.agent import AgentStore
+from app.core.checkpoint import AgentCheckpointer, rehydrate_messages
 from app.core.credit import expense_message, expense_skill, skill_cost
-from app.core.graph import create_agent
+from app.core.graph import READ_TOOL_OUTPUT, create_agent
+from app.core.mailbox import thread_mailbox
 from app.core.prompt import agent_prompt
-from app.core.skill import skill_store
+from app.core.skill import buffered_skill_data, discard_skill_data, skill_store
+from app.core.telemetry import (
+    TURN_SECONDS,
+    TURNS,
+    TurnTelemetry,
+    observe,
+    stage,
+    turn_labels,
+)
 from models.agent import Agent, AgentData, AgentQuota, AgentTable
 from models.app_setting import AppSetting
 from models.chat import AuthorType, ChatMessage, ChatMessageCreate, ChatMessageSkillCall
+from models.checkpoint import delete_thread_payloads
 from models.credit import CreditAccount, OwnerType
 from models.db import get_pool, get_session
 from models.llm import get_model_cost
 from models.skill import AgentSkillData, Skill, ThreadSkillData
-from skills.acolyt import get_acolyt_skill
-from skills.allora import get_allora_skill
-from skills.cdp.get_balance import GetBalance
-from skills.elfa import get_elfa_skill
-from skills.enso import get_enso_skill
-from skills.goat import (
-    create_smart_wallets_if_not_exist,
-    get_goat_skill,
-    init_smart_wallets,
-)
-from skills.twitter import get_twitter_skill
+from skills import load_skill_package
 
 logger = logging.getLogger(__name__)
 
@@ -87,6 +70,30 @@ _private_agents: dict[str, CompiledGraph] = {}
 _agents_updated: dict[str, datetime] = {}
 _private_agents_updated: dict[str, datetime] = {}
 
+# Seconds spent by each skill loader at the last initialization of each agent
+_skill_load_timings: dict[str, dict[str, float]] = {}
+
+
+async def _load_skills(
+    aid: str,
+    name: str,
+    loader: Callable[[], Awaitable[list[BaseTool]]],
+    timings: dict[str, float],
+) -> list[BaseTool]:
+    """Run one skill loader with a timeout, a failure only drops its own skills."""
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(loader(), timeout=config.skill_load_timeout) or []
+    except asyncio.TimeoutError:
+        logger.error(f"[{aid}] loading skill {name} timed out")
+    except ImportError as e:
+        logger.error(f"Could not import skill module: {name} ({e})")
+    except Exception as e:
+        logger.error(f"[{aid}] failed to load skill {name}: {e}")
+    finally:
+        timings[name] = time.perf_counter() - start
+    return []
+
 
 async def initialize_agent(aid, is_private=False):
     """Initialize an AI agent with specified configuration and tools.
@@ -136,31 +143,31 @@ async def initialize_agent(aid, is_private=False):
     input_token_limit = min(config.input_token_limit, await llm_model.get_token_limit())
 
     # ==== Store buffered conversation history in memory.
-    memory = AsyncPostgresSaver(get_pool())
+    memory = AgentCheckpointer(get_pool())
 
     # ==== Load skills
-    tools: list[BaseTool] = []
+    # Every skill provider has its own loader, the loaders run concurrently
+    # and a slow or failing provider only loses its own skills.
+    loaders: dict[str, Callable[[], Awaitable[list[BaseTool]]]] = {}
 
     if agent.skills:
         for k, v in agent.skills.items():
             if not v.get("enabled", False):
                 continue
-            try:
-                skill_module = importlib.import_module(f"skills.{k}")
-                if hasattr(skill_module, "get_skills"):
-                    skill_tools = await skill_module.get_skills(
-                        v, is_private, skill_store, agent_id=aid
-                    )
-                    if skill_tools and len(skill_tools) > 0:
-                        tools.extend(skill_tools)
-                else:
-                    logger.error(f"Skill {k} does not have get_skills function")
-            except ImportError as e:
-                logger.error(f"Could not import skill module: {k} ({e})")
+
+            async def load_package_skills(name=k, skill_config=v) -> list[BaseTool]:
+                skill_module = load_skill_package(name)
+                if not hasattr(skill_module, "get_skills"):
+                    logger.error(f"Skill {name} does not have get_skills function")
+                    return []
+                return await skill_module.get_skills(
+                    skill_config, is_private, skill_store, agent_id=aid
+                )
+
+            loaders[k] = load_package_skills
 
     # Configure CDP Agentkit Langchain Extension.
     # Deprecated
-    cdp_wallet_provider = None
     if (
         agent.cdp_enabled
         and agent_data
@@ -168,45 +175,76 @@ async def initialize_agent(aid, is_private=False):
         and agent.cdp_skills
         and ("cdp" not in agent.skills if agent.skills else True)
     ):
-        cdp_wallet_provider_config = CdpWalletProviderConfig(
-            api_key_name=config.cdp_api_key_name,
-            api_key_private_key=config.cdp_api_key_private_key,
-            network_id=agent.cdp_network_id,
-            wallet_data=agent_data.cdp_wallet_data,
-        )
-        cdp_wallet_provider = CdpWalletProvider(cdp_wallet_provider_config)
-        agent_kit = AgentKit(
-            AgentKitConfig(
-                wallet_provider=cdp_wallet_provider,
-                action_providers=[
-                    wallet_action_provider(),
-                    cdp_api_action_provider(cdp_wallet_provider_config),
-                    cdp_wallet_action_provider(cdp_wallet_provider_config),
-                    pyth_action_provider(),
-                    basename_action_provider(),
-                    erc20_action_provider(),
-                    erc721_action_provider(),
-                    weth_action_provider(),
-                    morpho_action_provider(),
-                    superfluid_action_provider(),
-                    wow_action_provider(),
-                ],
+
+        def load_cdp_skills() -> list[BaseTool]:
+            # agentkit and its action providers are imported only when needed
+            from coinbase_agentkit import (
+                AgentKit,
+                AgentKitConfig,
+                CdpWalletProvider,
+                CdpWalletProviderConfig,
+                basename_action_provider,
+                cdp_api_action_provider,
+                cdp_wallet_action_provider,
+                erc20_action_provider,
+                morpho_action_provider,
+                pyth_action_provider,
+                superfluid_action_provider,
+                wallet_action_provider,
+                weth_action_provider,
+                wow_action_provider,
             )
-        )
-        cdp_tools = get_langchain_tools(agent_kit)
-        for skill in agent.cdp_skills:
-            if skill == "get_balance":
-                tools.append(
-                    GetBalance(
-                        wallet=cdp_wallet_provider._wallet,
-                        agent_id=aid,
-                        skill_store=skill_store,
-                    )
+            from coinbase_agentkit.action_providers.erc721 import (
+                erc721_action_provider,
+            )
+            from coinbase_agentkit_langchain import get_langchain_tools
+
+            from skills.cdp.get_balance import GetBalance
+
+            cdp_tools: list[BaseTool] = []
+            cdp_wallet_provider_config = CdpWalletProviderConfig(
+                api_key_name=config.cdp_api_key_name,
+                api_key_private_key=config.cdp_api_key_private_key,
+                network_id=agent.cdp_network_id,
+                wallet_data=agent_data.cdp_wallet_data,
+            )
+            cdp_wallet_provider = CdpWalletProvider(cdp_wallet_provider_config)
+            agent_kit = AgentKit(
+                AgentKitConfig(
+                    wallet_provider=cdp_wallet_provider,
+                    action_providers=[
+                        wallet_action_provider(),
+                        cdp_api_action_provider(cdp_wallet_provider_config),
+                        cdp_wallet_action_provider(cdp_wallet_provider_config),
+                        pyth_action_provider(),
+                        basename_action_provider(),
+                        erc20_action_provider(),
+                        erc721_action_provider(),
+                        weth_action_provider(),
+                        morpho_action_provider(),
+                        superfluid_action_provider(),
+                        wow_action_provider(),
+                    ],
                 )
-                continue
-            for tool in cdp_tools:
-                if tool.name.endswith(skill):
-                    tools.append(tool)
+            )
+            agentkit_tools = get_langchain_tools(agent_kit)
+            for skill in agent.cdp_skills:
+                if skill == "get_balance":
+                    cdp_tools.append(
+                        GetBalance(
+                            wallet=cdp_wallet_provider._wallet,
+                            agent_id=aid,
+                            skill_store=skill_store,
+                        )
+                    )
+                    continue
+                for tool in agentkit_tools:
+                    if tool.name.endswith(skill):
+                        cdp_tools.append(tool)
+            return cdp_tools
+
+        # the wallet provider talks to CDP synchronously, keep it off the loop
+        loaders["cdp"] = lambda: asyncio.to_thread(load_cdp_skills)
 
     if (
         agent.goat_enabled
@@ -220,13 +258,17 @@ async def initialize_agent(aid, is_private=False):
         ):
             crossmint_networks = agent.crossmint_config.get("networks")
             if crossmint_networks and len(crossmint_networks) > 0:
-                crossmint_wallet_data = (
-                    agent_data.crossmint_wallet_data
-                    if agent_data.crossmint_wallet_data
-                    else {}
-                )
-                try:
-                    smart_wallet_data = create_smart_wallets_if_not_exist(
+
+                async def load_goat_skills() -> list[BaseTool]:
+                    goat = load_skill_package("goat")
+                    goat_tools: list[BaseTool] = []
+                    crossmint_wallet_data = (
+                        agent_data.crossmint_wallet_data
+                        if agent_data.crossmint_wallet_data
+                        else {}
+                    )
+                    smart_wallet_data = await asyncio.to_thread(
+                        goat.create_smart_wallets_if_not_exist,
                         config.crossmint_api_base_url,
                         config.crossmint_api_key,
                         crossmint_wallet_data.get("smart"),
@@ -248,9 +290,10 @@ async def initialize_agent(aid, is_private=False):
                         )
 
                     # give rpc some time to prevent error #429
-                    time.sleep(1)
+                    await asyncio.sleep(1)
 
-                    evm_crossmint_wallets = init_smart_wallets(
+                    evm_crossmint_wallets = await asyncio.to_thread(
+                        goat.init_smart_wallets,
                         config.crossmint_api_key,
                         config.chain_provider,
                         crossmint_networks,
@@ -259,18 +302,33 @@ async def initialize_agent(aid, is_private=False):
 
                     for wallet in evm_crossmint_wallets:
                         try:
-                            s = get_goat_skill(
+                            s = goat.get_goat_skill(
                                 wallet,
                                 agent.goat_skills,
                                 skill_store,
                                 agent_store,
                                 aid,
                             )
-                            tools.extend(s)
+                            goat_tools.extend(s)
                         except Exception as e:
                             logger.warning(e)
+                    return goat_tools
+
+                loaders["goat"] = load_goat_skills
+
+    # Stateless legacy skills, each failing skill is skipped on its own
+    def legacy_loader(name: str, skill_names: list[str]):
+        async def load_legacy_skills() -> list[BaseTool]:
+            get_skill = getattr(load_skill_package(name), f"get_{name}_skill")
+            legacy_tools: list[BaseTool] = []
+            for skill in skill_names:
+                try:
+                    legacy_tools.append(get_skill(skill, skill_store))
                 except Exception as e:
                     logger.warning(e)
+            return legacy_tools
+
+        return load_legacy_skills
 
     # Enso skills
     if (
@@ -279,72 +337,46 @@ async def initialize_agent(aid, is_private=False):
         and agent.enso_config
         and ("enso" not in agent.skills if agent.skills else True)
     ):
-        for skill in agent.enso_skills:
-            try:
-                s = get_enso_skill(
-                    skill,
-                    skill_store,
-                )
-                tools.append(s)
-            except Exception as e:
-                logger.warning(e)
+        loaders["enso"] = legacy_loader("enso", agent.enso_skills)
     # Acoalyt skills
     if (
         agent.acolyt_skills
         and len(agent.acolyt_skills) > 0
         and ("acolyt" not in agent.skills if agent.skills else True)
     ):
-        for skill in agent.acolyt_skills:
-            try:
-                s = get_acolyt_skill(
-                    skill,
-                    skill_store,
-                )
-                tools.append(s)
-            except Exception as e:
-                logger.warning(e)
+        loaders["acolyt"] = legacy_loader("acolyt", agent.acolyt_skills)
     # Allora skills
     if (
         agent.allora_skills
         and len(agent.allora_skills) > 0
         and ("allora" not in agent.skills if agent.skills else True)
     ):
-        for skill in agent.allora_skills:
-            try:
-                s = get_allora_skill(
-                    skill,
-                    skill_store,
-                )
-                tools.append(s)
-            except Exception as e:
-                logger.warning(e)
+        loaders["allora"] = legacy_loader("allora", agent.allora_skills)
     # Elfa skills
     if (
         agent.elfa_skills
         and len(agent.elfa_skills) > 0
         and ("elfa" not in agent.skills if agent.skills else True)
     ):
-        for skill in agent.elfa_skills:
-            try:
-                s = get_elfa_skill(
-                    skill,
-                    skill_store,
-                )
-                tools.append(s)
-            except Exception as e:
-                logger.warning(e)
+        loaders["elfa"] = legacy_loader("elfa", agent.elfa_skills)
     # Twitter skills
     if (
         agent.twitter_skills
         and len(agent.twitter_skills) > 0
         and ("twitter" not in agent.skills if agent.skills else True)
     ):
-        for skill in agent.twitter_skills:
-            s = get_twitter_skill(
-                skill,
-                skill_store,
-            )
-            tools.append(s)
+        loaders["twitter"] = legacy_loader("twitter", agent.twitter_skills)
+
+    skill_load_timings: dict[str, float] = {}
+    results = await asyncio.gather(
+        *(
+            _load_skills(aid, name, loader, skill_load_timings)
+            for name, loader in loaders.items()
+        )
+    )
+    # keep the loader order, so the same skills always give the same tool list
+    tools: list[BaseTool] = [tool for result in results for tool in result]
+    _skill_load_timings[aid] = skill_load_timings
 
     # filter the duplicate tools
     tools = list({tool.name: tool for tool in tools}.values())
@@ -353,6 +385,9 @@ async def initialize_agent(aid, is_private=False):
     prompt = agent_prompt(agent, agent_data)
     # Escape curly braces in the prompt
     escaped_prompt = prompt.replace("{", "{{").replace("}", "}}")
+    # Keep the static system prompt first and the per-thread parts after it,
+    # so every call of this agent shares the longest possible prompt prefix
+    # and providers can serve it from their prompt cache.
     prompt_array = [
         ("system", escaped_prompt),
         ("placeholder", "{entrypoint_prompt}"),
@@ -408,6 +443,8 @@ async def initialize_agent(aid, is_private=False):
         state_modifier=formatted_prompt,
         debug=config.debug_checkpoint,
         input_token_limit=input_token_limit,
+        tool_output_token_limit=config.tool_output_token_limit,
+        memory_trim_target=config.memory_trim_target,
     )
     if is_private:
         _private_agents[aid] = executor
@@ -442,104 +479,84 @@ async def agent_executor(agent_id: str, is_private: bool) -> (CompiledGraph, flo
     if (agent_id not in agents) or needs_reinit:
         await initialize_agent(agent_id, is_private)
         cold_start_cost = time.perf_counter() - start
+        skill_timings = _skill_load_timings.get(agent_id, {})
+        logger.info(
+            f"[{agent_id}] cold start in {cold_start_cost:.3f}s, skills: "
+            + ", ".join(f"{k} {v:.3f}s" for k, v in skill_timings.items())
+        )
     return agents[agent_id], cold_start_cost
 
 
-async def execute_agent(
-    message: ChatMessageCreate, debug: bool = False
-) -> list[ChatMessage]:
-    """
-    Execute an agent with the given prompt and return response lines.
+def _cached_tokens(msg: BaseMessage) -> int:
+    """Input tokens of a model response that were read from the provider cache."""
+    usage = getattr(msg, "usage_metadata", None)
+    if not usage:
+        return 0
+    details = usage.get("input_token_details") or {}
+    return details.get("cache_read", 0) or 0
 
-    This function:
-    1. Configures execution context with thread ID
-    2. Initializes agent if not in cache
-    3. Streams agent execution results
-    4. Formats and times the execution steps
 
-    Args:
-        message (ChatMessageCreate): The chat message containing agent_id, chat_id, and message content
-        debug (bool): Enable debug mode, will save the skill results
+async def _run_turn(
+    agent: Agent,
+    input: ChatMessage,
+    merged: list[ChatMessage],
+    payment: Optional[tuple[str, CreditAccount]],
+    start: float,
+    thread_id: str,
+    labels: dict[str, str],
+) -> list[ChatMessage]:
+    """Run one agent turn on a thread, the caller must hold the thread.
 
-    Returns:
-        list[ChatMessage]: Formatted response lines including timing information
+    Args:
+        agent: The agent
+        input: The saved message to answer
+        merged: Later messages of the same user, answered in the same turn
+        payment: Payer and payer account, None if the turn is free
+        start: perf_counter time the message arrived
+        thread_id: Memory thread of the turn
+        labels: Telemetry labels of the turn
     """
-    quota = await AgentQuota.get(message.agent_id)
-    if quota and not quota.has_message_quota():
-        raise HTTPException(status_code=429, detail="Agent Daily Quota exceeded")
-
-    resp = []
-    start = time.perf_counter()
-    # make sure reply_to is set
-    message.reply_to = message.id
-    input = await message.save()
-
-    agent = await Agent.get(input.agent_id)
-
-    need_payment = await is_payment_required(input, agent)
-
-    # check user balance
+    need_payment = payment is not None
     if need_payment:
-        payer = input.user_id
-        if (
-            input.author_type == AuthorType.TELEGRAM
-            or input.author_type == AuthorType.TWITTER
-        ):
-            payer = agent.owner
-        user_account = await CreditAccount.get_or_create(OwnerType.USER, payer)
-        if not user_account.has_sufficient_credits(1):
-            error_message_create = ChatMessageCreate(
-                id=str(XID()),
-                agent_id=input.agent_id,
-                chat_id=input.chat_id,
-                user_id=input.user_id,
-                author_id=input.agent_id,
-                author_type=AuthorType.SYSTEM,
-                thread_type=input.author_type,
-                reply_to=input.id,
-                message="Insufficient balance.",
-                time_cost=time.perf_counter() - start,
-            )
-            error_message = await error_message_create.save()
-            resp.append(error_message)
-            return resp
+        payer, user_account = payment
         # use this in loop
         total_paid = 0
 
-    # once the input saved, reduce message quota
-    await quota.add_message()
-
+    resp = []
     is_private = False
     if input.user_id == agent.owner:
         is_private = True
 
-    executor, cold_start_cost = await agent_executor(input.agent_id, is_private)
+    with stage("executor", labels):
+        executor, cold_start_cost = await agent_executor(input.agent_id, is_private)
     last = start + cold_start_cost
 
-    # Extract images from attachments
-    image_urls = []
-    if input.attachments:
-        image_urls = [
-            att["url"]
-            for att in input.attachments
-            if "type" in att and att["type"] == "image" and "url" in att
-        ]
-
-    # message
-    # if the model doesn't natively support image parsing, add the image URLs to the message
-    if agent.has_image_parser_skill() and image_urls:
-        input.message += f"\n\nImages:\n{'\n'.join(image_urls)}"
-    content = [
-        {"type": "text", "text": input.message},
-    ]
-    if not agent.has_image_parser_skill() and image_urls:
-        # anyway, pass it directly to LLM
-        content.extend(
-            [
-                {"type": "image_url", "image_url": {"url": image_url}}
-                for image_url in image_urls
+    # merged messages are answered in the same turn, one text block each
+    content = []
+    for chat_message in [input, *merged]:
+        # Extract images from attachments
+        image_urls = []
+        if chat_message.attachments:
+            image_urls = [
+                att["url"]
+                for att in chat_message.attachments
+                if "type" in att and att["type"] == "image" and "url" in att
             ]
-        )
+
+        # message
+        # if the model doesn't natively support image parsing, add the image URLs to the message
+        text = chat_message.message
+        if agent.has_image_parser_skill() and image_urls:
+            text += f"\n\nImages:\n{'\n'.join(image_urls)}"
+        content.append({"type": "text", "text": text})
+        if not agent.has_image_parser_skill() and image_urls:
+            # anyway, pass it directly to LLM
+            content.extend(
+                [
+                    {"type": "image_url", "image_url": {"url": image_url}}
+                    for image_url in image_urls
+                ]
+            )
     messages = [
         HumanMessage(content=content),
     ]
@@ -561,7 +578,6 @@ async def execute_agent(
         logger.debug("telegram entrypoint prompt added")
 
     # stream config
-    thread_id = f"{input.agent_id}-{input.chat_id}"
     stream_config = {
         "configurable": {
             "agent": agent,
@@ -569,7 +585,10 @@ async def execute_agent(
             "user_id": input.user_id,
             "entrypoint": input.author_type,
             "entrypoint_prompt": entrypoint_prompt,
-        }
+            # skill calls are cancelled when the turn runs out of time
+            "deadline": time.monotonic() + config.agent_turn_deadline,
+        },
+        "callbacks": [TurnTelemetry(labels)],
     }
 
     # run
@@ -589,13 +608,14 @@ async def execute_agent(
                     # tool calls, save for later use
                     cached_tool_step = msg
                     if need_payment:
-                        for tool_call in msg.tool_calls:
-                            skill_meta = await Skill.get(tool_call.get("name"))
-                            if skill_meta:
-                                skill_cost_info = await skill_cost(
-                                    skill_meta.name, input.user_id, agent
-                                )
-                                total_paid += skill_cost_info.total_amount
+                        with stage("payment_check", labels):
+                            for tool_call in msg.tool_calls:
+                                skill_meta = await Skill.get(tool_call.get("name"))
+                                if skill_meta:
+                                    skill_cost_info = await skill_cost(
+                                        skill_meta.name, input.user_id, agent
+                                    )
+                                    total_paid += skill_cost_info.total_amount
                         if not user_account.has_sufficient_credits(total_paid):
                             error_message_create = ChatMessageCreate(
                                 id=str(XID()),
@@ -634,6 +654,7 @@ async def execute_agent(
                             if hasattr(msg, "usage_metadata") and msg.usage_metadata
                             else 0
                         ),
+                        cached_tokens=_cached_tokens(msg),
                         time_cost=this_time - last,
                     )
                     last = this_time
@@ -644,22 +665,28 @@ async def execute_agent(
                     async with get_session() as session:
                         # payment
                         if need_payment:
-                            amount = await get_model_cost(
-                                agent.model,
-                                chat_message_create.input_tokens,
-                                chat_message_create.output_tokens,
-                            )
-                            credit_event = await expense_message(
-                                session,
-                                payer,
-                                chat_message_create.id,
-                                input.id,
-                                amount,
-                                agent,
-                            )
-                            logger.info(f"[{input.agent_id}] expense message: {amount}")
-                            chat_message_create.credit_event_id = credit_event.id
-                            chat_message_create.credit_cost = credit_event.total_amount
+                            with stage("credit", labels):
+                                amount = await get_model_cost(
+                                    agent.model,
+                                    chat_message_create.input_tokens,
+                                    chat_message_create.output_tokens,
+                                    chat_message_create.cached_tokens,
+                                )
+                                credit_event = await expense_message(
+                                    session,
+                                    payer,
+                                    chat_message_create.id,
+                                    input.id,
+                                    amount,
+                                    agent,
+                                )
+                                logger.info(
+                                    f"[{input.agent_id}] expense message: {amount}"
+                                )
+                                chat_message_create.credit_event_id = credit_event.id
+                                chat_message_create.credit_cost = (
+                                    credit_event.total_amount
+                                )
                         chat_message = await chat_message_create.save_in_session(
                             session
                         )
@@ -728,6 +755,7 @@ async def execute_agent(
                         and cached_tool_step.usage_metadata
                         else 0
                     ),
+                    cached_tokens=_cached_tokens(cached_tool_step),
                     time_cost=this_time - last,
                 )
                 last = this_time
@@ -738,42 +766,49 @@ async def execute_agent(
                 # save message and credit in one transaction
                 async with get_session() as session:
                     if need_payment:
-                        # message payment
-                        message_amount = await get_model_cost(
-                            agent.model,
-                            skill_message_create.input_tokens,
-                            skill_message_create.output_tokens,
-                        )
-                        message_payment_event = await expense_message(
-                            session,
-                            payer,
-                            skill_message_create.id,
-                            input.id,
-                            message_amount,
-                            agent,
-                        )
-                        skill_message_create.credit_event_id = message_payment_event.id
-                        skill_message_create.credit_cost = (
-                            message_payment_event.total_amount
-                        )
-                        # skill payment
-                        for skill_call in skill_calls:
-                            if not skill_call["success"]:
-                                continue
-                            payment_event = await expense_skill(
+                        with stage("credit", labels):
+                            # message payment
+                            message_amount = await get_model_cost(
+                                agent.model,
+                                skill_message_create.input_tokens,
+                                skill_message_create.output_tokens,
+                                skill_message_create.cached_tokens,
+                            )
+                            message_payment_event = await expense_message(
                                 session,
                                 payer,
                                 skill_message_create.id,
                                 input.id,
-                                skill_call["id"],
-                                skill_call["name"],
+                                message_amount,
                                 agent,
                             )
-                            skill_call["credit_event_id"] = payment_event.id
-                            skill_call["credit_cost"] = payment_event.total_amount
-                            logger.info(
-                                f"[{input.agent_id}] skill payment: {skill_call}"
+                            skill_message_create.credit_event_id = (
+                                message_payment_event.id
+                            )
+                            skill_message_create.credit_cost = (
+                                message_payment_event.total_amount
                             )
+                            # skill payment
+                            for skill_call in skill_calls:
+                                if (
+                                    not skill_call["success"]
+                                    or skill_call["name"] == READ_TOOL_OUTPUT
+                                ):
+                                    continue
+                                payment_event = await expense_skill(
+                                    session,
+                                    payer,
+                                    skill_message_create.id,
+                                    input.id,
+                                    skill_call["id"],
+                                    skill_call["name"],
+                                    agent,
+                                )
+                                skill_call["credit_event_id"] = payment_event.id
+                                skill_call["credit_cost"] = payment_event.total_amount
+                                logger.info(
+                                    f"[{input.agent_id}] skill payment: {skill_call}"
+                                )
                     skill_message_create.skill_calls = skill_calls
                     skill_message = await skill_message_create.save_in_session(session)
                     await session.commit()
@@ -831,6 +866,95 @@ async def execute_agent(
     return resp
 
 
+async def execute_agent(
+    message: ChatMessageCreate, debug: bool = False
+) -> list[ChatMessage]:
+    """
+    Execute an agent with the given prompt and return response lines.
+
+    This function:
+    1. Configures execution context with thread ID
+    2. Initializes agent if not in cache
+    3. Streams agent execution results
+    4. Formats and times the execution steps
+
+    Args:
+        message (ChatMessageCreate): The chat message containing agent_id, chat_id, and message content
+        debug (bool): Enable debug mode, will save the skill results
+
+    Returns:
+        list[ChatMessage]: Formatted response lines including timing information
+    """
+    with stage("quota", turn_labels(message.agent_id, entrypoint=message.author_type)):
+        quota = await AgentQuota.get(message.agent_id)
+    if quota and not quota.has_message_quota():
+        raise HTTPException(status_code=429, detail="Agent Daily Quota exceeded")
+
+    resp = []
+    start = time.perf_counter()
+    # make sure reply_to is set
+    message.reply_to = message.id
+    input = await message.save()
+
+    agent = await Agent.get(input.agent_id)
+    labels = turn_labels(agent.id, agent.model, input.author_type)
+
+    with stage("payment_check", labels):
+        need_payment = await is_payment_required(input, agent)
+        if need_payment:
+            payer = input.user_id
+            if (
+                input.author_type == AuthorType.TELEGRAM
+                or input.author_type == AuthorType.TWITTER
+            ):
+                payer = agent.owner
+            user_account = await CreditAccount.get_or_create(OwnerType.USER, payer)
+
+    # check user balance
+    if need_payment:
+        if not user_account.has_sufficient_credits(1):
+            error_message_create = ChatMessageCreate(
+                id=str(XID()),
+                agent_id=input.agent_id,
+                chat_id=input.chat_id,
+                user_id=input.user_id,
+                author_id=input.agent_id,
+                author_type=AuthorType.SYSTEM,
+                thread_type=input.author_type,
+                reply_to=input.id,
+                message="Insufficient balance.",
+                time_cost=time.perf_counter() - start,
+            )
+            error_message = await error_message_create.save()
+            resp.append(error_message)
+            return resp
+
+    # once the input saved, reduce message quota
+    await quota.add_message()
+
+    thread_id = f"{input.agent_id}-{input.chat_id}"
+    async with thread_mailbox.turn(thread_id, input) as turn:
+        if turn.result is not None:
+            # answered together with an earlier message of the same user
+            return turn.result
+        observe("thread_wait", labels, turn.wait)
+        if turn.wait > 1:
+            logger.info(
+                f"waited {turn.wait:.3f}s for thread, {len(turn.merged)} messages merged",
+                extra={"thread_id": thread_id},
+            )
+        payment = (payer, user_account) if need_payment else None
+        # skill data writes of the turn are flushed together when it ends
+        async with buffered_skill_data():
+            turn.result = await _run_turn(
+                agent, input, turn.merged, payment, start, thread_id, labels
+            )
+        TURN_SECONDS.labels(**labels).observe(time.perf_counter() - start)
+        failed = any(m.author_type == AuthorType.SYSTEM for m in turn.result)
+        TURNS.labels(**labels, status="error" if failed else "success").inc()
+        return turn.result
+
+
 async def clean_agent_memory(
     agent_id: str,
     chat_id: str = "",
@@ -846,6 +970,7 @@ async def clean_agent_memory(
     3. Cleans the graph checkpoint data.
     4. Cleans the graph checkpoint_writes data.
     5. Cleans the graph checkpoint_blobs data.
+    6. Cleans the tool outputs stored out of line that no other thread uses.
 
     Args:
         agent_id (str): Agent ID
@@ -865,6 +990,7 @@ async def clean_agent_memory(
             )
 
         if clean_skill:
+            discard_skill_data(agent_id)
             await AgentSkillData.clean_data(agent_id)
             await ThreadSkillData.clean_data(agent_id, chat_id)
 
@@ -894,6 +1020,7 @@ async def clean_agent_memory(
                     ),
                     deletion_param,
                 )
+                await delete_thread_payloads(db, deletion_param["value"])
 
             # update the updated_at field so that the agent instance will all reload
             await db.execute(
@@ -914,18 +1041,41 @@ async def clean_agent_memory(
         raise e
 
 
+# Messages channel of the latest checkpoint of a thread, in the root namespace
+_THREAD_MESSAGES_SQL = """
+with latest as (
+    select thread_id, checkpoint_ns,
+        checkpoint -> 'channel_versions' ->> 'messages' as version
+    from checkpoints
+    where thread_id = %s and checkpoint_ns = ''
+    order by checkpoint_id desc
+    limit 1
+)
+select bl.type, bl.blob
+from latest
+join checkpoint_blobs bl
+    on bl.thread_id = latest.thread_id
+    and bl.checkpoint_ns = latest.checkpoint_ns
+    and bl.channel = 'messages'
+    and bl.version = latest.version
+"""
+
+
 async def thread_stats(agent_id: str, chat_id: str) -> list[BaseMessage]:
+    """Get the messages in the memory of a thread.
+
+    Reads the latest checkpoint straight from the checkpoint tables and only
+    deserializes the messages channel, so no agent executor is built.
+    """
     thread_id = f"{agent_id}-{chat_id}"
-    stream_config = {"configurable": {"thread_id": thread_id}}
-    is_private = False
-    if chat_id.startswith("owner") or chat_id.startswith("autonomous"):
-        is_private = True
-    executor, _ = await agent_executor(agent_id, is_private)
-    snap = await executor.aget_state(stream_config)
-    if snap.values and "messages" in snap.values:
-        return snap.values["messages"]
-    else:
+    memory = AgentCheckpointer(get_pool())
+    async with get_pool().connection() as conn:
+        async with conn.cursor(binary=True) as cur:
+            await cur.execute(_THREAD_MESSAGES_SQL, (thread_id,))
+            row = await cur.fetchone()
+    if not row or row[0] == "empty":
         return []
+    return await rehydrate_messages(memory.serde.loads_typed((row[0], row[1])))
 
 
 async def is_payment_required(input: ChatMessageCreate, agent: Agent) -> bool:
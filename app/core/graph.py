@@ -1,7 +1,19 @@
 """This file is forked from langgraph/prebuilt/react_agent_executor.py"""
 
+import json
 import logging
-from typing import Callable, Literal, Optional, Sequence, Type, TypeVar, Union, cast
+import math
+from typing import (
+    Callable,
+    Literal,
+    Optional,
+    Sequence,
+    Type,
+    TypedDict,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import tiktoken
 from langchain_core.language_models import BaseChatModel, LanguageModelLike
@@ -19,6 +31,7 @@ from langchain_core.runnables import (
     RunnableConfig,
 )
 from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langgraph.errors import ErrorCode, create_error_message
 from langgraph.graph import END, StateGraph
 from langgraph.graph.graph import CompiledGraph
@@ -26,8 +39,10 @@ from langgraph.prebuilt import ToolNode
 from langgraph.store.base import BaseStore
 from langgraph.types import Checkpointer
 from langgraph.utils.runnable import RunnableCallable
+from pydantic import BaseModel, Field
 
 from abstracts.graph import AgentState, MemoryManager
+from app.core.checkpoint import load_payload, store_payload
 
 logger = logging.getLogger(__name__)
 
@@ -143,6 +158,46 @@ def _validate_chat_history(
     raise ValueError(error_message)
 
 
+# Interned OpenAI tool schemas, keyed by tool name and version
+_TOOL_SCHEMAS: dict[tuple, dict] = {}
+# Models bound to a tool set, shared by agents with the same model and tools
+_BOUND_MODELS: dict[tuple, tuple[LanguageModelLike, Runnable]] = {}
+
+
+def _tool_schema_key(tool: BaseTool) -> tuple:
+    """Version a tool schema by its name, description and args schema."""
+    args_schema = tool.args_schema
+    if isinstance(args_schema, dict):
+        args_schema = json.dumps(args_schema, sort_keys=True)
+    return (tool.name, tool.description, args_schema)
+
+
+def _tool_schema(tool: BaseTool) -> tuple[tuple, dict]:
+    """Get the interned OpenAI schema of a tool, converting it only once."""
+    key = _tool_schema_key(tool)
+    schema = _TOOL_SCHEMAS.get(key)
+    if schema is None:
+        schema = convert_to_openai_tool(tool)
+        _TOOL_SCHEMAS[key] = schema
+    return key, schema
+
+
+def _bind_tools(model: LanguageModelLike, tools: Sequence[BaseTool]) -> Runnable:
+    """Bind tools to a model, reusing the binding of agents with the same tools.
+
+    LLM instances are shared between agents with the same model parameters,
+    so the bound payload can be shared too when the tool set is the same.
+    """
+    keys, schemas = zip(*(_tool_schema(tool) for tool in tools))
+    cache_key = (id(model), keys)
+    cached = _BOUND_MODELS.get(cache_key)
+    if cached and cached[0] is model:
+        return cached[1]
+    bound = cast(BaseChatModel, model).bind_tools(list(schemas))
+    _BOUND_MODELS[cache_key] = (model, bound)
+    return bound
+
+
 # Cache for tiktoken encoders
 _TIKTOKEN_CACHE = {}
 
@@ -188,6 +243,141 @@ def _count_tokens(messages: Sequence[BaseMessage], model_name: str = "gpt-4") ->
     return num_tokens
 
 
+# Name of the tool that pages through shortened tool outputs
+READ_TOOL_OUTPUT = "read_tool_output"
+
+
+class ToolOutputRule(TypedDict, total=False):
+    """How to shape the output of a tool that is over the token budget."""
+
+    max_items: int  # rows kept of each list
+    fields: list[str]  # fields kept of each row
+
+
+# Per tool shaping rules, other tools get the generic list and text shaping
+TOOL_OUTPUT_RULES: dict[str, ToolOutputRule] = {
+    "defillama_fetch_protocols": {
+        "max_items": 30,
+        "fields": [
+            "name",
+            "symbol",
+            "category",
+            "chains",
+            "tvl",
+            "change_1d",
+            "change_7d",
+            "mcap",
+        ],
+    },
+    "moralis_fetch_transaction_history": {"max_items": 20},
+    "moralis_fetch_nft_portfolio": {"max_items": 20},
+    "moralis_fetch_wallet_portfolio": {"max_items": 30},
+    "elfa_get_mentions": {"max_items": 20},
+    "elfa_get_top_mentions": {"max_items": 20},
+    "elfa_search_mentions": {"max_items": 20},
+}
+
+
+def _project(value, max_items: int, fields: Optional[list[str]], row: bool = False):
+    """Keep the first rows of every list, and only the rule fields of each row."""
+    if isinstance(value, list):
+        return [_project(v, max_items, fields, True) for v in value[:max_items]]
+    if isinstance(value, dict):
+        if row and fields and any(f in value for f in fields):
+            value = {k: v for k, v in value.items() if k in fields}
+        return {k: _project(v, max_items, fields) for k, v in value.items()}
+    return value
+
+
+def _shape_tool_output(name: str, content: str, token_limit: int) -> Optional[str]:
+    """Fit a tool output into the token limit, None if it already fits.
+
+    JSON outputs are shaped by the tool rule and then by keeping fewer rows,
+    other outputs, or JSON that still does not fit, are cut at the limit.
+    """
+    encoding = _get_encoder()
+    if len(encoding.encode(content)) <= token_limit:
+        return None
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if isinstance(data, (dict, list)):
+        rule = TOOL_OUTPUT_RULES.get(name, {})
+        max_items = rule.get("max_items", 50)
+        while max_items >= 1:
+            shaped = json.dumps(
+                _project(data, max_items, rule.get("fields")), ensure_ascii=False
+            )
+            if len(encoding.encode(shaped)) <= token_limit:
+                return shaped
+            max_items //= 2
+    return encoding.decode(encoding.encode(content)[:token_limit])
+
+
+class ReadToolOutputInput(BaseModel):
+    """Input for ReadToolOutput."""
+
+    ref: str = Field(description="Reference of the shortened tool output")
+    page: int = Field(1, description="Page to read, starting from 1")
+
+
+class ReadToolOutput(BaseTool):
+    """Page through the full output of a tool call that was shortened."""
+
+    name: str = READ_TOOL_OUTPUT
+    description: str = (
+        "Read the full output of a tool call that was shortened, one page at a time. "
+        "Only use it when the shortened output does not have what you need."
+    )
+    args_schema: Type[BaseModel] = ReadToolOutputInput
+    page_tokens: int = 4000
+
+    def _run(self, *args, **kwargs):
+        raise NotImplementedError("Use _arun instead")
+
+    async def _arun(self, ref: str, page: int = 1) -> str:
+        content = await load_payload(ref)
+        if content is None:
+            return "The tool output is no longer available."
+        encoding = _get_encoder()
+        tokens = encoding.encode(content)
+        pages = max(1, math.ceil(len(tokens) / self.page_tokens))
+        if page < 1 or page > pages:
+            return f"Page {page} does not exist, the output has {pages} pages."
+        text = encoding.decode(
+            tokens[(page - 1) * self.page_tokens : page * self.page_tokens]
+        )
+        return f"{text}\n\n[Page {page} of {pages}]"
+
+
+async def _shape_tool_messages(
+    messages: Sequence[BaseMessage], token_limit: int, thread_id: str
+) -> list[BaseMessage]:
+    """Shape the tool outputs over the limit, keeping the full text for paging."""
+    shaped_messages = []
+    for message in messages:
+        if (
+            isinstance(message, ToolMessage)
+            and message.status != "error"
+            and message.name != READ_TOOL_OUTPUT
+            and isinstance(message.content, str)
+        ):
+            shaped = _shape_tool_output(message.name, message.content, token_limit)
+            if shaped is not None:
+                ref = await store_payload(message.content, thread_id)
+                pages = math.ceil(
+                    len(_get_encoder().encode(message.content)) / token_limit
+                )
+                shaped += (
+                    f"\n\n[This output was shortened. The full output has {pages} "
+                    f'pages, read them with {READ_TOOL_OUTPUT} and ref "{ref}".]'
+                )
+                message = message.model_copy(update={"content": shaped})
+        shaped_messages.append(message)
+    return shaped_messages
+
+
 def create_agent(
     aid: str,
     model: LanguageModelLike,
@@ -201,6 +391,8 @@ def create_agent(
     interrupt_before: Optional[list[str]] = None,
     interrupt_after: Optional[list[str]] = None,
     input_token_limit: int = 120000,
+    tool_output_token_limit: int = 4000,
+    memory_trim_target: float = 1.0,
     debug: bool = False,
 ) -> CompiledGraph:
     """Creates a graph that works with a chat model that utilizes tool calling.
@@ -232,6 +424,12 @@ def create_agent(
         interrupt_after: An optional list of node names to interrupt after.
             Should be one of the following: "agent", "tools".
             This is useful if you want to return directly or run additional processing on an output.
+        input_token_limit: Token limit of the model input, half of it is kept for memory.
+        tool_output_token_limit: Tool outputs over this many tokens are shaped
+            to fit, the full output can be paged through with the read_tool_output tool.
+        memory_trim_target: Fraction of the memory token limit kept when memory
+            is trimmed. Below 1, the history prefix stays unchanged for more turns,
+            which keeps provider prompt caches hitting, at the cost of older context.
         debug: A flag indicating whether to enable debug mode.
 
     Returns:
@@ -289,6 +487,8 @@ def create_agent(
         tool_classes = list(tools.tools_by_name.values())
         tool_node = tools
     else:
+        if tools:
+            tools = [*tools, ReadToolOutput(page_tokens=tool_output_token_limit)]
         tool_node = ToolNode(tools)
         # get the tool functions wrapped in a tool class from the ToolNode
         tool_classes = list(tool_node.tools_by_name.values())
@@ -296,7 +496,7 @@ def create_agent(
     tool_calling_enabled = len(tool_classes) > 0
 
     if _should_bind_tools(model, tool_classes) and tool_calling_enabled:
-        model = cast(BaseChatModel, model).bind_tools(tool_classes)
+        model = _bind_tools(model, tool_classes)
 
     # we're passing store here for validation
     preprocessor = _get_state_modifier_runnable(state_modifier, store)
@@ -316,14 +516,15 @@ def create_agent(
         # Half of the input token limit will be reserved
         token_limit = input_token_limit // 2
 
-        # If over token limit, remove messages from front
+        # If over token limit, remove messages from front, down to the trim target
         if total_tokens > token_limit:
+            trim_target = int(token_limit * memory_trim_target)
             must_delete = 0
             current_tokens = total_tokens
             temp_messages = messages.copy()
 
             # Calculate how many messages to delete
-            while current_tokens > token_limit and must_delete < len(temp_messages):
+            while current_tokens > trim_target and must_delete < len(temp_messages):
                 current_tokens -= _count_tokens([temp_messages[must_delete]])
                 must_delete += 1
 
@@ -478,7 +679,30 @@ def create_agent(
 
     # Define the two nodes we will cycle between
     workflow.add_node("agent", RunnableCallable(call_model, acall_model))
-    workflow.add_node("tools", tool_node)
+
+    def shape_tool_outputs(output, config: RunnableConfig):
+        # shaping stores the full outputs, only the async graph does it
+        return output
+
+    async def ashape_tool_outputs(output, config: RunnableConfig):
+        if not isinstance(output, dict) or not output.get("messages"):
+            return output
+        return {
+            **output,
+            "messages": await _shape_tool_messages(
+                output["messages"],
+                tool_output_token_limit,
+                config["configurable"]["thread_id"],
+            ),
+        }
+
+    workflow.add_node(
+        "tools",
+        tool_node
+        | RunnableCallable(
+            shape_tool_outputs, ashape_tool_outputs, name="shape_tool_outputs"
+        ),
+    )
     workflow.add_node("memory_manager", memory_manager)
 
     # Set the entrypoint as `agent`
@@ -0,0 +1,196 @@
+"""Per thread mailbox, one agent turn at a time on each memory thread.
+
+Public chats (twitter, telegram groups) let many users write to the same
+thread at once. Two turns streaming on one thread race on its checkpoints, so
+turns of a thread are serialized here, turns of different threads still run
+in parallel:
+
+- in a process, turns of a thread wait on a local lock in arrival order
+- across processes, the turn holds a redis lease on the thread, renewed while
+  it runs, other processes poll for it
+
+When coalescing is enabled, messages waiting in this process when a turn
+starts are answered by that turn, if they have the same user and entrypoint.
+
+Without redis only the local lock is used.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from epyxid import XID
+
+from app.config.config import config
+from models.chat import ChatMessage
+from models.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY_PREFIX = "intentkit:thread_lease:"
+
+# Delete the lease only if this turn still holds it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(eq=False)
+class ThreadTurn:
+    """A message waiting for, or holding, its thread."""
+
+    message: ChatMessage
+    # messages answered together with this one
+    merged: list[ChatMessage] = field(default_factory=list)
+    # response, set by the turn that answered this message
+    result: Optional[list[ChatMessage]] = None
+    # seconds spent waiting for the thread
+    wait: float = 0.0
+
+
+@dataclass
+class _Thread:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: list[ThreadTurn] = field(default_factory=list)
+    users: int = 0
+
+
+class ThreadMailbox:
+    """Serialize agent turns by memory thread."""
+
+    def __init__(self, lease_ttl: float, wait_timeout: float, coalesce: bool):
+        self._lease_ttl = lease_ttl
+        self._wait_timeout = wait_timeout
+        self._coalesce = coalesce
+        self._threads: dict[str, _Thread] = {}
+        self._turns = 0
+        self._coalesced = 0
+        self._lease_timeouts = 0
+        self._wait_total = 0.0
+
+    @asynccontextmanager
+    async def turn(
+        self, thread_id: str, message: ChatMessage
+    ) -> AsyncIterator[ThreadTurn]:
+        """Wait for the thread, then hold it until the block exits.
+
+        If the yielded turn already has a result, the message was answered by
+        an earlier turn and the block should return it. Otherwise the block
+        answers the message and its merged messages, and sets the result.
+        """
+        thread = self._threads.setdefault(thread_id, _Thread())
+        thread.users += 1
+        turn = ThreadTurn(message=message)
+        thread.pending.append(turn)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            async with thread.lock:
+                if turn in thread.pending:
+                    thread.pending.remove(turn)
+                if turn.result is not None:
+                    yield turn
+                    return
+                key = LEASE_KEY_PREFIX + thread_id
+                token = await self._acquire_lease(key, start + self._wait_timeout)
+                turn.wait = loop.time() - start
+                self._turns += 1
+                self._wait_total += turn.wait
+                merged: list[ThreadTurn] = []
+                if self._coalesce:
+                    merged = [
+                        t
+                        for t in thread.pending
+                        if t.message.user_id == message.user_id
+                        and t.message.author_type == message.author_type
+                    ]
+                    thread.pending = [t for t in thread.pending if t not in merged]
+                    turn.merged = [t.message for t in merged]
+                    self._coalesced += len(merged)
+                renewal = (
+                    asyncio.create_task(self._renew_lease(key, token))
+                    if token
+                    else None
+                )
+                try:
+                    yield turn
+                finally:
+                    if renewal:
+                        renewal.cancel()
+                    if token:
+                        await self._release_lease(key, token)
+                    for t in merged:
+                        t.result = turn.result
+        finally:
+            # a turn cancelled while waiting for the lock is still pending
+            if turn in thread.pending:
+                thread.pending.remove(turn)
+            thread.users -= 1
+            if thread.users == 0:
+                self._threads.pop(thread_id, None)
+
+    async def _acquire_lease(self, key: str, deadline: float) -> Optional[str]:
+        """Take the redis lease of a thread, None without redis or on timeout."""
+        try:
+            redis = get_redis()
+        except RuntimeError:
+            return None
+        token = str(XID())
+        loop = asyncio.get_running_loop()
+        delay = 0.05
+        try:
+            while not await redis.set(
+                key, token, nx=True, px=int(self._lease_ttl * 1000)
+            ):
+                if loop.time() >= deadline:
+                    # run anyway, a late answer is better than none
+                    self._lease_timeouts += 1
+                    logger.warning(f"timed out waiting for {key}, running without it")
+                    return None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        except Exception as e:
+            logger.warning(f"failed to take {key}, running without it: {e}")
+            return None
+        return token
+
+    async def _renew_lease(self, key: str, token: str) -> None:
+        redis = get_redis()
+        while True:
+            await asyncio.sleep(self._lease_ttl / 3)
+            try:
+                if await redis.get(key) != token:
+                    logger.warning(f"lost {key} while the turn was running")
+                    return
+                await redis.pexpire(key, int(self._lease_ttl * 1000))
+            except Exception as e:
+                logger.warning(f"failed to renew {key}: {e}")
+
+    async def _release_lease(self, key: str, token: str) -> None:
+        try:
+            await get_redis().eval(_RELEASE_SCRIPT, 1, key, token)
+        except Exception as e:
+            logger.warning(f"failed to release {key}: {e}")
+
+    def stats(self) -> dict:
+        """Queue metrics of the mailbox, wait times are in the thread_wait stage."""
+        return {
+            "threads": len(self._threads),
+            "waiting": sum(len(t.pending) for t in self._threads.values()),
+            "turns": self._turns,
+            "coalesced": self._coalesced,
+            "lease_timeouts": self._lease_timeouts,
+            "wait_avg": self._wait_total / self._turns if self._turns else 0.0,
+        }
+
+
+thread_mailbox = ThreadMailbox(
+    lease_ttl=config.thread_lease_ttl,
+    wait_timeout=config.thread_wait_timeout,
+    coalesce=config.thread_coalesce,
+)
@@ -15,6 +15,32 @@ def agent_prompt(agent: Agent, agent_data: AgentData) -> str:
         prompt += f"Your name is {agent.name}.\n"
     if agent.ticker:
         prompt += f"Your ticker symbol is {agent.ticker}.\n"
+    prompt += "\n"
+    if agent.purpose:
+        prompt += f"## Purpose\n\n{agent.purpose}\n\n"
+    if agent.personality:
+        prompt += f"## Personality\n\n{agent.personality}\n\n"
+    if agent.principles:
+        prompt += f"## Principles\n\n{agent.principles}\n\n"
+    if agent.prompt:
+        prompt += f"## Initial Rules\n\n{agent.prompt}\n\n"
+    if (
+        agent.skills
+        and "enso" in agent.skills
+        and agent.skills["enso"].get("enabled", False)
+    ):
+        prompt += """## ENSO Skills Guide\n\nYou are integrated with the Enso API. You can use enso_get_tokens to retrieve token information,
+        including APY, Protocol Slug, Symbol, Address, Decimals, and underlying tokens. When interacting with token amounts,
+        ensure to multiply input amounts by the token's decimal places and divide output amounts by the token's decimals. 
+        Utilize enso_route_shortcut to find the best swap or deposit route. Set broadcast_request to True only when the 
+        user explicitly requests a transaction broadcast. Insufficient funds or insufficient spending approval can cause 
+        Route Shortcut broadcasts to fail. To avoid this, use the enso_broadcast_wallet_approve tool that requires explicit 
+        user confirmation before broadcasting any approval transactions for security reasons.\n\n"""
+    if agent.goat_enabled:
+        prompt += """## GOAT Skills Guide\n\nYou're using the Great Onchain Agent Toolkit (GOAT) SDK, which provides tools for DeFi, minting, betting, and analytics.
+        GOAT supports EVM blockchains and various wallets, including keypairs, smart wallets, LIT, and MPC.\n\n"""
+    # Runtime identity goes last, it changes when wallets or bots are set up,
+    # and everything before it stays a stable prefix for the prompt cache.
     if agent_data:
         # TODO: remember to change here after integrate goat
         if agent_data.cdp_wallet_data:
@@ -44,28 +70,4 @@ def agent_prompt(agent: Agent, agent_data: AgentData) -> str:
             prompt += f"Your telegram bot username is {agent_data.telegram_username}.\n"
         if agent_data.telegram_name:
             prompt += f"Your telegram bot name is {agent_data.telegram_name}.\n"
-    prompt += "\n"
-    if agent.purpose:
-        prompt += f"## Purpose\n\n{agent.purpose}\n\n"
-    if agent.personality:
-        prompt += f"## Personality\n\n{agent.personality}\n\n"
-    if agent.principles:
-        prompt += f"## Principles\n\n{agent.principles}\n\n"
-    if agent.prompt:
-        prompt += f"## Initial Rules\n\n{agent.prompt}\n\n"
-    if (
-        agent.skills
-        and "enso" in agent.skills
-        and agent.skills["enso"].get("enabled", False)
-    ):
-        prompt += """## ENSO Skills Guide\n\nYou are integrated with the Enso API. You can use enso_get_tokens to retrieve token information,
-        including APY, Protocol Slug, Symbol, Address, Decimals, and underlying tokens. When interacting with token amounts,
-        ensure to multiply input amounts by the token's decimal places and divide output amounts by the token's decimals. 
-        Utilize enso_route_shortcut to find the best swap or deposit route. Set broadcast_request to True only when the 
-        user explicitly requests a transaction broadcast. Insufficient funds or insufficient spending approval can cause 
-        Route Shortcut broadcasts to fail. To avoid this, use the enso_broadcast_wallet_approve tool that requires explicit 
-        user confirmation before broadcasting any approval transactions for security reasons.\n\n"""
-    if agent.goat_enabled:
-        prompt += """## GOAT Skills Guide\n\nYou're using the Great Onchain Agent Toolkit (GOAT) SDK, which provides tools for DeFi, minting, betting, and analytics.
-        GOAT supports EVM blockchains and various wallets, including keypairs, smart wallets, LIT, and MPC.\n\n"""
     return prompt
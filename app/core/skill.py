@@ -1,4 +1,8 @@
-from typing import Any, Dict, Optional
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from typing import Any, AsyncIterator, Dict, Optional, Union
 
 from abstracts.skill import SkillStoreABC
 from app.config.config import config
@@ -10,6 +14,61 @@ from models.skill import (
     ThreadSkillDataCreate,
 )
 
+logger = logging.getLogger(__name__)
+
+# Skill data saved with buffer in agent turns, flushed to the database when a
+# turn ends. Keyed by ("agent", agent_id, skill, key) or
+# ("thread", thread_id, skill, key).
+_pending: Dict[tuple, Union[AgentSkillDataCreate, ThreadSkillDataCreate]] = {}
+_in_turn: ContextVar[bool] = ContextVar("skill_data_in_turn", default=False)
+
+
+@asynccontextmanager
+async def buffered_skill_data() -> AsyncIterator[None]:
+    """Buffer the skill data writes of an agent turn that ask for it.
+
+    Only caches are buffered. Rate limit counters and cursors like the twitter
+    since_id must be seen by other processes at once, and are written through.
+    Repeated writes to a key are coalesced, and flushed in one statement per
+    table when the turn ends. Turns of this process read the buffered data,
+    other processes see it after the flush.
+    """
+    token = _in_turn.set(True)
+    try:
+        yield
+    finally:
+        _in_turn.reset(token)
+        await flush_skill_data()
+
+
+async def flush_skill_data() -> None:
+    """Write the buffered skill data, it stays buffered on error."""
+    if not _pending:
+        return
+    # still readable from the buffer while the flush runs
+    batch = dict(_pending)
+    try:
+        await AgentSkillDataCreate.save_all(
+            [v for k, v in batch.items() if k[0] == "agent"]
+        )
+        await ThreadSkillDataCreate.save_all(
+            [v for k, v in batch.items() if k[0] == "thread"]
+        )
+    except Exception as e:
+        logger.error(f"failed to flush {len(batch)} skill data records: {e}")
+        return
+    for k, v in batch.items():
+        # unless written again meanwhile
+        if _pending.get(k) is v:
+            del _pending[k]
+
+
+def discard_skill_data(agent_id: str, thread_id: str = "") -> None:
+    """Drop the buffered skill data of an agent, or of one of its threads."""
+    for k, v in list(_pending.items()):
+        if v.agent_id == agent_id and (not thread_id or k[1] == thread_id):
+            del _pending[k]
+
 
 class SkillStore(SkillStoreABC):
     """Implementation of skill data storage operations.
@@ -55,11 +114,14 @@ class SkillStore(SkillStoreABC):
         Returns:
             Dictionary containing the skill data if found, None otherwise
         """
+        pending = _pending.get(("agent", agent_id, skill, key))
+        if pending is not None:
+            return deepcopy(pending.data)
         return await AgentSkillData.get(agent_id, skill, key)
 
     @staticmethod
     async def save_agent_skill_data(
-        agent_id: str, skill: str, key: str, data: Dict[str, Any]
+        agent_id: str, skill: str, key: str, data: Dict[str, Any], buffer: bool = False
     ) -> None:
         """Save or update skill data for an agent.
 
@@ -68,13 +130,20 @@ class SkillStore(SkillStoreABC):
             skill: Name of the skill
             key: Data key
             data: JSON data to store
+            buffer: Write it when the agent turn ends, only for data that
+                may be lost or seen late, like caches
         """
         skill_data = AgentSkillDataCreate(
             agent_id=agent_id,
             skill=skill,
             key=key,
-            data=data,
+            data=deepcopy(data),
         )
+        if buffer and _in_turn.get():
+            _pending[("agent", agent_id, skill, key)] = skill_data
+            return
+        # a buffered write must not overwrite this one later
+        _pending.pop(("agent", agent_id, skill, key), None)
         await skill_data.save()
 
     @staticmethod
@@ -91,6 +160,9 @@ class SkillStore(SkillStoreABC):
         Returns:
             Dictionary containing the skill data if found, None otherwise
         """
+        pending = _pending.get(("thread", thread_id, skill, key))
+        if pending is not None:
+            return deepcopy(pending.data)
         return await ThreadSkillData.get(thread_id, skill, key)
 
     @staticmethod
@@ -100,6 +172,7 @@ class SkillStore(SkillStoreABC):
         skill: str,
         key: str,
         data: Dict[str, Any],
+        buffer: bool = False,
     ) -> None:
         """Save or update skill data for a thread.
 
@@ -109,14 +182,21 @@ class SkillStore(SkillStoreABC):
             skill: Name of the skill
             key: Data key
             data: JSON data to store
+            buffer: Write it when the agent turn ends, only for data that
+                may be lost or seen late, like caches
         """
         skill_data = ThreadSkillDataCreate(
             thread_id=thread_id,
             agent_id=agent_id,
             skill=skill,
             key=key,
-            data=data,
+            data=deepcopy(data),
         )
+        if buffer and _in_turn.get():
+            _pending[("thread", thread_id, skill, key)] = skill_data
+            return
+        # a buffered write must not overwrite this one later
+        _pending.pop(("thread", thread_id, skill, key), None)
         await skill_data.save()
 
 
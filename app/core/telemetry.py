@@ -0,0 +1,198 @@
+"""Agent turn telemetry.
+
+The stages of an agent turn are timed into prometheus histograms, and
+recorded as OpenTelemetry spans. Spans cost nothing until an OpenTelemetry SDK
+is configured in the process. The API apps serve the metrics on /metrics, the
+processes without an API on METRICS_PORT.
+
+Stages timed in the engine: quota, payment_check, executor, thread_wait,
+credit. Stages timed by the turn callbacks: llm, llm_first_token, tool (per
+skill), memory_manager. The checkpointer times checkpoint_write.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from opentelemetry import trace
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    make_asgi_app,
+    multiprocess,
+    start_http_server,
+)
+
+from app.config.config import config
+from models.llm import record_llm_transport_metrics
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("intentkit.agent")
+
+# Seconds, from a cache hit to a long tool call
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "intentkit_agent_stage_seconds",
+    "Time spent in each stage of an agent turn",
+    ["stage", "agent", "model", "entrypoint"],
+    buckets=_BUCKETS,
+)
+SKILL_SECONDS = Histogram(
+    "intentkit_skill_seconds",
+    "Time spent in each skill call",
+    ["skill", "agent", "entrypoint", "status"],
+    buckets=_BUCKETS,
+)
+TURN_SECONDS = Histogram(
+    "intentkit_agent_turn_seconds",
+    "Time of a whole agent turn",
+    ["agent", "model", "entrypoint"],
+    buckets=_BUCKETS,
+)
+TURNS = Counter(
+    "intentkit_agent_turns",
+    "Agent turns by result",
+    ["agent", "model", "entrypoint", "status"],
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to serve, collecting from all workers when run by gunicorn.
+
+    Gunicorn workers must share PROMETHEUS_MULTIPROC_DIR for the samples of
+    every worker to be collected, see gunicorn.conf.py.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_app():
+    """Prometheus endpoint of an API app."""
+    return make_asgi_app(registry=metrics_registry())
+
+
+def start_metrics_server() -> None:
+    """Serve the metrics of a process without an API on METRICS_PORT, 0 turns it off."""
+    if not config.metrics_port:
+        return
+    start_http_server(config.metrics_port, registry=metrics_registry())
+    logger.info(f"serving metrics on port {config.metrics_port}")
+
+
+# Graph nodes timed as a stage of their own
+_TIMED_NODES = {"memory_manager"}
+
+
+def turn_labels(
+    agent_id: str, model: Optional[str] = None, entrypoint: Optional[str] = None
+) -> dict[str, str]:
+    """Metric labels of a turn, the agent is left out if configured so."""
+    return {
+        "agent": agent_id if config.metrics_agent_label else "",
+        "model": model or "",
+        "entrypoint": str(getattr(entrypoint, "value", entrypoint) or ""),
+    }
+
+
+def observe(name: str, labels: dict[str, str], seconds: float) -> None:
+    STAGE_SECONDS.labels(stage=name, **labels).observe(seconds)
+
+
+@contextmanager
+def stage(name: str, labels: dict[str, str]) -> Iterator[None]:
+    """Time a stage of an agent turn, as a histogram sample and a span."""
+    start = time.perf_counter()
+    with tracer.start_as_current_span(f"agent.{name}", attributes=labels):
+        try:
+            yield
+        finally:
+            observe(name, labels, time.perf_counter() - start)
+
+
+@dataclass
+class _Run:
+    kind: str
+    name: str
+    start: float
+    span: Any
+
+
+class TurnTelemetry(AsyncCallbackHandler):
+    """Time the LLM calls, skill calls and timed nodes of an agent turn."""
+
+    def __init__(self, labels: dict[str, str]):
+        self.labels = labels
+        self._runs: dict[UUID, _Run] = {}
+        self._first_token: set[UUID] = set()
+
+    def _start(self, run_id: UUID, kind: str, name: str, attributes: dict) -> None:
+        span = tracer.start_span(f"agent.{kind}", attributes=attributes)
+        self._runs[run_id] = _Run(kind, name, time.perf_counter(), span)
+
+    def _end(self, run_id: UUID, kind: str, status: str) -> None:
+        run = self._runs.get(run_id)
+        if run is None or run.kind != kind:
+            return
+        del self._runs[run_id]
+        self._first_token.discard(run_id)
+        run.span.end()
+        seconds = time.perf_counter() - run.start
+        if kind == "tool":
+            SKILL_SECONDS.labels(
+                skill=run.name,
+                agent=self.labels["agent"],
+                entrypoint=self.labels["entrypoint"],
+                status=status,
+            ).observe(seconds)
+        elif status == "success":
+            observe(run.name, self.labels, seconds)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm", "llm", self.labels)
+        record_llm_transport_metrics()
+
+    async def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None or run_id in self._first_token:
+            return
+        self._first_token.add(run_id)
+        observe("llm_first_token", self.labels, time.perf_counter() - run.start)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "llm", "success")
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "llm", "error")
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or ""
+        self._start(run_id, "tool", name, {**self.labels, "skill": name})
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, "tool", "success")
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "tool", "error")
+
+    async def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        name = kwargs.get("name")
+        if name in _TIMED_NODES:
+            self._start(run_id, "node", name, {**self.labels, "node": name})
+
+    async def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id, "node", "success")
+
+    async def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "node", "error")
@@ -0,0 +1,172 @@
+"""Tests for the bulk free credits refill.
+
+They run against a real database, configured like the services with DB_HOST
+and the other DB_* variables. Every test rolls back its changes.
+"""
+
+import os
+import unittest
+from decimal import Decimal
+
+from epyxid import XID
+from sqlalchemy import select, update
+
+from app.core.credit import refill_free_credits_chunk
+from models.credit import (
+    DEFAULT_PLATFORM_ACCOUNT_REFILL,
+    CreditAccount,
+    CreditAccountTable,
+    CreditDebit,
+    CreditEventTable,
+    CreditEventUpstreamTable,
+    CreditRollupTable,
+    CreditTransactionTable,
+    EventType,
+    OwnerType,
+    UpstreamType,
+)
+from models.db import get_engine, get_session, init_db
+
+
+@unittest.skipUnless(os.getenv("DB_HOST"), "needs a database, set DB_HOST")
+class TestRefillFreeCreditsChunk(unittest.IsolatedAsyncioTestCase):
+    """Test refilling one chunk of accounts."""
+
+    async def asyncSetUp(self):
+        from app.config.config import config
+
+        await init_db(**config.db)
+
+    async def asyncTearDown(self):
+        # the pool is bound to the event loop of this test
+        await get_engine().dispose()
+
+    async def _free_credits(self, session, account_id: str) -> Decimal:
+        return await session.scalar(
+            select(CreditAccountTable.free_credits).where(
+                CreditAccountTable.id == account_id
+            )
+        )
+
+    async def test_refill_chunk(self):
+        """Test balances, event ids, events, transactions and rollups of a chunk."""
+        async with get_session() as session:
+            try:
+                await CreditAccount.get_or_create_in_session(
+                    session, OwnerType.PLATFORM, DEFAULT_PLATFORM_ACCOUNT_REFILL
+                )
+                accounts = [
+                    await CreditAccount.create_in_session(
+                        session, OwnerType.USER, f"test-{XID()}"
+                    )
+                    for _ in range(2)
+                ]
+                # quota 480 and refill 20, the second account only needs 10
+                for account, free_credits in zip(accounts, ("0", "470")):
+                    await session.execute(
+                        update(CreditAccountTable)
+                        .where(CreditAccountTable.id == account.id)
+                        .values(free_credits=Decimal(free_credits))
+                    )
+                platform_before = await self._free_credits(
+                    session, DEFAULT_PLATFORM_ACCOUNT_REFILL
+                )
+                run_key = f"test:{XID()}:"
+                id_before = str(XID())
+
+                last_id, refilled, total = await refill_free_credits_chunk(
+                    session, accounts[0].id[:-1], 2, run_key
+                )
+
+                self.assertEqual(last_id, accounts[1].id)
+                self.assertEqual(refilled, 2)
+                self.assertEqual(total, Decimal("30"))
+                self.assertEqual(
+                    await self._free_credits(session, accounts[0].id), Decimal("20")
+                )
+                self.assertEqual(
+                    await self._free_credits(session, accounts[1].id), Decimal("480")
+                )
+                self.assertEqual(
+                    await self._free_credits(session, DEFAULT_PLATFORM_ACCOUNT_REFILL),
+                    platform_before - Decimal("30"),
+                )
+
+                events = (
+                    await session.scalars(
+                        select(CreditEventTable)
+                        .where(
+                            CreditEventTable.upstream_type == UpstreamType.SCHEDULER,
+                            CreditEventTable.upstream_tx_id.in_(
+                                [run_key + account.id for account in accounts]
+                            ),
+                        )
+                        .order_by(CreditEventTable.account_id)
+                    )
+                ).all()
+                self.assertEqual(len(events), 2)
+                for event, account, amount in zip(
+                    events, accounts, (Decimal("20"), Decimal("10"))
+                ):
+                    # event ids are XIDs, pollers paging by id see them
+                    self.assertEqual(len(event.id), len(id_before))
+                    self.assertGreater(event.id, id_before)
+                    self.assertEqual(event.account_id, account.id)
+                    self.assertEqual(event.event_type, EventType.REFILL)
+                    self.assertEqual(event.total_amount, amount)
+                    self.assertEqual(
+                        await session.scalar(
+                            select(CreditEventUpstreamTable.event_id).where(
+                                CreditEventUpstreamTable.upstream_type
+                                == UpstreamType.SCHEDULER,
+                                CreditEventUpstreamTable.upstream_tx_id
+                                == event.upstream_tx_id,
+                            )
+                        ),
+                        event.id,
+                    )
+
+                    txs = (
+                        await session.scalars(
+                            select(CreditTransactionTable).where(
+                                CreditTransactionTable.event_id == event.id
+                            )
+                        )
+                    ).all()
+                    self.assertEqual(len(txs), 2)
+                    by_side = {tx.credit_debit: tx for tx in txs}
+                    self.assertEqual(by_side[CreditDebit.CREDIT].account_id, account.id)
+                    self.assertEqual(
+                        by_side[CreditDebit.DEBIT].account_id,
+                        DEFAULT_PLATFORM_ACCOUNT_REFILL,
+                    )
+                    for tx in txs:
+                        self.assertEqual(tx.change_amount, amount)
+                        self.assertGreater(tx.id, id_before)
+
+                # added to the rollups of the initial refill of the accounts
+                for account, amount in zip(accounts, (Decimal("20"), Decimal("10"))):
+                    rollup = await session.scalar(
+                        select(CreditRollupTable).where(
+                            CreditRollupTable.account_id == account.id,
+                            CreditRollupTable.event_type == EventType.REFILL,
+                        )
+                    )
+                    self.assertEqual(rollup.event_count, 2)
+                    self.assertEqual(rollup.amount, Decimal("480") + amount)
+
+                # the same run again skips the accounts it claimed
+                _, refilled, total = await refill_free_credits_chunk(
+                    session, accounts[0].id[:-1], 2, run_key
+                )
+                self.assertEqual(refilled, 0)
+                self.assertEqual(total, Decimal("0"))
+                self.assertEqual(
+                    await self._free_credits(session, accounts[0].id), Decimal("20")
+                )
+            finally:
+                await session.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""Tests for the per thread mailbox."""
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from app.core.mailbox import ThreadMailbox
+from models.chat import AuthorType, ChatMessageCreate
+
+
+def _message(user_id: str = "user", author_type=AuthorType.WEB) -> ChatMessageCreate:
+    return ChatMessageCreate(
+        agent_id="agent",
+        chat_id="chat",
+        user_id=user_id,
+        author_id=user_id,
+        author_type=author_type,
+        message="hello",
+    )
+
+
+class FakeRedis:
+    """The redis commands the mailbox uses, kept in a dict."""
+
+    def __init__(self):
+        self.data: dict[str, str] = {}
+        self.expires: list[str] = []
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def pexpire(self, key, ms):
+        self.expires.append(key)
+        return key in self.data
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+class TestThreadMailbox(unittest.IsolatedAsyncioTestCase):
+    """Test serialization, coalescing, leases and cancellation."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch("app.core.mailbox.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_turns_of_a_thread_run_one_at_a_time(self):
+        """Turns of one thread do not overlap, turns of other threads do."""
+        mailbox = ThreadMailbox(lease_ttl=10, wait_timeout=5, coalesce=False)
+        running: dict[str, int] = {"a": 0, "b": 0}
+        peak: dict[str, int] = {"a": 0, "b": 0}
+
+        async def run(thread_id):
+            async with mailbox.turn(thread_id, _message()) as turn:
+                running[thread_id] += 1
+                peak[thread_id] = max(peak[thread_id], running[thread_id])
+                await asyncio.sleep(0.01)
+                running[thread_id] -= 1
+                turn.result = []
+
+        await asyncio.gather(*(run(t) for t in ("a", "a", "a", "b", "b")))
+        self.assertEqual(peak, {"a": 1, "b": 1})
+        self.assertEqual(mailbox.stats()["turns"], 5)
+        self.assertEqual(mailbox.stats()["threads"], 0)
+
+    async def test_lease_is_held_and_released(self):
+        """A turn holds the redis lease of its thread while it runs."""
+        mailbox = ThreadMailbox(lease_ttl=0.03, wait_timeout=5, coalesce=False)
+        async with mailbox.turn("t", _message()) as turn:
+            self.assertIn("intentkit:thread_lease:t", self.redis.data)
+            # long enough for the lease to be renewed
+            await asyncio.sleep(0.05)
+            turn.result = []
+        self.assertNotIn("intentkit:thread_lease:t", self.redis.data)
+        self.assertIn("intentkit:thread_lease:t", self.redis.expires)
+
+    async def test_lease_of_another_process_times_out(self):
+        """A lease held elsewhere is waited for, then the turn runs anyway."""
+        mailbox = ThreadMailbox(lease_ttl=10, wait_timeout=0.1, coalesce=False)
+        self.redis.data["intentkit:thread_lease:t"] = "other"
+        async with mailbox.turn("t", _message()) as turn:
+            self.assertGreaterEqual(turn.wait, 0.1)
+            turn.result = []
+        # the lease of the other process is left alone
+        self.assertEqual(self.redis.data["intentkit:thread_lease:t"], "other")
+        self.assertEqual(mailbox.stats()["lease_timeouts"], 1)
+
+    async def test_waiting_messages_of_the_same_user_are_coalesced(self):
+        """Messages of the turn user waiting on the thread get its answer."""
+        mailbox = ThreadMailbox(lease_ttl=10, wait_timeout=5, coalesce=True)
+        release = asyncio.Event()
+        results = {}
+
+        async def run(name, message):
+            async with mailbox.turn("t", message) as turn:
+                if turn.result is None:
+                    if name == "holder":
+                        await release.wait()
+                    turn.result = [name, len(turn.merged)]
+                results[name] = turn.result
+
+        tasks = []
+        for name, user_id in (
+            ("holder", "holder"),
+            ("first", "user"),
+            ("second", "user"),
+            ("other", "other"),
+        ):
+            tasks.append(asyncio.create_task(run(name, _message(user_id))))
+            await asyncio.sleep(0)
+        self.assertEqual(mailbox.stats()["waiting"], 3)
+        release.set()
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(results["holder"], ["holder", 0])
+        self.assertEqual(results["first"], ["first", 1])
+        self.assertEqual(results["second"], ["first", 1])
+        self.assertEqual(results["other"], ["other", 0])
+        self.assertEqual(mailbox.stats()["coalesced"], 1)
+        self.assertEqual(mailbox.stats()["turns"], 3)
+
+    async def test_cancelled_waiter_leaves_the_thread(self):
+        """A turn cancelled while waiting is not pending, nor answered later."""
+        mailbox = ThreadMailbox(lease_ttl=10, wait_timeout=5, coalesce=True)
+        release = asyncio.Event()
+
+        async def hold():
+            async with mailbox.turn("t", _message("holder")) as turn:
+                await release.wait()
+                turn.result = []
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        async def wait():
+            async with mailbox.turn("t", _message()):
+                pass
+
+        waiter = asyncio.create_task(wait())
+        await asyncio.sleep(0)
+        self.assertEqual(mailbox.stats()["waiting"], 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(mailbox.stats()["waiting"], 0)
+
+        release.set()
+        await holder
+        self.assertEqual(mailbox.stats()["threads"], 0)
+
+    async def test_stats_are_read_only(self):
+        """Reading the stats does not change them."""
+        mailbox = ThreadMailbox(lease_ttl=10, wait_timeout=5, coalesce=False)
+        async with mailbox.turn("t", _message()) as turn:
+            turn.result = []
+        self.assertEqual(mailbox.stats(), mailbox.stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
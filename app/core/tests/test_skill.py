@@ -0,0 +1,90 @@
+"""Tests for the skill data buffer of agent turns."""
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.core import skill as skill_module
+from app.core.skill import buffered_skill_data, flush_skill_data, skill_store
+from models.skill import AgentSkillDataCreate, ThreadSkillDataCreate
+
+
+class TestBufferedSkillData(unittest.IsolatedAsyncioTestCase):
+    """Test coalescing, reads of buffered data, write through and failed flushes."""
+
+    def setUp(self):
+        skill_module._pending.clear()
+        self.addCleanup(skill_module._pending.clear)
+        self.save = AsyncMock()
+        self.save_all = AsyncMock()
+        self.get = AsyncMock(return_value=None)
+        for patcher in (
+            patch.object(AgentSkillDataCreate, "save", self.save),
+            patch.object(AgentSkillDataCreate, "save_all", self.save_all),
+            patch.object(ThreadSkillDataCreate, "save_all", AsyncMock()),
+            patch.object(skill_module.AgentSkillData, "get", self.get),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def saved(self) -> list[dict]:
+        return [r.data for call in self.save_all.await_args_list for r in call.args[0]]
+
+    async def test_buffered_writes_are_coalesced(self):
+        """Writes of a key in a turn are flushed once, with the last value."""
+        async with buffered_skill_data():
+            for i in range(3):
+                await skill_store.save_agent_skill_data(
+                    "agent", "cache", "key", {"i": i}, buffer=True
+                )
+            self.save_all.assert_not_awaited()
+        self.assertEqual(self.saved(), [{"i": 2}])
+        self.save.assert_not_awaited()
+
+    async def test_buffered_writes_are_read_back(self):
+        """Reads in this process see the buffered value before the flush."""
+        async with buffered_skill_data():
+            data = {"tokens": [1]}
+            await skill_store.save_agent_skill_data(
+                "agent", "cache", "key", data, buffer=True
+            )
+            data["tokens"].append(2)
+            read = await skill_store.get_agent_skill_data("agent", "cache", "key")
+            self.assertEqual(read, {"tokens": [1]})
+            self.get.assert_not_awaited()
+
+    async def test_unbuffered_writes_go_through(self):
+        """Rate limit counters and cursors are written at once, even in a turn."""
+        async with buffered_skill_data():
+            await skill_store.save_agent_skill_data(
+                "agent", "cache", "key", {"stale": True}, buffer=True
+            )
+            await skill_store.save_agent_skill_data(
+                "agent", "twitter", "last", {"since_id": "2"}
+            )
+            self.save.assert_awaited_once()
+            await skill_store.save_agent_skill_data(
+                "agent", "cache", "key", {"stale": False}
+            )
+            # the written value is not overwritten by the buffered one
+            self.assertEqual(skill_module._pending, {})
+        self.assertEqual(self.save.await_count, 2)
+        self.assertEqual(self.saved(), [])
+
+    async def test_failed_flush_keeps_the_data(self):
+        """A failed flush keeps the records, the next flush writes them."""
+        self.save_all.side_effect = [RuntimeError("database is down"), None]
+        async with buffered_skill_data():
+            await skill_store.save_agent_skill_data(
+                "agent", "cache", "key", {"i": 1}, buffer=True
+            )
+        self.assertIn(("agent", "agent", "cache", "key"), skill_module._pending)
+        read = await skill_store.get_agent_skill_data("agent", "cache", "key")
+        self.assertEqual(read, {"i": 1})
+
+        await flush_skill_data()
+        self.assertEqual(skill_module._pending, {})
+        self.assertEqual(self.saved(), [{"i": 1}, {"i": 1}])
+
+
+if __name__ == "__main__":
+    unittest.main()
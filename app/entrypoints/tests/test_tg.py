@@ -0,0 +1,63 @@
+"""Tests for the telegram agent scheduler."""
+
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.entrypoints.tg import AgentScheduler
+
+
+class TestAgentScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test the leader lease held while a sweep runs."""
+
+    def setUp(self):
+        self.scheduler = AgentScheduler(bot_pool=None)
+        self.scheduler._last_updated_at = "seen"
+        self.scheduler._retry_ids.add("agent")
+        self.acquire = AsyncMock(return_value=True)
+        patcher = patch("app.entrypoints.tg.registry.acquire_leadership", self.acquire)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_lease_is_renewed_during_a_long_sweep(self):
+        """A sweep longer than the lease renews it until the sweep is done."""
+
+        async def sync():
+            await asyncio.sleep(0.1)
+
+        with patch.object(self.scheduler, "sync", sync):
+            await self.scheduler.sync_as_leader(0.03)
+        self.assertGreaterEqual(self.acquire.await_count, 2)
+        self.assertEqual(self.scheduler._last_updated_at, "seen")
+
+    async def test_sweep_stops_when_the_lease_is_lost(self):
+        """Another replica took the lease, the sweep is cancelled and forgotten."""
+        self.acquire.return_value = False
+        cancelled = asyncio.Event()
+
+        async def sync():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch.object(self.scheduler, "sync", sync):
+            await self.scheduler.sync_as_leader(0.03)
+        self.assertTrue(cancelled.is_set())
+        self.assertIsNone(self.scheduler._last_updated_at)
+        self.assertEqual(self.scheduler._retry_ids, set())
+
+    async def test_sweep_errors_are_raised(self):
+        """A failed sweep is raised to the scheduler loop."""
+
+        async def sync():
+            raise RuntimeError("database is down")
+
+        with patch.object(self.scheduler, "sync", sync):
+            with self.assertRaises(RuntimeError):
+                await self.scheduler.sync_as_leader(10)
+
+
+if __name__ == "__main__":
+    unittest.main()
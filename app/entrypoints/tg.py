@@ -1,84 +1,207 @@
 import asyncio
 import logging
 import signal
-import sys
+from datetime import datetime, timedelta
+from typing import Optional
 
-from sqlalchemy import select
+from sqlalchemy import or_, select
 
 from app.config.config import config
-from app.services.tg.bot import pool
+from app.core.telemetry import start_metrics_server
+from app.services.tg.bot import pool, registry
 from app.services.tg.bot.pool import BotPool, bot_by_token
 from app.services.tg.utils.cleanup import clean_token_str
+from app.services.tg.utils.task_pool import RateLimitedTaskPool
 from models.agent import Agent, AgentData, AgentTable
 from models.db import get_session, init_db
+from models.llm import load_model_catalogue
 from models.redis import init_redis
 
 logger = logging.getLogger(__name__)
 
 
+# Rows whose updated_at is within this window before the last seen change are
+# read again, to catch transactions that committed after the previous sweep.
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
 class AgentScheduler:
     def __init__(self, bot_pool: BotPool):
         self.bot_pool = bot_pool
+        self.task_pool = RateLimitedTaskPool(
+            config.tg_sync_concurrency, config.tg_sync_rate
+        )
+        self._last_updated_at: Optional[datetime] = None
+        self._pending_tokens: set[str] = set()
+        # agents that failed to sync, read again in every sweep until they do
+        self._retry_ids: set[str] = set()
 
-    async def sync(self):
+    async def save_bot_info(self, agent_id: str, token: str):
+        """Refresh the telegram identity in agent data from the cached bot item."""
+        bot = bot_by_token(token)
+        if not bot or not bot.bot_info:
+            return
+        bot_info = bot.bot_info
+        agent_data = await AgentData.get(agent_id)
+        if not agent_data:
+            agent_data = AgentData(id=agent_id)
+        agent_data.telegram_id = str(bot_info.id)
+        agent_data.telegram_username = bot_info.username
+        agent_data.telegram_name = bot_info.first_name
+        if bot_info.last_name:
+            agent_data.telegram_name = f"{bot_info.first_name} {bot_info.last_name}"
+        await agent_data.save()
+
+    async def changed_agents(self) -> list[AgentTable]:
+        """Read the agents updated since the last sweep, all agents on the first one.
+
+        Agents that failed to sync in an earlier sweep are read again as well.
+        """
+        stmt = select(AgentTable).order_by(AgentTable.updated_at)
+        if self._last_updated_at:
+            stmt = stmt.where(
+                or_(
+                    AgentTable.updated_at >= self._last_updated_at - SYNC_OVERLAP,
+                    AgentTable.id.in_(self._retry_ids),
+                )
+            )
         async with get_session() as db:
-            # Get all telegram agents
-            agents = await db.scalars(select(AgentTable))
+            return list(await db.scalars(stmt))
 
-        for item in agents:
-            agent = Agent.model_validate(item)
-            try:
-                if agent.id not in pool._agent_bots:
-                    if (
-                        agent.telegram_entrypoint_enabled
-                        and agent.telegram_config
-                        and agent.telegram_config.get("token")
-                    ):
-                        token = clean_token_str(agent.telegram_config["token"])
-                        if token in pool._bots:
-                            logger.warning(
-                                f"there is an existing bot with {token}, skipping agent {agent.id}..."
-                            )
-                            continue
-
-                        logger.info(f"New agent with id {agent.id} found...")
-                        await self.bot_pool.init_new_bot(agent)
-                        await asyncio.sleep(1)
-                        bot = bot_by_token(token)
-                        if not bot:
-                            continue
-                        bot_info = await bot.bot.get_me()
-                        # after bot init, refresh its info to agent data
-                        agent_data = await AgentData.get(agent.id)
-                        if not agent_data:
-                            agent_data = AgentData(id=agent.id)
-                        agent_data.telegram_id = str(bot_info.id)
-                        agent_data.telegram_username = bot_info.username
-                        agent_data.telegram_name = bot_info.first_name
-                        if bot_info.last_name:
-                            agent_data.telegram_name = (
-                                f"{bot_info.first_name} {bot_info.last_name}"
-                            )
-                        await agent_data.save()
+    def is_synced(self, agent: Agent) -> bool:
+        """Whether the bot pool reflects this version of the agent."""
+        agent_item = pool._agent_bots.get(agent.id)
+        if agent_item is None:
+            return not agent.telegram_entrypoint_enabled
+        return agent_item.updated_at == agent.updated_at
+
+    async def process_agent(self, agent: Agent) -> bool:
+        """Apply the changes of one agent to the bot pool, return True if changed.
+
+        The bot pool logs and swallows telegram errors, so an agent the pool
+        does not reflect afterwards is kept for a retry in the next sweep.
+        """
+        changed = False
+        try:
+            if agent.id not in pool._agent_bots:
+                if (
+                    agent.telegram_entrypoint_enabled
+                    and agent.telegram_config
+                    and agent.telegram_config.get("token")
+                ):
+                    token = clean_token_str(agent.telegram_config["token"])
+                    if token in pool._bots or token in self._pending_tokens:
+                        logger.warning(
+                            f"there is an existing bot with {token}, skipping agent {agent.id}..."
+                        )
+                        self._retry_ids.add(agent.id)
+                        return False
+
+                    logger.info(f"New agent with id {agent.id} found...")
+                    self._pending_tokens.add(token)
+                    try:
+                        await self.task_pool.run(self.bot_pool.init_new_bot, agent)
+                    finally:
+                        self._pending_tokens.discard(token)
+                    await self.save_bot_info(agent.id, token)
+                    changed = True
                 else:
-                    cached_agent = pool._agent_bots[agent.id]
-                    if cached_agent.updated_at != agent.updated_at:
-                        if agent.telegram_config.get("token") not in pool._bots:
-                            await self.bot_pool.change_bot_token(agent)
-                            await asyncio.sleep(2)
-                        else:
-                            await self.bot_pool.modify_config(agent)
+                    self._retry_ids.discard(agent.id)
+                    return False
+            else:
+                cached_agent = pool._agent_bots[agent.id]
+                if cached_agent.updated_at != agent.updated_at:
+                    if agent.telegram_config.get("token") not in pool._bots:
+                        await self.task_pool.run(self.bot_pool.change_bot_token, agent)
+                        if agent.telegram_entrypoint_enabled:
+                            await self.save_bot_info(
+                                agent.id,
+                                clean_token_str(agent.telegram_config["token"]),
+                            )
+                    else:
+                        await self.bot_pool.modify_config(agent)
+                    changed = True
+        except Exception as e:
+            logger.error(
+                f"failed to process agent {agent.id}, retrying it in the next sync: {e}"
+            )
+            self._retry_ids.add(agent.id)
+            return False
+        if self.is_synced(agent):
+            self._retry_ids.discard(agent.id)
+        else:
+            logger.warning(
+                f"agent {agent.id} is not synced, retrying it in the next sync"
+            )
+            self._retry_ids.add(agent.id)
+        return changed
+
+    async def sync(self):
+        items = await self.changed_agents()
+        if not items:
+            return
+
+        agents = []
+        for item in items:
+            try:
+                agents.append(Agent.model_validate(item))
             except Exception as e:
-                logger.error(
-                    f"failed to process agent {agent.id}, skipping this to the next agent: {e}"
-                )
+                logger.error(f"failed to validate agent {item.id}: {e}")
+                self._retry_ids.add(item.id)
+
+        # bots are independent of each other, the task pool limits the telegram calls
+        results = await asyncio.gather(*(self.process_agent(agent) for agent in agents))
+        self._last_updated_at = max(item.updated_at for item in items)
+        changed = sum(1 for r in results if r)
+        if changed:
+            logger.info(f"{changed} telegram bots changed in this sync")
+
+    def follow(self):
+        """Forget the sync state, a replica that becomes leader does a full sweep."""
+        self._last_updated_at = None
+        self._retry_ids.clear()
+
+    async def _renew_leadership(self, ttl: int) -> None:
+        """Renew the sync leader lease while a sweep runs, return when it is lost."""
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                if not await registry.acquire_leadership(ttl):
+                    logger.warning("lost the sync leader lease while syncing")
+                    return
+            except Exception as e:
+                logger.warning(f"failed to renew the sync leader lease: {e}")
+
+    async def sync_as_leader(self, ttl: int):
+        """Sync while holding the leader lease, stop the sweep if it is lost.
+
+        A full sweep limited by the telegram rate can outlast the lease, so it
+        is renewed while the sweep runs.
+        """
+        sync = asyncio.create_task(self.sync())
+        renewal = asyncio.create_task(self._renew_leadership(ttl))
+        try:
+            await asyncio.wait({sync, renewal}, return_when=asyncio.FIRST_COMPLETED)
+            if sync.done():
+                return sync.result()
+            # another replica leads now, it sweeps the agents again
+            sync.cancel()
+            await asyncio.gather(sync, return_exceptions=True)
+            self.follow()
+        finally:
+            renewal.cancel()
+            sync.cancel()
 
     async def start(self, interval):
         logger.info("New agent addition tracking started...")
         while True:
-            logger.info("sync agents...")
             try:
-                await self.sync()
+                # only one replica manages bot webhooks, the others mirror the registry
+                if await registry.acquire_leadership(interval * 3):
+                    logger.info("sync agents...")
+                    await self.sync_as_leader(interval * 3)
+                else:
+                    self.follow()
             except Exception as e:
                 logger.error(f"failed to sync agents: {e}")
 
@@ -87,7 +210,7 @@ class AgentScheduler:
 
 async def run_telegram_server() -> None:
     # Initialize database connection
-    await init_db(**config.db)
+    await init_db(**config.db, role="telegram")
 
     # Initialize Redis if configured
     if config.redis_host:
@@ -96,15 +219,16 @@ async def run_telegram_server() -> None:
             port=config.redis_port,
         )
 
-    # Signal handler for graceful shutdown
-    def signal_handler(signum, frame):
-        logger.info("Received termination signal. Shutting down gracefully...")
-        scheduler.shutdown()
-        sys.exit(0)
+    # Load the model catalogue before serving agents
+    await load_model_catalogue()
 
-    # Register signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    start_metrics_server()
+
+    # Shut down gracefully on a termination signal
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
 
     logger.info("Initialize bot pool...")
     bot_pool = BotPool(config.tg_base_url)
@@ -112,19 +236,23 @@ async def run_telegram_server() -> None:
     bot_pool.init_god_bot()
     bot_pool.init_all_dispatchers()
 
+    # Bots already running are restored from the shared registry, their webhooks
+    # are still registered, so no telegram call is needed
+    restored = await pool.load_registry()
+    if restored:
+        logger.info(f"{restored} bots restored from registry")
+    asyncio.create_task(registry.listen(pool.apply_registry_event))
+
     scheduler = AgentScheduler(bot_pool)
 
     # Start the scheduler
     asyncio.create_task(scheduler.start(int(config.tg_new_agent_poll_interval)))
 
     # Start the bot pool
-    await bot_pool.start(
-        asyncio.get_running_loop(), config.tg_server_host, int(config.tg_server_port)
-    )
+    await bot_pool.start(loop, config.tg_server_host, int(config.tg_server_port))
 
-    # Keep the server running
-    try:
-        while True:
-            await asyncio.sleep(3600)  # Sleep for an hour
-    except asyncio.CancelledError:
-        logging.info("Server shutdown initiated")
+    # Keep the server running until a termination signal
+    await stop.wait()
+    logger.info("Received termination signal. Shutting down gracefully...")
+    # messages acknowledged to telegram are still queued in memory
+    await bot_pool.stop(config.tg_queue_drain_timeout)
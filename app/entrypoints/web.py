@@ -36,7 +36,7 @@ from models.chat import (
     ChatMessageRequest,
     ChatMessageTable,
 )
-from models.db import get_db
+from models.db import get_db, get_replica_db
 from utils.middleware import create_jwt_middleware
 
 # init logger
@@ -149,7 +149,7 @@ async def debug_chat_memory(
 async def debug_chat_history(
     agent_id: str = Path(..., description="Agent id"),
     chat_id: str = Path(..., description="Chat id"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> str:
     resp = f"Agent ID:\t{agent_id}\n\nChat ID:\t{chat_id}\n\n-------------------\n\n"
     messages = await get_chat_history(agent_id, chat_id, user_id=None, db=db)
@@ -288,7 +288,7 @@ async def get_chat_history(
     aid: str = Path(..., description="Agent ID"),
     chat_id: str = Query(..., description="Chat ID to get history for"),
     user_id: Optional[str] = Query(None, description="User ID"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> List[ChatMessage]:
     """Get last 50 messages for a specific chat.
 
@@ -800,7 +800,7 @@ async def delete_chat(
 )
 async def get_skill_history(
     aid: str = Path(..., description="Agent ID"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_replica_db),
 ) -> List[ChatMessage]:
     """Get last 50 skill messages for a specific agent.
 
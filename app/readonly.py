@@ -13,6 +13,7 @@ from app.admin import (
     schema_router_readonly,
 )
 from app.config.config import config
+from app.core.telemetry import metrics_app
 from app.entrypoints.web import chat_router_readonly
 from models.db import init_db
 from models.redis import init_redis
@@ -34,7 +35,7 @@ if config.sentry_dsn:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db(**config.db)
+    await init_db(**config.db, role="readonly")
 
     # Initialize Redis if configured
     if config.redis_host:
@@ -59,6 +60,8 @@ app.add_middleware(
 )
 
 app.include_router(health_router)
+
+app.mount("/metrics", metrics_app())
 app.include_router(admin_router_readonly)
 app.include_router(metadata_router_readonly)
 app.include_router(schema_router_readonly)
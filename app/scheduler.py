@@ -13,6 +13,7 @@ import sentry_sdk
 
 from app.admin.scheduler import create_scheduler
 from app.config.config import config
+from app.core.telemetry import start_metrics_server
 from models.db import init_db
 from models.redis import init_redis
 
@@ -34,7 +35,7 @@ if __name__ == "__main__":
 
     async def main():
         # Initialize database
-        await init_db(**config.db)
+        await init_db(**config.db, role="scheduler")
 
         # Initialize Redis if configured
         if config.redis_host:
@@ -43,6 +44,8 @@ if __name__ == "__main__":
                 port=config.redis_port,
             )
 
+        start_metrics_server()
+
         # Initialize scheduler
         scheduler = create_scheduler()
 
@@ -1,5 +1,5 @@
-import inspect
 import logging
+import sys
 
 import telegramify_markdown
 from aiogram import Router
@@ -7,12 +7,14 @@ from aiogram.filters import Command, CommandStart
 from aiogram.types import Message
 from epyxid import XID
 
+from app.config.config import config
 from app.core.client import execute_agent
 from app.services.tg.bot import pool
 from app.services.tg.bot.filter.chat_type import GroupOnlyFilter
 from app.services.tg.bot.filter.content_type import TextOnlyFilter
 from app.services.tg.bot.filter.id import WhitelistedChatIDsFilter
 from app.services.tg.bot.filter.no_bot import NoBotFilter
+from app.services.tg.utils.chat_queue import ChatWorkQueue
 from app.services.tg.utils.cleanup import remove_bot_name
 from models.chat import AuthorType, ChatMessageCreate
 from utils.slack_alert import send_slack_message
@@ -21,15 +23,77 @@ logger = logging.getLogger(__name__)
 
 
 def cur_func_name():
-    return inspect.stack()[1][3]
+    return sys._getframe(1).f_code.co_name
 
 
 def cur_mod_name():
-    return inspect.getmodule(inspect.stack()[1][0]).__name__
+    return sys._getframe(1).f_globals.get("__name__")
 
 
 general_router = Router()
 
+# Agent turns run in the background, so the webhook is acknowledged right away
+chat_queue = ChatWorkQueue(
+    config.tg_queue_concurrency, config.tg_queue_max_pending_per_chat
+)
+
+
+async def enqueue_message(
+    message: Message, agent_id: str, chat_id: str, message_text: str
+) -> None:
+    """Queue a message for the agent, messages of the same chat keep their order."""
+    if len(message_text) > 65535:
+        send_slack_message(
+            (
+                "Message too long from telegram.\n"
+                f"length: {len(message_text)}\n"
+                f"chat_id:{message.chat.id}\n"
+                f"agent:{agent_id}\n"
+                f"user:{message.from_user.id}\n"
+                f"content:{message_text[:100]}..."
+            )
+        )
+
+    async def job():
+        await relay_message(message, agent_id, chat_id, message_text)
+
+    if not chat_queue.submit(f"{message.bot.id}:{message.chat.id}", job):
+        await message.answer(
+            text="Too many messages in progress, please try again later.",
+            reply_to_message_id=message.message_id,
+        )
+
+
+async def relay_message(
+    message: Message, agent_id: str, chat_id: str, message_text: str
+) -> None:
+    try:
+        input = ChatMessageCreate(
+            id=str(XID()),
+            agent_id=agent_id,
+            chat_id=chat_id,
+            user_id=str(message.from_user.id),
+            author_id=str(message.from_user.id),
+            author_type=AuthorType.TELEGRAM,
+            thread_type=AuthorType.TELEGRAM,
+            message=message_text,
+        )
+        response = await execute_agent(input)
+        await message.answer(
+            text=telegramify_markdown.markdownify(
+                response[-1].message if response else "Server Error"
+            ),
+            parse_mode="MarkdownV2",
+            reply_to_message_id=message.message_id,
+        )
+    except Exception as e:
+        logger.warning(
+            f"error processing in function:{cur_func_name()}, token:{message.bot.token} err:{str(e)}"
+        )
+        await message.answer(
+            text="Server Error", reply_to_message_id=message.message_id
+        )
+
 
 @general_router.message(Command("chat_id"), NoBotFilter(), TextOnlyFilter())
 async def command_chat_id(message: Message) -> None:
@@ -65,58 +129,29 @@ async def gp_command_start(message: Message):
     WhitelistedChatIDsFilter(), NoBotFilter(), GroupOnlyFilter(), TextOnlyFilter()
 )
 async def gp_process_message(message: Message) -> None:
-    bot = await message.bot.get_me()
+    cached_bot_item = pool.bot_by_token(message.bot.token)
+    if cached_bot_item is None:
+        logger.warning(f"bot with token {message.bot.token} not found in cache.")
+        return
+
+    bot_username = cached_bot_item.username
+    if bot_username is None:
+        # identity was not cached at init time, fetch it once and keep it
+        cached_bot_item.set_bot_info(await message.bot.get_me())
+        bot_username = cached_bot_item.username
+
     if (
         message.reply_to_message
         and message.reply_to_message.from_user.id == message.bot.id
-    ) or bot.username in message.text:
-        cached_bot_item = pool.bot_by_token(message.bot.token)
-        if cached_bot_item is None:
-            logger.warning(f"bot with token {message.bot.token} not found in cache.")
-            return
-
-        try:
-            # remove bot name tag from text
-            message_text = remove_bot_name(bot.username, message.text)
-            if len(message_text) > 65535:
-                send_slack_message(
-                    (
-                        "Message too long from telegram.\n"
-                        f"length: {len(message_text)}\n"
-                        f"chat_id:{message.chat.id}\n"
-                        f"agent:{cached_bot_item.agent_id}\n"
-                        f"user:{message.from_user.id}\n"
-                        f"content:{message_text[:100]}..."
-                    )
-                )
-
-            input = ChatMessageCreate(
-                id=str(XID()),
-                agent_id=cached_bot_item.agent_id,
-                chat_id=pool.agent_chat_id(
-                    cached_bot_item.is_public_memory, message.chat.id
-                ),
-                user_id=str(message.from_user.id),
-                author_id=str(message.from_user.id),
-                author_type=AuthorType.TELEGRAM,
-                thread_type=AuthorType.TELEGRAM,
-                message=message_text,
-            )
-            response = await execute_agent(input)
-            await message.answer(
-                text=telegramify_markdown.markdownify(
-                    response[-1].message if response else "Server Error"
-                ),
-                parse_mode="MarkdownV2",
-                reply_to_message_id=message.message_id,
-            )
-        except Exception as e:
-            logger.warning(
-                f"error processing in function:{cur_func_name()}, token:{message.bot.token}, err={str(e)}"
-            )
-            await message.answer(
-                text="Server Error", reply_to_message_id=message.message_id
-            )
+    ) or bot_username in message.text:
+        # remove bot name tag from text
+        message_text = remove_bot_name(bot_username, message.text)
+        await enqueue_message(
+            message,
+            cached_bot_item.agent_id,
+            pool.agent_chat_id(cached_bot_item.is_public_memory, message.chat.id),
+            message_text,
+        )
 
 
 ## direct commands and messages
@@ -146,41 +181,9 @@ async def process_message(message: Message) -> None:
         logger.warning(f"bot with token {message.bot.token} not found in cache.")
         return
 
-    if len(message.text) > 65535:
-        send_slack_message(
-            (
-                "Message too long from telegram.\n"
-                f"length: {len(message.text)}\n"
-                f"chat_id:{message.chat.id}\n"
-                f"agent:{cached_bot_item.agent_id}\n"
-                f"user:{message.from_user.id}\n"
-                f"content:{message.text[:100]}..."
-            )
-        )
-
-    try:
-        input = ChatMessageCreate(
-            id=str(XID()),
-            agent_id=cached_bot_item.agent_id,
-            chat_id=pool.agent_chat_id(False, message.chat.id),
-            user_id=str(message.from_user.id),
-            author_id=str(message.from_user.id),
-            author_type=AuthorType.TELEGRAM,
-            thread_type=AuthorType.TELEGRAM,
-            message=message.text,
-        )
-        response = await execute_agent(input)
-        await message.answer(
-            text=telegramify_markdown.markdownify(
-                response[-1].message if response else "Server Error"
-            ),
-            parse_mode="MarkdownV2",
-            reply_to_message_id=message.message_id,
-        )
-    except Exception as e:
-        logger.warning(
-            f"error processing in function:{cur_func_name()}, token:{message.bot.token} err:{str(e)}"
-        )
-        await message.answer(
-            text="Server Error", reply_to_message_id=message.message_id
-        )
+    await enqueue_message(
+        message,
+        cached_bot_item.agent_id,
+        pool.agent_chat_id(False, message.chat.id),
+        message.text,
+    )
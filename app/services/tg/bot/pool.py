@@ -1,9 +1,13 @@
 import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
 
-from aiogram import Bot, Dispatcher
+from aiogram import BaseMiddleware, Bot, Dispatcher
 from aiogram.client.bot import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+from aiogram.types import TelegramObject
 from aiogram.webhook.aiohttp_server import (
     SimpleRequestHandler,
     TokenBasedRequestHandler,
@@ -11,7 +15,8 @@ from aiogram.webhook.aiohttp_server import (
 )
 from aiohttp import web
 
-from app.services.tg.bot.kind.ai_relayer.router import general_router
+from app.services.tg.bot import registry
+from app.services.tg.bot.kind.ai_relayer.router import chat_queue, general_router
 from app.services.tg.bot.kind.god.router import god_router
 from app.services.tg.bot.kind.god.startup import GOD_BOT_PATH, GOD_BOT_TOKEN, on_startup
 from app.services.tg.bot.types.agent import BotPoolAgentItem
@@ -20,6 +25,7 @@ from app.services.tg.bot.types.kind import Kind
 from app.services.tg.bot.types.router_obj import RouterObj
 from app.services.tg.utils.cleanup import clean_token_str
 from models.agent import Agent
+from models.redis import get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -51,9 +57,88 @@ def agent_chat_id(group_memory_public, chat_id):
     return f"telegram-{chat_id}"
 
 
+async def cache_from_registry(token: str, entry: dict) -> BotPoolItem:
+    """Mirror a registry entry into the local cache, no telegram call involved."""
+    bot_item = BotPoolItem.from_registry(entry)
+    old_bot_item = _bots.get(token)
+    set_cache_bot(bot_item)
+    set_cache_agent(BotPoolAgentItem.from_registry(entry))
+    if old_bot_item and old_bot_item.bot:
+        await old_bot_item.bot.session.close()
+    return bot_item
+
+
+async def uncache(token: str) -> None:
+    bot_item = _bots.pop(token, None)
+    if bot_item:
+        agent_item = agent_by_id(bot_item.agent_id)
+        if agent_item and agent_item.bot_token == token:
+            del _agent_bots[bot_item.agent_id]
+        await bot_item.bot.session.close()
+
+
+async def load_registry() -> int:
+    """Fill the local cache from the shared registry, return the number of bots."""
+    entries = await registry.all_entries()
+    for token, entry in entries.items():
+        try:
+            await cache_from_registry(token, entry)
+        except Exception as e:
+            logger.warning(f"failed to restore bot {token} from registry: {e}")
+    return len(entries)
+
+
+async def apply_registry_event(event: dict) -> None:
+    """Apply a bot lifecycle change broadcast by another replica."""
+    token = event["token"]
+    if event["action"] == "delete":
+        await uncache(token)
+        return
+    entry = await registry.get_entry(token)
+    if entry:
+        await cache_from_registry(token, entry)
+
+
+async def ensure_bot(token: str) -> Optional[BotPoolItem]:
+    """Get a bot from the local cache, falling back to the shared registry."""
+    bot_item = _bots.get(token)
+    if bot_item is None and registry.is_enabled():
+        entry = await registry.get_entry(token)
+        if entry:
+            bot_item = await cache_from_registry(token, entry)
+    return bot_item
+
+
+class RegistryMiddleware(BaseMiddleware):
+    """Make sure the bot of an incoming update is in the local cache.
+
+    An update may reach this replica before the broadcast about its bot does.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        bot = data.get("bot")
+        if bot:
+            await ensure_bot(bot.token)
+        return await handler(event, data)
+
+
+def new_storage() -> BaseStorage:
+    """FSM storage shared by all replicas when redis is available."""
+    if registry.is_enabled():
+        return RedisStorage(
+            redis=get_redis(), key_builder=DefaultKeyBuilder(with_bot_id=True)
+        )
+    return MemoryStorage()
+
+
 async def health_handler(request):
     """Health check endpoint handler."""
-    return web.json_response({"status": "healthy"})
+    return web.json_response({"status": "healthy", "queue": chat_queue.stats()})
 
 
 class BotPool:
@@ -73,10 +158,7 @@ class BotPool:
                     token=GOD_BOT_TOKEN,
                     default=DefaultBotProperties(parse_mode=ParseMode.HTML),
                 )
-                storage = MemoryStorage()
-                # In order to use RedisStorage you need to use Key Builder with bot ID:
-                # storage = RedisStorage.from_url(TG_REDIS_DSN, key_builder=DefaultKeyBuilder(with_bot_id=True))
-                dp = Dispatcher(storage=storage)
+                dp = Dispatcher(storage=new_storage())
                 dp.include_router(god_router)
                 dp.startup.register(on_startup)
                 SimpleRequestHandler(dispatcher=dp, bot=self.god_bot).register(
@@ -89,10 +171,8 @@ class BotPool:
     def init_all_dispatchers(self):
         logger.info("Initialize all dispatchers...")
         for kind, b in self.routers.items():
-            storage = MemoryStorage()
-            # In order to use RedisStorage you need to use Key Builder with bot ID:
-            # storage = RedisStorage.from_url(TG_REDIS_DSN, key_builder=DefaultKeyBuilder(with_bot_id=True))
-            b.set_dispatcher(Dispatcher(storage=storage))
+            b.set_dispatcher(Dispatcher(storage=new_storage()))
+            b.get_dispatcher().update.outer_middleware(RegistryMiddleware())
             b.get_dispatcher().include_router(b.get_router())
             TokenBasedRequestHandler(
                 dispatcher=b.get_dispatcher(),
@@ -114,9 +194,11 @@ class BotPool:
             await bot_item.bot.set_webhook(
                 self.base_url.format(kind=bot_item.kind, bot_token=bot_item.token)
             )
+            bot_item.set_bot_info(await bot_item.bot.get_me())
 
             set_cache_bot(bot_item)
             set_cache_agent(agent_item)
+            await registry.publish_bot(bot_item, agent_item)
 
             logger.info(
                 f"bot for agent {agent.id} with token {bot_item.token} initialized..."
@@ -173,10 +255,13 @@ class BotPool:
                     kind=new_bot_item.kind, bot_token=new_bot_item.token
                 )
             )
+            new_bot_item.set_bot_info(await new_bot_item.bot.get_me())
 
             del _bots[old_cached_bot_item.token]
             set_cache_bot(new_bot_item)
             set_cache_agent(new_agent_item)
+            await registry.remove_bot(old_cached_bot_item.token)
+            await registry.publish_bot(new_bot_item, new_agent_item)
 
             logger.info(
                 f"bot for agent {agent.id} with token {old_agent_item.bot_token} changed to {new_bot_item.token}..."
@@ -217,6 +302,7 @@ class BotPool:
 
             del _bots[token]
             del _agent_bots[agent_id]
+            await registry.remove_bot(token)
 
             logger.info(f"Bot with token {token} for agent {agent_id} stopped...")
         except Exception as e:
@@ -244,6 +330,7 @@ class BotPool:
             old_bot_item = bot_by_token(old_agent_item.bot_token)
             old_bot_item.update_conf(agent.telegram_config)
             old_agent_item.updated_at = agent.updated_at
+            await registry.publish_bot(old_bot_item, old_agent_item)
 
             # if old_bot_item.kind != agent.telegram_config.get("kind"):
             #     await self.stop_bot(agent.id, token)
@@ -262,7 +349,14 @@ class BotPool:
             )
 
     async def start(self, asyncio_loop, host, port):
-        runner = web.AppRunner(self.app)
-        await runner.setup()
-        site = web.TCPSite(runner, host, port)
-        await site.start()
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, host, port)
+        await self.site.start()
+
+    async def stop(self, drain_timeout: float):
+        """Stop taking webhooks, finish the queued messages, then shut down."""
+        await self.site.stop()
+        await chat_queue.drain(drain_timeout)
+        # closes the bot sessions the queued messages replied with
+        await self.runner.cleanup()
@@ -0,0 +1,143 @@
+"""Shared bot registry for the telegram webhook tier.
+
+Every running bot is recorded in a redis hash keyed by bot token, and every
+lifecycle change is broadcast on a pub/sub channel. Each replica keeps a local
+mirror of the registry, so any of them can serve any bot webhook. Only one
+replica, the sync leader, talks to telegram to set or delete webhooks.
+
+Without redis the registry is disabled and a single process owns all bots.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Optional
+
+from epyxid import XID
+
+from app.services.tg.bot.types.agent import BotPoolAgentItem
+from app.services.tg.bot.types.bot import BotPoolItem
+from models.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_KEY = "intentkit:tg:bot_registry"
+EVENTS_CHANNEL = "intentkit:tg:bot_events"
+LEADER_KEY = "intentkit:tg:sync_leader"
+
+# Identify this process, to ignore its own events and hold the leader lease
+INSTANCE_ID = str(XID())
+
+
+def _redis():
+    try:
+        return get_redis()
+    except RuntimeError:
+        return None
+
+
+def is_enabled() -> bool:
+    return _redis() is not None
+
+
+def to_entry(bot_item: BotPoolItem, agent_item: BotPoolAgentItem) -> dict:
+    return {
+        "agent_id": bot_item.agent_id,
+        "config": bot_item.config,
+        "updated_at": agent_item.updated_at.isoformat(),
+        "bot_info": (
+            bot_item.bot_info.model_dump(mode="json", exclude_none=True)
+            if bot_item.bot_info
+            else None
+        ),
+    }
+
+
+async def publish_bot(bot_item: BotPoolItem, agent_item: BotPoolAgentItem) -> None:
+    """Record a running bot and tell the other replicas about it."""
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        await redis.hset(
+            REGISTRY_KEY, bot_item.token, json.dumps(to_entry(bot_item, agent_item))
+        )
+        await redis.publish(
+            EVENTS_CHANNEL,
+            json.dumps(
+                {"action": "set", "token": bot_item.token, "origin": INSTANCE_ID}
+            ),
+        )
+    except Exception as e:
+        logger.warning(f"failed to publish bot {bot_item.agent_id} to registry: {e}")
+
+
+async def remove_bot(token: str) -> None:
+    """Remove a stopped bot and tell the other replicas about it."""
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        await redis.hdel(REGISTRY_KEY, token)
+        await redis.publish(
+            EVENTS_CHANNEL,
+            json.dumps({"action": "delete", "token": token, "origin": INSTANCE_ID}),
+        )
+    except Exception as e:
+        logger.warning(f"failed to remove bot {token} from registry: {e}")
+
+
+async def get_entry(token: str) -> Optional[dict]:
+    redis = _redis()
+    if redis is None:
+        return None
+    data = await redis.hget(REGISTRY_KEY, token)
+    return json.loads(data) if data else None
+
+
+async def all_entries() -> dict[str, dict]:
+    """Load the whole registry, keyed by bot token."""
+    redis = _redis()
+    if redis is None:
+        return {}
+    data = await redis.hgetall(REGISTRY_KEY)
+    return {token: json.loads(entry) for token, entry in data.items()}
+
+
+async def acquire_leadership(ttl: int) -> bool:
+    """Take or renew the sync leader lease, always True without redis."""
+    redis = _redis()
+    if redis is None:
+        return True
+    if await redis.set(LEADER_KEY, INSTANCE_ID, nx=True, ex=ttl):
+        return True
+    if await redis.get(LEADER_KEY) == INSTANCE_ID:
+        await redis.expire(LEADER_KEY, ttl)
+        return True
+    return False
+
+
+async def listen(on_event: Callable[[dict], Awaitable[None]]) -> None:
+    """Apply bot lifecycle events published by other replicas, forever."""
+    redis = _redis()
+    if redis is None:
+        return
+    while True:
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(EVENTS_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                event = json.loads(message["data"])
+                if event.get("origin") == INSTANCE_ID:
+                    continue
+                try:
+                    await on_event(event)
+                except Exception as e:
+                    logger.warning(f"failed to apply bot event {event}: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"bot registry subscription lost, reconnecting: {e}")
+            await asyncio.sleep(1)
@@ -1,15 +1,31 @@
+from datetime import datetime
+
 from app.services.tg.utils.cleanup import clean_token_str
 from models.agent import Agent
 
 
 class BotPoolAgentItem:
     def __init__(self, agent: Agent):
-        self._bot_token = clean_token_str(agent.telegram_config.get("token"))
+        self._setup(agent.id, agent.telegram_config.get("token"), agent.updated_at)
+
+    @classmethod
+    def from_registry(cls, data: dict) -> "BotPoolAgentItem":
+        """Build an item from its shared registry entry, without loading the agent."""
+        item = cls.__new__(cls)
+        item._setup(
+            data["agent_id"],
+            data["config"].get("token"),
+            datetime.fromisoformat(data["updated_at"]),
+        )
+        return item
+
+    def _setup(self, agent_id: str, token: str, updated_at: datetime):
+        self._bot_token = clean_token_str(token)
         if self._bot_token is None:
             raise ValueError("token can not be empty for agent item")
 
-        self._id = agent.id
-        self._updated_at = agent.updated_at
+        self._id = agent_id
+        self._updated_at = updated_at
 
     @property
     def id(self):
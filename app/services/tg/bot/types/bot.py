@@ -3,6 +3,7 @@ from typing import NotRequired, TypedDict
 from aiogram import Bot
 from aiogram.client.bot import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.types import User
 
 from app.services.tg.utils.cleanup import clean_token_str
 from models.agent import Agent
@@ -19,15 +20,28 @@ class TelegramConfig(TypedDict):
 
 class BotPoolItem:
     def __init__(self, agent: Agent):
-        self._agent_id = agent.id
+        self._setup(agent.id, agent.telegram_config)
 
-        self._token = clean_token_str(agent.telegram_config.get("token"))
+    @classmethod
+    def from_registry(cls, data: dict) -> "BotPoolItem":
+        """Build an item from its shared registry entry, without loading the agent."""
+        item = cls.__new__(cls)
+        item._setup(data["agent_id"], data["config"])
+        if data.get("bot_info"):
+            item.set_bot_info(User.model_validate(data["bot_info"]))
+        return item
+
+    def _setup(self, agent_id: str, cfg: TelegramConfig):
+        self._agent_id = agent_id
+
+        self._token = clean_token_str(cfg.get("token"))
         if self._token is None:
             raise ValueError("bot token can not be empty")
 
         self._kind = 1
+        self._bot_info = None
 
-        self.update_conf(agent.telegram_config)
+        self.update_conf(cfg)
 
         self._bot = Bot(
             token=self._token,
@@ -35,6 +49,7 @@ class BotPoolItem:
         )
 
     def update_conf(self, cfg: TelegramConfig):
+        self._config = cfg
         self._is_public_memory = cfg.get("group_memory_public", True)
         self._whitelist_chat_ids = cfg.get("whitelist_chat_ids")
         self._greeting_group = cfg.get(
@@ -46,6 +61,10 @@ class BotPoolItem:
             "Glory to the Nation!\nFind me on https://nation.fun",
         )
 
+    def set_bot_info(self, bot_info: User):
+        """Store the bot identity returned by get_me, so handlers can read it from memory."""
+        self._bot_info = bot_info
+
     @property
     def agent_id(self):
         return self._agent_id
@@ -62,6 +81,18 @@ class BotPoolItem:
     def bot(self):
         return self._bot
 
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def bot_info(self):
+        return self._bot_info
+
+    @property
+    def username(self):
+        return self._bot_info.username if self._bot_info else None
+
     # optional props
 
     @property
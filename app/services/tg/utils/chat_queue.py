@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "intentkit_tg_queue_wait_seconds",
+    "Time a telegram message waits in its chat queue before the agent runs",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+class ChatWorkQueue:
+    """Ordered work queues, one per chat, drained in the background.
+
+    Webhook handlers submit a job and return at once, so telegram gets its
+    acknowledgement without waiting for the agent. Jobs of the same chat run
+    one after another in arrival order, jobs of different chats run in
+    parallel, at most `concurrency` at the same time.
+    """
+
+    def __init__(self, concurrency: int, max_pending_per_chat: int):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._max_pending_per_chat = max_pending_per_chat
+        self._queues: dict[str, deque[tuple[float, Job]]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self._running = 0
+        self._submitted = 0
+        self._started = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+
+    def submit(self, key: str, job: Job) -> bool:
+        """Queue a job for a chat, False if the chat has too many pending jobs."""
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self._max_pending_per_chat:
+            self._rejected += 1
+            logger.warning(f"chat queue {key} is full, rejecting message")
+            return False
+        queue.append((asyncio.get_running_loop().time(), job))
+        self._submitted += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+        return True
+
+    async def _drain(self, key: str):
+        queue = self._queues[key]
+        loop = asyncio.get_running_loop()
+        try:
+            while queue:
+                enqueued_at, job = queue.popleft()
+                async with self._semaphore:
+                    wait = loop.time() - enqueued_at
+                    self._started += 1
+                    self._wait_total += wait
+                    QUEUE_WAIT_SECONDS.observe(wait)
+                    self._running += 1
+                    try:
+                        await job()
+                        self._processed += 1
+                    except Exception as e:
+                        self._failed += 1
+                        logger.error(f"chat queue {key} job failed: {e}")
+                    finally:
+                        self._running -= 1
+        finally:
+            self._workers.pop(key, None)
+            self._queues.pop(key, None)
+
+    async def drain(self, timeout: float) -> int:
+        """Wait until the queued jobs are done, return the number of jobs left.
+
+        The jobs were acknowledged to telegram already, so they are lost if
+        the process exits before they run. Stop taking new messages first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._workers:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(list(self._workers.values()), timeout=remaining)
+        left = self._running + sum(len(q) for q in self._queues.values())
+        if left:
+            logger.warning(f"chat queue drain timed out, {left} jobs left")
+        return left
+
+    def stats(self) -> dict:
+        """Back-pressure metrics of the queue, the wait time histogram is in prometheus."""
+        return {
+            "chats": len(self._queues),
+            "pending": sum(len(q) for q in self._queues.values()),
+            "running": self._running,
+            "submitted": self._submitted,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "wait_avg": self._wait_total / self._started if self._started else 0.0,
+        }
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class RateLimitedTaskPool:
+    """Run coroutines concurrently with a cap on parallelism and start rate.
+
+    Telegram throttles bursts of API calls coming from one host, so bot
+    initialisation must not simply be fired all at once. This pool lets at
+    most `concurrency` tasks run at the same time, and starts at most `rate`
+    tasks per second.
+    """
+
+    def __init__(self, concurrency: int, rate: float):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = 1 / rate if rate > 0 else 0
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def _wait_turn(self):
+        if not self._interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+                now = self._next_start
+            self._next_start = now + self._interval
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        async with self._semaphore:
+            await self._wait_turn()
+            return await func(*args)
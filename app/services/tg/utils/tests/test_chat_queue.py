@@ -0,0 +1,114 @@
+"""Tests for the per chat work queue of the telegram relayer."""
+
+import asyncio
+import unittest
+
+from app.services.tg.utils.chat_queue import ChatWorkQueue
+
+
+class TestChatWorkQueue(unittest.IsolatedAsyncioTestCase):
+    """Test ordering, concurrency, back pressure and draining."""
+
+    async def test_same_chat_in_order(self):
+        """Jobs of one chat run one after another in arrival order."""
+        queue = ChatWorkQueue(concurrency=4, max_pending_per_chat=10)
+        done = []
+
+        def job(i):
+            async def run():
+                await asyncio.sleep(0.01 * (3 - i))
+                done.append(i)
+
+            return run
+
+        for i in range(3):
+            self.assertTrue(queue.submit("chat", job(i)))
+        await queue.drain(1)
+        self.assertEqual(done, [0, 1, 2])
+
+    async def test_chats_run_in_parallel_up_to_concurrency(self):
+        """Jobs of different chats overlap, at most concurrency at once."""
+        queue = ChatWorkQueue(concurrency=2, max_pending_per_chat=10)
+        running = 0
+        peak = 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        for i in range(5):
+            queue.submit(f"chat-{i}", job)
+        await queue.drain(1)
+        self.assertEqual(peak, 2)
+        self.assertEqual(queue.stats()["processed"], 5)
+
+    async def test_full_chat_rejects(self):
+        """A chat with too many pending jobs rejects new ones."""
+        queue = ChatWorkQueue(concurrency=1, max_pending_per_chat=2)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        self.assertTrue(queue.submit("chat", job))
+        self.assertTrue(queue.submit("chat", job))
+        self.assertFalse(queue.submit("chat", job))
+        # other chats are not affected
+        self.assertTrue(queue.submit("other", job))
+        release.set()
+        await queue.drain(1)
+        self.assertEqual(queue.stats()["rejected"], 1)
+
+    async def test_failed_job_does_not_stop_the_chat(self):
+        """A failing job is counted and the next job of the chat still runs."""
+        queue = ChatWorkQueue(concurrency=1, max_pending_per_chat=10)
+        done = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def ok():
+            done.append(True)
+
+        queue.submit("chat", fail)
+        queue.submit("chat", ok)
+        await queue.drain(1)
+        stats = queue.stats()
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["processed"], 1)
+        self.assertEqual(done, [True])
+
+    async def test_stats_are_read_only(self):
+        """Reading the stats does not change them."""
+        queue = ChatWorkQueue(concurrency=1, max_pending_per_chat=10)
+
+        async def job():
+            await asyncio.sleep(0.01)
+
+        queue.submit("chat", job)
+        queue.submit("chat", job)
+        await queue.drain(1)
+        self.assertEqual(queue.stats(), queue.stats())
+
+    async def test_drain_waits_for_queued_jobs(self):
+        """Drain returns once every queued job ran, or reports the ones left."""
+        queue = ChatWorkQueue(concurrency=1, max_pending_per_chat=10)
+        release = asyncio.Event()
+
+        async def job():
+            await release.wait()
+
+        queue.submit("chat", job)
+        queue.submit("chat", job)
+        self.assertEqual(await queue.drain(0.05), 2)
+
+        release.set()
+        self.assertEqual(await queue.drain(1), 0)
+        self.assertEqual(queue.stats()["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,7 @@ from app.admin.api import admin_router, admin_router_readonly
 from app.admin.health import health_router
 from app.admin.metadata import metadata_router_readonly
 from app.config.config import config
+from app.core.telemetry import metrics_app
 from app.services.twitter.oauth2 import router as twitter_oauth2_router
 from app.services.twitter.oauth2_callback import router as twitter_callback_router
 from models.db import init_db
@@ -50,7 +51,7 @@ async def lifespan(app: FastAPI):
         app: FastAPI application instance
     """
     # Initialize database
-    await init_db(**config.db)
+    await init_db(**config.db, role="singleton")
 
     # Initialize Redis if configured
     if config.redis_host:
@@ -81,3 +82,5 @@ app.include_router(metadata_router_readonly)
 app.include_router(twitter_callback_router)
 app.include_router(twitter_oauth2_router)
 app.include_router(health_router)
+
+app.mount("/metrics", metrics_app())
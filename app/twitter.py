@@ -7,8 +7,10 @@ import sentry_sdk
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.config.config import config
+from app.core.telemetry import start_metrics_server
 from app.entrypoints.twitter import run_twitter_agents
 from models.db import init_db
+from models.llm import load_model_catalogue
 from models.redis import init_redis
 
 logger = logging.getLogger(__name__)
@@ -28,7 +30,7 @@ if __name__ == "__main__":
 
     async def main():
         # Initialize infrastructure
-        await init_db(**config.db)
+        await init_db(**config.db, role="twitter")
 
         # Initialize Redis if configured
         if config.redis_host:
@@ -37,6 +39,11 @@ if __name__ == "__main__":
                 port=config.redis_port,
             )
 
+        # Load the model catalogue before serving agents
+        await load_model_catalogue()
+
+        start_metrics_server()
+
         # Create scheduler
         scheduler = AsyncIOScheduler()
         scheduler.add_job(
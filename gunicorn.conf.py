@@ -0,0 +1,18 @@
+"""Gunicorn settings of the API.
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/metrics gunicorn -c gunicorn.conf.py app.api:app
+
+The metrics directory must be empty when gunicorn starts.
+"""
+
+import os
+
+from prometheus_client import multiprocess
+
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def child_exit(server, worker):
+    # drop the live gauge samples of the dead worker from /metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -20,6 +20,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     Identity,
+    Index,
     Numeric,
     String,
     func,
@@ -157,6 +158,7 @@ class AgentTable(Base):
     """Agent table db model."""
 
     __tablename__ = "agents"
+    __table_args__ = (Index("ix_agents_updated_at", "updated_at"),)
 
     id = Column(
         String,
@@ -12,6 +12,7 @@ from sqlalchemy import (
     Index,
     Integer,
     Numeric,
+    PrimaryKeyConstraint,
     String,
     desc,
     func,
@@ -151,12 +152,20 @@ class ChatMessageTable(Base):
     """Chat message database table model."""
 
     __tablename__ = "chat_messages"
-    __table_args__ = (Index("ix_chat_messages_chat_id", "chat_id"),)
-
-    id = Column(
-        String,
-        primary_key=True,
+    # partitioned by month, see models/db_mig.py
+    # The latest messages of a chat are read without a created_at bound, so
+    # every partition is searched. These indexes end in created_at, so each
+    # partition only returns its newest rows to the merge.
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at"),
+        Index("ix_chat_messages_chat_id", "chat_id"),
+        Index("ix_chat_messages_agent_chat", "agent_id", "chat_id", "created_at"),
+        Index("ix_chat_messages_agent_author", "agent_id", "author_type", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+
+    # the primary key is (id, created_at), see __table_args__
+    id = Column(String)
     agent_id = Column(
         String,
         nullable=False,
@@ -205,6 +214,10 @@ class ChatMessageTable(Base):
         Integer,
         default=0,
     )
+    cached_tokens = Column(
+        Integer,
+        default=0,
+    )
     time_cost = Column(
         Float,
         default=0,
@@ -227,6 +240,9 @@ class ChatMessageTable(Base):
         server_default=func.now(),
     )
 
+    # the id alone is unique, created_at is only in the key for partitioning
+    __mapper_args__ = {"primary_key": [id]}
+
 
 class ChatMessageCreate(BaseModel):
     """Base model for creating chat messages with fields needed for creation."""
@@ -276,6 +292,10 @@ class ChatMessageCreate(BaseModel):
     output_tokens: Annotated[
         int, Field(0, description="Number of tokens in the output message")
     ]
+    cached_tokens: Annotated[
+        int,
+        Field(0, description="Number of input tokens served from the provider cache"),
+    ]
     time_cost: Annotated[
         float, Field(0.0, description="Time cost for the message in seconds")
     ]
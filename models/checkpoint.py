@@ -0,0 +1,187 @@
+from datetime import timedelta
+from typing import Iterable
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    delete,
+    exists,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.base import Base
+from models.db import get_session
+
+
+class CheckpointPayloadTable(Base):
+    """Large agent memory payloads, stored once and referenced by checkpoints.
+
+    A payload is shared by the threads that hold the same content, see
+    CheckpointPayloadRefTable. It is deleted with the last thread using it.
+    """
+
+    __tablename__ = "checkpoint_payloads"
+
+    id = Column(
+        String,
+        primary_key=True,
+        comment="SHA-256 of the uncompressed content",
+    )
+    content = Column(
+        LargeBinary,
+        nullable=False,
+        comment="zstd compressed content",
+    )
+    size = Column(
+        Integer,
+        nullable=False,
+        comment="Size of the uncompressed content in bytes",
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class CheckpointPayloadRefTable(Base):
+    """Memory threads referencing each payload."""
+
+    __tablename__ = "checkpoint_payload_refs"
+    __table_args__ = (Index("ix_checkpoint_payload_refs_payload", "payload_id"),)
+
+    thread_id = Column(
+        String,
+        primary_key=True,
+    )
+    payload_id = Column(
+        String,
+        primary_key=True,
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+async def save_checkpoint_payloads(
+    thread_id: str, payloads: dict[str, tuple[bytes, int]], refs: Iterable[str]
+) -> None:
+    """Store compressed payloads keyed by content hash and the thread using them.
+
+    Existing payloads and references are kept.
+
+    Args:
+        thread_id: The memory thread referencing the payloads
+        payloads: (compressed content, uncompressed size) by content hash,
+            only the ones that may not be stored yet
+        refs: Content hashes of all payloads the thread references
+    """
+    refs = sorted(set(refs) | payloads.keys())
+    if not refs:
+        return
+    async with get_session() as db:
+        if payloads:
+            await db.execute(
+                insert(CheckpointPayloadTable)
+                .values(
+                    [
+                        {"id": key, "content": content, "size": size}
+                        for key, (content, size) in sorted(payloads.items())
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["id"])
+            )
+        await db.execute(
+            insert(CheckpointPayloadRefTable)
+            .values([{"thread_id": thread_id, "payload_id": key} for key in refs])
+            .on_conflict_do_nothing(index_elements=["thread_id", "payload_id"])
+        )
+        await db.commit()
+
+
+async def delete_thread_payloads(db: AsyncSession, thread_pattern: str) -> int:
+    """Delete the payload references of threads, and the payloads left unused.
+
+    Run it in the transaction that deletes the checkpoints of the threads.
+
+    Args:
+        db: Database session
+        thread_pattern: LIKE pattern of the thread ids
+
+    Returns:
+        The number of payloads deleted
+    """
+    removed = (
+        await db.scalars(
+            delete(CheckpointPayloadRefTable)
+            .where(CheckpointPayloadRefTable.thread_id.like(thread_pattern))
+            .returning(CheckpointPayloadRefTable.payload_id)
+        )
+    ).all()
+    if not removed:
+        return 0
+    result = await db.execute(
+        delete(CheckpointPayloadTable).where(
+            CheckpointPayloadTable.id.in_(set(removed)),
+            ~exists().where(
+                CheckpointPayloadRefTable.payload_id == CheckpointPayloadTable.id
+            ),
+        )
+    )
+    return result.rowcount
+
+
+async def sweep_checkpoint_payloads(grace: timedelta) -> tuple[int, int]:
+    """Delete references of threads without checkpoints, and unreferenced payloads.
+
+    Payloads are written before the checkpoint of a new thread, so only rows
+    older than the grace period are considered.
+
+    Returns:
+        The number of references and payloads deleted
+    """
+    async with get_session() as db:
+        refs = await db.execute(
+            delete(CheckpointPayloadRefTable).where(
+                CheckpointPayloadRefTable.created_at < func.now() - grace,
+                # checkpoints belong to langgraph, it has no model here
+                text(
+                    "NOT EXISTS (SELECT 1 FROM checkpoints AS c "
+                    "WHERE c.thread_id = checkpoint_payload_refs.thread_id)"
+                ),
+            )
+        )
+        payloads = await db.execute(
+            delete(CheckpointPayloadTable).where(
+                CheckpointPayloadTable.created_at < func.now() - grace,
+                ~exists().where(
+                    CheckpointPayloadRefTable.payload_id == CheckpointPayloadTable.id
+                ),
+            )
+        )
+        await db.commit()
+    return refs.rowcount, payloads.rowcount
+
+
+async def get_checkpoint_payloads(ids: Iterable[str]) -> dict[str, bytes]:
+    """Get compressed payloads by content hash, missing ones are left out."""
+    ids = list(ids)
+    if not ids:
+        return {}
+    async with get_session() as db:
+        rows = await db.execute(
+            select(CheckpointPayloadTable.id, CheckpointPayloadTable.content).where(
+                CheckpointPayloadTable.id.in_(ids)
+            )
+        )
+        return {row.id: row.content for row in rows}
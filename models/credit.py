@@ -8,14 +8,19 @@ from fastapi import HTTPException
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 from sqlalchemy import (
     Column,
+    Date,
     DateTime,
     Index,
+    Integer,
     Numeric,
+    PrimaryKeyConstraint,
     String,
+    cast,
     func,
     select,
     update,
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.base import Base
@@ -437,6 +442,9 @@ class CreditAccount(BaseModel):
             )
             # Create refill event record
             event_id = str(XID())
+            await CreditEvent.claim_upstream_tx(
+                session, UpstreamType.INITIALIZER, account.id, event_id
+            )
             event = CreditEventTable(
                 id=event_id,
                 event_type=EventType.REFILL,
@@ -454,6 +462,7 @@ class CreditAccount(BaseModel):
             )
             session.add(event)
             await session.flush()
+            await CreditEvent.add_rollups(session, event)
 
             # Create credit transaction records
             # 1. User account transaction (credit)
@@ -518,20 +527,29 @@ class CreditEventTable(Base):
     """
 
     __tablename__ = "credit_events"
+    # partitioned by month, see models/db_mig.py
     __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at"),
+        # unique indexes of a partitioned table must hold the partition key,
+        # credit_event_upstreams keeps upstream transactions unique
         Index(
-            "ix_credit_events_upstream", "upstream_type", "upstream_tx_id", unique=True
+            "ix_credit_events_upstream",
+            "upstream_type",
+            "upstream_tx_id",
+            "created_at",
+            unique=True,
         ),
-        Index("ix_credit_events_account_id", "account_id"),
+        # event listings page by id without a created_at bound, so every
+        # partition is searched, these indexes give each one in id order
+        Index("ix_credit_events_account", "account_id", "id"),
         Index("ix_credit_events_user_id", "user_id"),
-        Index("ix_credit_events_fee_agent", "fee_agent_account"),
+        Index("ix_credit_events_fee_agent_id", "fee_agent_account", "id"),
         Index("ix_credit_events_fee_dev", "fee_dev_account"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
-    id = Column(
-        String,
-        primary_key=True,
-    )
+    # the primary key is (id, created_at), see __table_args__
+    id = Column(String)
     account_id = Column(
         String,
         nullable=False,
@@ -644,6 +662,90 @@ class CreditEventTable(Base):
         server_default=func.now(),
     )
 
+    # the id alone is unique, created_at is only in the key for partitioning
+    __mapper_args__ = {"primary_key": [id]}
+
+
+class CreditEventUpstreamTable(Base):
+    """Upstream transactions of credit events.
+
+    Keeps each upstream transaction to one credit event across all partitions
+    of credit_events, and after old partitions are archived. A transaction is
+    claimed here before the accounts and the event are written. safe_migrate
+    fills it from the existing credit events when it creates it.
+    """
+
+    __tablename__ = "credit_event_upstreams"
+
+    upstream_type = Column(
+        String,
+        primary_key=True,
+    )
+    upstream_tx_id = Column(
+        String,
+        primary_key=True,
+    )
+    event_id = Column(
+        String,
+        nullable=False,
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class CreditRollupTable(Base):
+    """Daily totals of credit events by account, event type and direction.
+
+    Updated in the transaction of each credit event, so statistics read a row
+    per day instead of every event. An event counts for its own account, and
+    as income for the agent and dev accounts that received a fee from it.
+    """
+
+    __tablename__ = "credit_rollups"
+
+    account_id = Column(
+        String,
+        primary_key=True,
+    )
+    day = Column(
+        Date,
+        primary_key=True,
+    )
+    event_type = Column(
+        String,
+        primary_key=True,
+    )
+    direction = Column(
+        String,
+        primary_key=True,
+    )
+    event_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    # sum of the total amount of the events
+    total_amount = Column(
+        Numeric(22, 4),
+        nullable=False,
+        default=0,
+    )
+    # sum of what the account paid or received
+    amount = Column(
+        Numeric(22, 4),
+        nullable=False,
+        default=0,
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
 
 class CreditEvent(BaseModel):
     """Credit event model with all fields."""
@@ -766,27 +868,86 @@ class CreditEvent(BaseModel):
         return v
 
     @classmethod
-    async def check_upstream_tx_id_exists(
-        cls, session: AsyncSession, upstream_type: UpstreamType, upstream_tx_id: str
+    async def add_rollups(cls, session: AsyncSession, event: CreditEventTable) -> None:
+        """
+        Add a new credit event to the daily rollups of its accounts.
+        Call it in the transaction that inserts the event.
+
+        Args:
+            session: Database session
+            event: The credit event just inserted
+        """
+        rows = [(event.account_id, event.direction, event.total_amount)]
+        if event.fee_agent_account and event.fee_agent_amount:
+            rows.append(
+                (event.fee_agent_account, Direction.INCOME, event.fee_agent_amount)
+            )
+        if event.fee_dev_account and event.fee_dev_amount:
+            rows.append((event.fee_dev_account, Direction.INCOME, event.fee_dev_amount))
+        # the UTC day of created_at, now() is the transaction start time
+        day = cast(func.timezone("UTC", func.now()), Date)
+        stmt = pg_insert(CreditRollupTable).values(
+            [
+                {
+                    "account_id": account_id,
+                    "day": day,
+                    "event_type": event.event_type,
+                    "direction": direction,
+                    "event_count": 1,
+                    "total_amount": event.total_amount,
+                    "amount": amount,
+                }
+                # a fixed order of row locks, no deadlocks between events
+                for account_id, direction, amount in sorted(rows, key=lambda r: r[:2])
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["account_id", "day", "event_type", "direction"],
+            set_={
+                "event_count": CreditRollupTable.event_count
+                + stmt.excluded.event_count,
+                "total_amount": CreditRollupTable.total_amount
+                + stmt.excluded.total_amount,
+                "amount": CreditRollupTable.amount + stmt.excluded.amount,
+                "updated_at": func.now(),
+            },
+        )
+        await session.execute(stmt)
+
+    @classmethod
+    async def claim_upstream_tx(
+        cls,
+        session: AsyncSession,
+        upstream_type: UpstreamType,
+        upstream_tx_id: str,
+        event_id: str,
     ) -> None:
         """
-        Check if an event with the given upstream_type and upstream_tx_id already exists.
-        Raises HTTP 400 error if it exists to prevent duplicate transactions.
+        Claim an upstream transaction for a new credit event.
+        Raises HTTP 400 error if it is claimed already to prevent duplicate transactions.
+        A concurrent claim of the same transaction waits until the first one
+        commits or rolls back.
 
         Args:
             session: Database session
             upstream_type: Type of the upstream transaction
             upstream_tx_id: ID of the upstream transaction
+            event_id: ID of the credit event to create
 
         Raises:
             HTTPException: If a transaction with the same upstream_tx_id already exists
         """
-        stmt = select(CreditEventTable).where(
-            CreditEventTable.upstream_type == upstream_type,
-            CreditEventTable.upstream_tx_id == upstream_tx_id,
+        stmt = (
+            pg_insert(CreditEventUpstreamTable)
+            .values(
+                upstream_type=upstream_type,
+                upstream_tx_id=upstream_tx_id,
+                event_id=event_id,
+            )
+            .on_conflict_do_nothing()
+            .returning(CreditEventUpstreamTable.event_id)
         )
-        result = await session.scalar(stmt)
-        if result:
+        if await session.scalar(stmt) is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"Transaction with upstream_tx_id '{upstream_tx_id}' already exists. Do not resubmit.",
@@ -823,12 +984,15 @@ class CreditTransactionTable(Base):
     """
 
     __tablename__ = "credit_transactions"
-    __table_args__ = (Index("ix_credit_transactions_account", "account_id"),)
-
-    id = Column(
-        String,
-        primary_key=True,
+    # partitioned by month, see models/db_mig.py
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "created_at"),
+        Index("ix_credit_transactions_account", "account_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+
+    # the primary key is (id, created_at), see __table_args__
+    id = Column(String)
     account_id = Column(
         String,
         nullable=False,
@@ -860,6 +1024,9 @@ class CreditTransactionTable(Base):
         server_default=func.now(),
     )
 
+    # the id alone is unique, created_at is only in the key for partitioning
+    __mapper_args__ = {"primary_key": [id]}
+
 
 class CreditTransaction(BaseModel):
     """Credit transaction model with all fields."""
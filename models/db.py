@@ -1,16 +1,150 @@
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, AsyncGenerator, Optional
 from urllib.parse import quote_plus
+from uuid import uuid4
 
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-from psycopg_pool import AsyncConnectionPool
+from prometheus_client import Counter, Gauge, Histogram
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 from pydantic import Field
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from models.db_mig import safe_migrate
 
+logger = logging.getLogger(__name__)
+
 engine = None
 _pool = None
+# Optional read replica, used by get_replica_db and get_replica_session
+replica_engine = None
+_replica_max_lag = 5.0
+_replica_checked = 0.0
+_replica_ok = False
+
+# ORM pool size, ORM max overflow and checkpoint pool size of each process
+# role. Each process holds up to their sum of connections, plus the replica
+# pool if there is one, so keep the sum over all processes under the
+# max_connections of postgres.
+POOL_SIZES = {
+    "api": (10, 10, 10),
+    "readonly": (5, 5, 2),
+    "singleton": (5, 5, 2),
+    "autonomous": (10, 10, 10),
+    "twitter": (5, 5, 5),
+    "telegram": (10, 10, 10),
+    "scheduler": (3, 2, 2),
+}
+DEFAULT_POOL_SIZES = (5, 5, 2)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "intentkit_db_pool_checked_out",
+    "Database connections in use",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "intentkit_db_pool_wait_seconds",
+    "Time to get a database connection from the pool",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "intentkit_db_pool_timeouts",
+    "Database connection requests that timed out waiting for the pool",
+    ["pool"],
+)
+
+
+class _TimedQueuePool(AsyncAdaptedQueuePool):
+    """SQLAlchemy pool that records the time to get a connection."""
+
+    pool_name = "orm"
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(pool=self.pool_name).inc()
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(pool=self.pool_name).observe(
+                time.perf_counter() - start
+            )
+
+
+class _TimedConnectionPool(AsyncConnectionPool):
+    """Psycopg pool of the checkpointer that records its connection use."""
+
+    async def getconn(self, timeout: Optional[float] = None):
+        start = time.perf_counter()
+        try:
+            conn = await super().getconn(timeout)
+        except PoolTimeout:
+            DB_POOL_TIMEOUTS.labels(pool="checkpoint").inc()
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(pool="checkpoint").observe(
+                time.perf_counter() - start
+            )
+        DB_POOL_CHECKED_OUT.labels(pool="checkpoint").inc()
+        return conn
+
+    async def putconn(self, conn) -> None:
+        DB_POOL_CHECKED_OUT.labels(pool="checkpoint").dec()
+        await super().putconn(conn)
+
+
+def _create_engine(
+    url: str, pool_name: str, pool_size: int, max_overflow: int, pgbouncer: bool
+) -> AsyncEngine:
+    connect_args = {}
+    if pgbouncer:
+        # no server side prepared statements in transaction pooling, a statement
+        # may run on another server connection than the one it was prepared on
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    new_engine = create_async_engine(
+        url,
+        poolclass=_TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=60,
+        pool_pre_ping=True,  # Enable connection health checks
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        connect_args=connect_args,
+    )
+    new_engine.pool.pool_name = pool_name
+    gauge = DB_POOL_CHECKED_OUT.labels(pool=pool_name)
+    event.listen(new_engine.sync_engine, "checkout", lambda *args: gauge.inc())
+    event.listen(new_engine.sync_engine, "checkin", lambda *args: gauge.dec())
+    return new_engine
+
+
+# Seconds between replication lag checks
+REPLICA_CHECK_INTERVAL = 5.0
+# Seconds a lag check may take, the request waiting on it goes to the primary after
+REPLICA_CHECK_TIMEOUT = 1.0
+# Seconds the replica is behind the primary, 0 if it is not a replica
+_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
 
 
 async def init_db(
@@ -22,6 +156,30 @@ async def init_db(
     auto_migrate: Annotated[
         bool, Field(default=True, description="Whether to run migrations automatically")
     ],
+    replica_host: Annotated[
+        Optional[str], Field(default=None, description="Read replica host")
+    ] = None,
+    replica_port: Annotated[
+        Optional[str], Field(default=None, description="Read replica port")
+    ] = None,
+    replica_max_lag: Annotated[
+        float, Field(default=5.0, description="Max replica lag in seconds")
+    ] = 5.0,
+    role: Annotated[
+        str, Field(default="", description="Process role, it sets the pool sizes")
+    ] = "",
+    pool_size: Annotated[
+        Optional[int], Field(default=None, description="ORM pool size")
+    ] = None,
+    max_overflow: Annotated[
+        Optional[int], Field(default=None, description="ORM pool max overflow")
+    ] = None,
+    checkpoint_pool_size: Annotated[
+        Optional[int], Field(default=None, description="Checkpoint pool size")
+    ] = None,
+    pgbouncer: Annotated[
+        bool, Field(default=False, description="Connect through PgBouncer")
+    ] = False,
 ) -> None:
     """Initialize the database and handle schema updates.
 
@@ -32,26 +190,43 @@ async def init_db(
         dbname: Database name
         port: Database port (default: 5432)
         auto_migrate: Whether to run migrations automatically (default: True)
+        replica_host: Read replica host, with the same credentials as the primary.
+            Without it all reads go to the primary.
+        replica_port: Read replica port (default: the primary port)
+        replica_max_lag: Reads go to the primary while the replica is further
+            behind than this many seconds (default: 5)
+        role: Process role, a key of POOL_SIZES (default: scripts and tools)
+        pool_size: ORM pool size (default: by role)
+        max_overflow: ORM pool max overflow (default: by role)
+        checkpoint_pool_size: Max size of the checkpoint pool (default: by role)
+        pgbouncer: Connect through PgBouncer in transaction pooling mode,
+            without server side prepared statements (default: False)
     """
-    global engine, _pool
+    global engine, _pool, replica_engine, _replica_max_lag
+    sizes = POOL_SIZES.get(role, DEFAULT_POOL_SIZES)
+    pool_size = sizes[0] if pool_size is None else pool_size
+    max_overflow = sizes[1] if max_overflow is None else max_overflow
+    checkpoint_pool_size = (
+        sizes[2] if checkpoint_pool_size is None else checkpoint_pool_size
+    )
     # Initialize psycopg pool if not already initialized
     if _pool is None:
-        _pool = AsyncConnectionPool(
+        _pool = _TimedConnectionPool(
             conninfo=f"postgresql://{username}:{quote_plus(password)}@{host}:{port}/{dbname}",
-            min_size=3,
-            max_size=20,
+            min_size=min(3, checkpoint_pool_size),
+            max_size=checkpoint_pool_size,
             timeout=60,
             max_idle=30 * 60,
+            kwargs={"prepare_threshold": None} if pgbouncer else None,
         )
     # Initialize SQLAlchemy engine with pool settings
     if engine is None:
-        engine = create_async_engine(
+        engine = _create_engine(
             f"postgresql+asyncpg://{username}:{quote_plus(password)}@{host}:{port}/{dbname}",
-            pool_size=20,  # Increase pool size
-            max_overflow=30,  # Increase max overflow
-            pool_timeout=60,  # Increase timeout
-            pool_pre_ping=True,  # Enable connection health checks
-            pool_recycle=3600,  # Recycle connections after 1 hour
+            "orm",
+            pool_size,
+            max_overflow,
+            pgbouncer,
         )
         if auto_migrate:
             await safe_migrate(engine)
@@ -59,6 +234,45 @@ async def init_db(
                 await conn.set_autocommit(True)
                 saver = AsyncPostgresSaver(conn)
                 await saver.setup()
+    if replica_host and replica_engine is None:
+        replica_engine = _create_engine(
+            f"postgresql+asyncpg://{username}:{quote_plus(password)}@{replica_host}:{replica_port or port}/{dbname}",
+            "replica",
+            pool_size,
+            max_overflow,
+            pgbouncer,
+        )
+        _replica_max_lag = replica_max_lag
+    logger.info(
+        f"database pools of {role or 'default'} role: orm {pool_size}+{max_overflow}, "
+        f"checkpoint {checkpoint_pool_size}"
+    )
+
+
+def pool_stats() -> dict:
+    """Connection counts of the database pools of this process."""
+    stats = {}
+    if engine is not None:
+        stats["orm"] = {
+            "size": engine.pool.size(),
+            "checked_out": engine.pool.checkedout(),
+            "overflow": engine.pool.overflow(),
+        }
+    if replica_engine is not None:
+        stats["replica"] = {
+            "size": replica_engine.pool.size(),
+            "checked_out": replica_engine.pool.checkedout(),
+            "overflow": replica_engine.pool.overflow(),
+        }
+    if _pool is not None:
+        checkpoint = _pool.get_stats()
+        stats["checkpoint"] = {
+            "size": checkpoint.get("pool_size", 0),
+            "available": checkpoint.get("pool_available", 0),
+            "waiting": checkpoint.get("requests_waiting", 0),
+            "timeouts": checkpoint.get("requests_errors", 0),
+        }
+    return stats
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -66,6 +280,47 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def _replica_lag() -> Optional[float]:
+    async with replica_engine.connect() as conn:
+        return await conn.scalar(_REPLICA_LAG)
+
+
+async def _replica_usable() -> bool:
+    """Whether the replica is up and close enough behind the primary.
+
+    Checked at most every REPLICA_CHECK_INTERVAL seconds, requests in between
+    use the last result. A replica that does not answer within
+    REPLICA_CHECK_TIMEOUT seconds is not used.
+    """
+    global _replica_checked, _replica_ok
+    if replica_engine is None:
+        return False
+    now = time.monotonic()
+    if now - _replica_checked < REPLICA_CHECK_INTERVAL:
+        return _replica_ok
+    _replica_checked = now
+    try:
+        lag = await asyncio.wait_for(_replica_lag(), REPLICA_CHECK_TIMEOUT)
+        ok = lag is None or lag <= _replica_max_lag
+        if not ok:
+            logger.warning(f"read replica is {lag:.1f}s behind, reading from primary")
+    except asyncio.TimeoutError:
+        logger.warning("read replica did not answer in time, reading from primary")
+        ok = False
+    except Exception as e:
+        logger.warning(f"read replica unavailable, reading from primary: {e}")
+        ok = False
+    _replica_ok = ok
+    return ok
+
+
+async def get_replica_db() -> AsyncGenerator[AsyncSession, None]:
+    """Like get_db, but on the read replica when it is usable. Only for reads."""
+    bind = replica_engine if await _replica_usable() else engine
+    async with AsyncSession(bind) as session:
+        yield session
+
+
 @asynccontextmanager
 async def get_session() -> AsyncSession:
     """Get a database session using an async context manager.
@@ -91,6 +346,21 @@ async def get_session() -> AsyncSession:
         await session.close()
 
 
+@asynccontextmanager
+async def get_replica_session() -> AsyncSession:
+    """Like get_session, but on the read replica when it is usable.
+
+    Falls back to the primary without a replica, or while the replica is
+    down or lagging. Only for reads that can be a few seconds stale.
+    """
+    bind = replica_engine if await _replica_usable() else engine
+    session = AsyncSession(bind)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 def get_engine() -> AsyncEngine:
     """Get the SQLAlchemy async engine.
 
@@ -1,14 +1,26 @@
 """Database migration utilities."""
 
 import logging
-from typing import Callable
+import re
+from datetime import date, datetime, timezone
+from typing import Callable, Optional
 
-from sqlalchemy import Column, MetaData, inspect, text
+from sqlalchemy import Column, Index, MetaData, Table, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import quoted_name
 
 from models.base import Base
 
 logger = logging.getLogger(__name__)
 
+# Monthly partitions created ahead of the current month
+PARTITION_MONTHS_AHEAD = 3
+
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+_INDEX_COLUMNS = re.compile(r"\(([^()]*)\)$")
+
+_preparer = postgresql.dialect().identifier_preparer
+
 
 async def add_column_if_not_exists(
     conn, dialect, table_name: str, column: Column
@@ -66,6 +78,293 @@ async def update_table_schema(conn, dialect, model_cls) -> None:
         if name != "id":  # Skip primary key
             await add_column_if_not_exists(conn, dialect, table_name, column)
 
+    # new indexes of existing tables block writes while they are built here,
+    # they are built concurrently by scripts/create_indexes.py instead
+    existing = await list_indexes(conn, table_name)
+    missing = [i.name for i in model_cls.__table__.indexes if i.name not in existing]
+    if missing:
+        logger.info(
+            f"Table {table_name} is missing indexes {', '.join(sorted(missing))}, "
+            "run scripts/create_indexes.py to create them"
+        )
+
+
+def partitioned_tables() -> list[Table]:
+    """Model tables partitioned by month on created_at."""
+    return [
+        table
+        for table in Base.metadata.sorted_tables
+        if table.dialect_options["postgresql"]["partition_by"]
+    ]
+
+
+def month_start(day: date, months: int = 0) -> date:
+    """First day of the month of a day, moved by a number of months."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def quote_ident(name: str) -> str:
+    """Quote a table or index name for DDL that is built as text."""
+    return _preparer.quote(quoted_name(name, True))
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+
+async def is_partitioned(conn, table_name: str) -> bool:
+    """Whether a table exists and is partitioned."""
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": table_name},
+    )
+    return result.scalar() == "p"
+
+
+async def list_partitions(
+    conn, table_name: str
+) -> list[tuple[str, Optional[datetime]]]:
+    """Partitions of a table with their upper bound, None for the default one."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+        ),
+        {"name": table_name},
+    )
+    partitions = []
+    for name, bound in result:
+        match = _UPPER_BOUND.search(bound or "")
+        upper = None
+        if match:
+            # printed in the session time zone
+            upper = datetime.fromisoformat(match.group(1)).astimezone(timezone.utc)
+        partitions.append((name, upper))
+    return partitions
+
+
+async def ensure_partitions(
+    conn,
+    table_name: str,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    today: Optional[date] = None,
+) -> None:
+    """Create the monthly partitions of a table up to months ahead.
+
+    Months already covered by a partition are skipped. Rows outside of all
+    partitions go to the default partition, so a missed run never fails inserts.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    table = quote_ident(table_name)
+    await conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {quote_ident(f'{table_name}_default')} "
+            f"PARTITION OF {table} DEFAULT"
+        )
+    )
+    bounds = [upper for _, upper in await list_partitions(conn, table_name) if upper]
+    covered = max(bounds).date() if bounds else None
+    for months in range(months_ahead + 1):
+        start = month_start(today, months)
+        if covered and start < covered:
+            continue
+        end = month_start(today, months + 1)
+        name = partition_name(table_name, start)
+        try:
+            # a failure, like rows of the month in the default partition,
+            # must not roll back the migration
+            async with conn.begin_nested():
+                await conn.execute(
+                    text(
+                        f"CREATE TABLE {quote_ident(name)} PARTITION OF {table} "
+                        f"FOR VALUES FROM ('{start} 00:00:00+00') "
+                        f"TO ('{end} 00:00:00+00')"
+                    )
+                )
+            logger.info(f"Created partition {name}")
+        except Exception as e:
+            logger.error(f"Failed to create partition {name}: {e}")
+
+
+async def partition_table(conn, table: Table, today: Optional[date] = None) -> None:
+    """Convert an existing table into a table partitioned by month.
+
+    The old table becomes the partition of everything before next month, so
+    no rows are copied, but attaching it scans it and builds its new primary
+    key under an exclusive lock. Run it from scripts/partition_tables.py in a
+    maintenance window, safe_migrate never does.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    legacy = f"{table.name}_legacy"
+    boundary = month_start(today, 1)
+    result = await conn.execute(
+        text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = :name"
+        ),
+        {"name": table.name},
+    )
+    indexes = result.scalars().all()
+    await conn.execute(
+        text(f"ALTER TABLE {quote_ident(table.name)} RENAME TO {quote_ident(legacy)}")
+    )
+    # free the index names for the partitioned table
+    for index in indexes:
+        await conn.execute(
+            text(
+                f"ALTER INDEX {quote_ident(index)} "
+                f"RENAME TO {quote_ident(f'{index}_legacy')}"
+            )
+        )
+    await conn.run_sync(table.create)
+    await conn.execute(
+        text(
+            f"ALTER TABLE {quote_ident(table.name)} "
+            f"ATTACH PARTITION {quote_ident(legacy)} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{boundary} 00:00:00+00')"
+        )
+    )
+    await ensure_partitions(conn, table.name, today=today)
+    logger.info(f"Partitioned table {table.name}, old rows are in {legacy}")
+
+
+async def list_indexes(conn, table_name: str) -> dict[str, tuple[str, bool]]:
+    """Indexes of a table by name, with their definition and whether they are valid."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, pg_get_indexdef(c.oid), x.indisvalid "
+            "FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+            "WHERE x.indrelid = to_regclass(:name)"
+        ),
+        {"name": table_name},
+    )
+    return {name: (definition, valid) for name, definition, valid in result}
+
+
+def index_matches(index: Index, definition: str) -> bool:
+    """Whether an index definition from the database has the columns of a model index."""
+    match = _INDEX_COLUMNS.search(definition)
+    columns = [c.strip().strip('"') for c in match.group(1).split(",")] if match else []
+    return columns == [c.name for c in index.columns] and index.unique == (
+        "UNIQUE" in definition.split(" ON ")[0]
+    )
+
+
+def _create_index_sql(index: Index, name: str, target: str) -> str:
+    columns = ", ".join(quote_ident(c.name) for c in index.columns)
+    unique = "UNIQUE " if index.unique else ""
+    return f"CREATE {unique}INDEX {target.format(name=quote_ident(name))} ({columns})"
+
+
+async def create_index(conn, index: Index, rebuild: bool = False) -> None:
+    """Create a model index of an existing table without blocking writes.
+
+    The connection must be in autocommit mode, concurrent index builds cannot
+    run in a transaction. A partitioned table gets the index on itself only,
+    then each partition builds its own concurrently and attaches it. An index
+    whose columns changed is only dropped and built again with rebuild.
+    """
+    table = index.table.name
+    partitioned = await is_partitioned(conn, table)
+    existing = (await list_indexes(conn, table)).get(index.name)
+    drop = False
+    if existing:
+        definition, valid = existing
+        if not index_matches(index, definition):
+            if not rebuild:
+                logger.warning(
+                    f"Index {index.name} differs from the model: {definition}, "
+                    "run again with --rebuild to build it again"
+                )
+                return
+            logger.info(f"Dropping index {index.name} to build it again")
+            drop = True
+        elif valid:
+            return
+        elif not partitioned:
+            # a concurrent build that failed leaves an invalid index behind
+            logger.info(f"Dropping invalid index {index.name} to build it again")
+            drop = True
+        # an invalid index of a partitioned table waits for its partitions
+    if drop:
+        concurrently = "" if partitioned else "CONCURRENTLY "
+        await conn.execute(
+            text(f"DROP INDEX {concurrently}IF EXISTS {quote_ident(index.name)}")
+        )
+
+    if not partitioned:
+        await conn.execute(
+            text(
+                _create_index_sql(
+                    index,
+                    index.name,
+                    "CONCURRENTLY IF NOT EXISTS {name} ON " + quote_ident(table),
+                )
+            )
+        )
+        logger.info(f"Created index {index.name}")
+        return
+
+    # the index of the partitioned table stays invalid until every partition
+    # has attached its own
+    await conn.execute(
+        text(
+            _create_index_sql(
+                index, index.name, "IF NOT EXISTS {name} ON ONLY " + quote_ident(table)
+            )
+        )
+    )
+    for partition, _ in await list_partitions(conn, table):
+        result = await conn.execute(
+            text(
+                "SELECT 1 FROM pg_inherits i "
+                "JOIN pg_index x ON x.indexrelid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:index) "
+                "AND x.indrelid = to_regclass(:partition)"
+            ),
+            {"index": quote_ident(index.name), "partition": quote_ident(partition)},
+        )
+        if result.scalar():
+            continue
+        name = f"{partition}_{index.name}"
+        await conn.execute(
+            text(
+                _create_index_sql(
+                    index,
+                    name,
+                    "CONCURRENTLY IF NOT EXISTS {name} ON " + quote_ident(partition),
+                )
+            )
+        )
+        await conn.execute(
+            text(
+                f"ALTER INDEX {quote_ident(index.name)} "
+                f"ATTACH PARTITION {quote_ident(name)}"
+            )
+        )
+    logger.info(f"Created index {index.name} on the partitions of {table}")
+
+
+async def backfill_upstreams(conn) -> int:
+    """Claim the upstream transactions of the existing credit events.
+
+    credit_event_upstreams keeps upstream transactions unique, a table created
+    next to existing credit events must hold their transactions before the
+    first new event is claimed.
+    """
+    result = await conn.execute(
+        text(
+            "INSERT INTO credit_event_upstreams "
+            "(upstream_type, upstream_tx_id, event_id, created_at) "
+            "SELECT upstream_type, upstream_tx_id, id, created_at "
+            "FROM credit_events ON CONFLICT DO NOTHING"
+        )
+    )
+    logger.info(f"Backfilled {result.rowcount} upstream transactions")
+    return result.rowcount
+
 
 async def safe_migrate(engine) -> None:
     """Safely migrate all SQLAlchemy models by adding new columns.
@@ -78,9 +377,15 @@ async def safe_migrate(engine) -> None:
 
     async with engine.begin() as conn:
         try:
+            tables = await conn.run_sync(lambda c: inspect(c).get_table_names())
+
             # Create tables if they don't exist
             await conn.run_sync(Base.metadata.create_all)
 
+            # in the same transaction, so no claim runs before the backfill
+            if "credit_events" in tables and "credit_event_upstreams" not in tables:
+                await backfill_upstreams(conn)
+
             # Get existing table metadata
             metadata = MetaData()
             await conn.run_sync(metadata.reflect)
@@ -96,6 +401,15 @@ async def safe_migrate(engine) -> None:
                             await update_table_schema(conn, dialect, model_cls)
 
                         await update_table_wrapper()
+
+            for table in partitioned_tables():
+                if await is_partitioned(conn, table.name):
+                    await ensure_partitions(conn, table.name)
+                else:
+                    logger.info(
+                        f"Table {table.name} is not partitioned yet, "
+                        "run scripts/partition_tables.py to convert it"
+                    )
         except Exception as e:
             logger.error(f"Error updating database schema: {str(e)}")
             raise
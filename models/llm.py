@@ -1,19 +1,51 @@
+import asyncio
+import hashlib
 import json
+import logging
+import time
 from datetime import datetime, timezone
 from decimal import Decimal
 from enum import Enum
-from typing import Annotated, Any, Dict, Optional
+from typing import Annotated, Any, Callable, Dict, Optional
 
+import httpx
 from langchain_core.language_models import LanguageModelLike
+from prometheus_client import Gauge
 from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import Boolean, Column, DateTime, Integer, Numeric, String, func, select
 
-from models.app_setting import AppSetting
+from models.app_setting import AppSettingTable, PaymentSettings
 from models.base import Base
 from models.db import get_session
 from models.redis import get_redis
 
-_credit_per_usdc = None
+logger = logging.getLogger(__name__)
+
+# Process-local catalogue of model info and pricing, see refresh_model_catalogue
+_catalogue: dict[str, "LLMModelInfo"] = {}
+_credit_per_usdc: Optional[Decimal] = None
+_catalogue_version: Optional[tuple] = None
+_catalogue_checked_at = 0.0
+_catalogue_lock = asyncio.Lock()
+# Seconds between two checks of the catalogue version stamp
+CATALOGUE_CHECK_INTERVAL = 30
+# Bump this redis key to make every process reload the catalogue at next check
+CATALOGUE_VERSION_KEY = "intentkit:llm_model:catalogue_version"
+
+# HTTP clients shared by all LLM instances of the same provider endpoint,
+# keyed by (provider, api_base, api_key)
+_http_clients: dict[tuple[str, str, str], tuple[httpx.Client, httpx.AsyncClient]] = {}
+# LLM instances are stateless, agents with the same model parameters share one
+_instances: dict[str, LanguageModelLike] = {}
+# Number of shared instances bound to each http client key
+_http_client_bindings: dict[tuple[str, str, str], int] = {}
+
+LLM_HTTP_CONNECTIONS = Gauge(
+    "intentkit_llm_http_connections",
+    "Connections of the shared LLM http pools by state, sampled at each LLM call",
+    ["provider", "state"],
+    multiprocess_mode="livesum",
+)
 
 
 class LLMProvider(str, Enum):
@@ -38,6 +70,9 @@ class LLMModelInfoTable(Base):
     output_price = Column(
         Numeric(22, 4), nullable=False
     )  # Price per 1M output tokens in USD
+    cached_input_price = Column(
+        Numeric(22, 4), nullable=True
+    )  # Price per 1M cached input tokens in USD, input_price if not set
     context_length = Column(Integer, nullable=False)  # Maximum context length in tokens
     output_length = Column(Integer, nullable=False)  # Maximum output length in tokens
     intelligence = Column(Integer, nullable=False)  # Intelligence rating from 1-5
@@ -78,6 +113,9 @@ class LLMModelInfo(BaseModel):
     provider: LLMProvider
     input_price: Decimal  # Price per 1M input tokens in USD
     output_price: Decimal  # Price per 1M output tokens in USD
+    cached_input_price: Optional[Decimal] = (
+        None  # Price per 1M cached input tokens in USD, input_price if not set
+    )
     context_length: int  # Maximum context length in tokens
     output_length: int  # Maximum output length in tokens
     intelligence: int = Field(ge=1, le=5)  # Intelligence rating from 1-5
@@ -118,9 +156,10 @@ class LLMModelInfo(BaseModel):
 
     @staticmethod
     async def get(model_id: str) -> Optional["LLMModelInfo"]:
-        """Get a model by ID with Redis caching.
+        """Get a model by ID from the process-local catalogue.
 
-        The model info is cached in Redis for 3 minutes.
+        The catalogue is reloaded from the database when its version stamp
+        changes, see refresh_model_catalogue.
 
         Args:
             model_id: ID of the model to retrieve
@@ -128,63 +167,31 @@ class LLMModelInfo(BaseModel):
         Returns:
             LLMModelInfo: The model info if found, None otherwise
         """
-        # Redis cache key for model info
-        cache_key = f"intentkit:llm_model:{model_id}"
-        cache_ttl = 180  # 3 minutes in seconds
-
-        # Try to get from Redis cache first
-        redis = get_redis()
-        cached_data = await redis.get(cache_key)
-
-        if cached_data:
-            # If found in cache, deserialize and return
-            try:
-                return LLMModelInfo.model_validate_json(cached_data)
-            except (json.JSONDecodeError, TypeError):
-                # If cache is corrupted, invalidate it
-                await redis.delete(cache_key)
-
-        # If not in cache or cache is invalid, get from database
-        async with get_session() as session:
-            # Query the database for the model
-            stmt = select(LLMModelInfoTable).where(LLMModelInfoTable.id == model_id)
-            model = await session.scalar(stmt)
-
-            # If model exists in database, convert to LLMModelInfo model and cache it
-            if model:
-                # Convert provider string to enum
-                model_info = LLMModelInfo.model_validate(model)
-
-                # Cache the model in Redis
-                await redis.set(
-                    cache_key,
-                    model_info.model_dump_json(),
-                    ex=cache_ttl,
-                )
-
-                return model_info
-
-        # If not found in database, check AVAILABLE_MODELS
-        if model_id in AVAILABLE_MODELS:
-            model_info = AVAILABLE_MODELS[model_id]
-
-            # Cache the model in Redis
-            await redis.set(cache_key, model_info.model_dump_json(), ex=cache_ttl)
-
-            return model_info
+        await refresh_model_catalogue()
+        return _catalogue.get(model_id)
 
-        # Not found anywhere
-        return None
+    def calculate_cost(
+        self, input_tokens: int, output_tokens: int, cached_tokens: int = 0
+    ) -> Decimal:
+        """Calculate the cost for a given number of tokens.
 
-    async def calculate_cost(self, input_tokens: int, output_tokens: int) -> Decimal:
-        global _credit_per_usdc
-        if not _credit_per_usdc:
-            _credit_per_usdc = (await AppSetting.payment()).credit_per_usdc
-        """Calculate the cost for a given number of tokens."""
+        The cached tokens are part of the input tokens, billed at the cached price.
+        Needs the catalogue loaded, which every catalogue lookup ensures.
+        """
+        if _credit_per_usdc is None:
+            raise RuntimeError("Model catalogue not loaded")
+        cached_tokens = min(cached_tokens, input_tokens)
+        cached_price = (
+            self.cached_input_price
+            if self.cached_input_price is not None
+            else self.input_price
+        )
         input_cost = (
             _credit_per_usdc
-            * Decimal(input_tokens)
-            * self.input_price
+            * (
+                Decimal(input_tokens - cached_tokens) * self.input_price
+                + Decimal(cached_tokens) * cached_price
+            )
             / Decimal(1000000)
         )
         output_cost = (
@@ -205,6 +212,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("2.50"),  # per 1M input tokens
         output_price=Decimal("10.00"),  # per 1M output tokens
+        cached_input_price=Decimal("1.25"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=4,
@@ -219,6 +227,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("0.15"),  # per 1M input tokens
         output_price=Decimal("0.60"),  # per 1M output tokens
+        cached_input_price=Decimal("0.075"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=3,
@@ -233,6 +242,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("0.1"),  # per 1M input tokens
         output_price=Decimal("0.4"),  # per 1M output tokens
+        cached_input_price=Decimal("0.025"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=3,
@@ -247,6 +257,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("0.4"),  # per 1M input tokens
         output_price=Decimal("1.6"),  # per 1M output tokens
+        cached_input_price=Decimal("0.10"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=4,
@@ -261,6 +272,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("2.00"),  # per 1M input tokens
         output_price=Decimal("8.00"),  # per 1M output tokens
+        cached_input_price=Decimal("0.50"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=5,
@@ -275,6 +287,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.OPENAI,
         input_price=Decimal("1.10"),  # per 1M input tokens
         output_price=Decimal("4.40"),  # per 1M output tokens
+        cached_input_price=Decimal("0.275"),  # per 1M cached input tokens
         context_length=128000,
         output_length=4096,
         intelligence=4,
@@ -291,6 +304,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.DEEPSEEK,
         input_price=Decimal("0.27"),
         output_price=Decimal("1.10"),
+        cached_input_price=Decimal("0.07"),  # per 1M cached input tokens
         context_length=60000,
         output_length=4096,
         intelligence=4,
@@ -307,6 +321,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.DEEPSEEK,
         input_price=Decimal("0.55"),
         output_price=Decimal("2.19"),
+        cached_input_price=Decimal("0.14"),  # per 1M cached input tokens
         context_length=60000,
         output_length=4096,
         intelligence=4,
@@ -340,6 +355,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.XAI,
         input_price=Decimal("3"),
         output_price=Decimal("15"),
+        cached_input_price=Decimal("0.75"),  # per 1M cached input tokens
         context_length=131072,
         output_length=4096,
         intelligence=5,
@@ -355,6 +371,7 @@ AVAILABLE_MODELS = {
         provider=LLMProvider.XAI,
         input_price=Decimal("0.3"),
         output_price=Decimal("0.5"),
+        cached_input_price=Decimal("0.075"),  # per 1M cached input tokens
         context_length=131072,
         output_length=4096,
         intelligence=5,
@@ -407,6 +424,119 @@ AVAILABLE_MODELS = {
 }
 
 
+def get_http_clients(
+    provider: str, api_base: Optional[str], api_key: Optional[str], config: Any
+) -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Get the pooled http clients of a provider endpoint, create them on first use.
+
+    Args:
+        provider: The LLM provider
+        api_base: The API base URL, None for the provider default
+        api_key: The API key used with this endpoint
+        config: The app config with the pool sizing
+
+    Returns:
+        The sync and async http clients
+    """
+    key = (provider, api_base or "", api_key or "")
+    clients = _http_clients.get(key)
+    if clients is None:
+        from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+        limits = httpx.Limits(
+            max_connections=config.llm_http_max_connections,
+            max_keepalive_connections=config.llm_http_max_keepalive_connections,
+            keepalive_expiry=config.llm_http_keepalive_expiry,
+        )
+        clients = (
+            DefaultHttpxClient(limits=limits),
+            DefaultAsyncHttpxClient(limits=limits),
+        )
+        _http_clients[key] = clients
+    return clients
+
+
+def shared_instance(
+    factory: Callable[..., LanguageModelLike],
+    provider: str,
+    api_base: Optional[str],
+    api_key: Optional[str],
+    config: Any,
+    **kwargs,
+) -> LanguageModelLike:
+    """Get an LLM instance built with kwargs, reusing the one with same parameters.
+
+    All instances of a provider endpoint share the same pooled http clients,
+    so a worker with many cached agents keeps one connection pool per endpoint.
+    """
+    key = json.dumps(
+        {"factory": factory.__name__, "api_key": api_key, **kwargs},
+        sort_keys=True,
+        default=str,
+    )
+    instance = _instances.get(key)
+    if instance is None:
+        client_key = (provider, api_base or "", api_key or "")
+        http_client, http_async_client = get_http_clients(
+            provider, api_base, api_key, config
+        )
+        instance = factory(
+            http_client=http_client, http_async_client=http_async_client, **kwargs
+        )
+        _instances[key] = instance
+        _http_client_bindings[client_key] = _http_client_bindings.get(client_key, 0) + 1
+    return instance
+
+
+def _pool_connections(async_client: httpx.AsyncClient) -> Optional[list]:
+    """The connections of the httpcore pool of a client, None if unknown.
+
+    httpx has no public accessor for the connection pool of its transport, so
+    this reads the private `_pool` attribute of httpx.AsyncHTTPTransport. The
+    pool and its connections are public httpcore API. If a httpx upgrade
+    renames the attribute, the connection counts are reported as None.
+    """
+    pool = getattr(async_client._transport, "_pool", None)
+    connections = getattr(pool, "connections", None)
+    return list(connections) if connections is not None else None
+
+
+def llm_transport_stats() -> list[dict]:
+    """Get the shared http client pools and how many LLM instances use them."""
+    stats = []
+    for (provider, api_base, api_key), (_, async_client) in _http_clients.items():
+        connections = _pool_connections(async_client)
+        stats.append(
+            {
+                "provider": provider,
+                "api_base": api_base,
+                "api_key": hashlib.sha256(api_key.encode()).hexdigest()[:8],
+                "instances": _http_client_bindings.get(
+                    (provider, api_base, api_key), 0
+                ),
+                "connections": len(connections) if connections is not None else None,
+                "idle": sum(1 for c in connections if c.is_idle())
+                if connections is not None
+                else None,
+            }
+        )
+    return stats
+
+
+def record_llm_transport_metrics() -> None:
+    """Set the connection gauges of the shared LLM http pools, per provider."""
+    totals: dict[str, list[int]] = {}
+    for stats in llm_transport_stats():
+        if stats["connections"] is None:
+            continue
+        total = totals.setdefault(stats["provider"], [0, 0])
+        total[0] += stats["connections"] - stats["idle"]
+        total[1] += stats["idle"]
+    for provider, (active, idle) in totals.items():
+        LLM_HTTP_CONNECTIONS.labels(provider=provider, state="active").set(active)
+        LLM_HTTP_CONNECTIONS.labels(provider=provider, state="idle").set(idle)
+
+
 class LLMModel(BaseModel):
     """Base model for LLM configuration."""
 
@@ -416,9 +546,9 @@ class LLMModel(BaseModel):
     presence_penalty: float = 0.0
 
     async def model_info(self) -> LLMModelInfo:
-        """Get the model information with caching.
+        """Get the model information from the process-local catalogue.
 
-        First tries to get from cache, then database, then AVAILABLE_MODELS.
+        Database models override AVAILABLE_MODELS.
         Raises ValueError if model is not found anywhere.
         """
         model_info = await LLMModelInfo.get(self.model_name)
@@ -436,10 +566,12 @@ class LLMModel(BaseModel):
         info = await self.model_info()
         return info.context_length
 
-    async def calculate_cost(self, input_tokens: int, output_tokens: int) -> Decimal:
+    async def calculate_cost(
+        self, input_tokens: int, output_tokens: int, cached_tokens: int = 0
+    ) -> Decimal:
         """Calculate the cost for a given number of tokens."""
         info = await self.model_info()
-        return await info.calculate_cost(input_tokens, output_tokens)
+        return info.calculate_cost(input_tokens, output_tokens, cached_tokens)
 
 
 class OpenAILLM(LLMModel):
@@ -470,7 +602,14 @@ class OpenAILLM(LLMModel):
         if info.api_base:
             kwargs["openai_api_base"] = info.api_base
 
-        return ChatOpenAI(**kwargs)
+        return shared_instance(
+            ChatOpenAI,
+            LLMProvider.OPENAI.value,
+            info.api_base,
+            config.openai_api_key,
+            config,
+            **kwargs,
+        )
 
 
 class DeepseekLLM(LLMModel):
@@ -502,7 +641,14 @@ class DeepseekLLM(LLMModel):
         if info.api_base:
             kwargs["openai_api_base"] = info.api_base
 
-        return ChatOpenAI(**kwargs)
+        return shared_instance(
+            ChatOpenAI,
+            LLMProvider.DEEPSEEK.value,
+            info.api_base,
+            config.deepseek_api_key,
+            config,
+            **kwargs,
+        )
 
 
 class XAILLM(LLMModel):
@@ -531,7 +677,9 @@ class XAILLM(LLMModel):
         if info.supports_presence_penalty:
             kwargs["presence_penalty"] = self.presence_penalty
 
-        return ChatXAI(**kwargs)
+        return shared_instance(
+            ChatXAI, LLMProvider.XAI.value, None, config.xai_api_key, config, **kwargs
+        )
 
 
 class EternalLLM(LLMModel):
@@ -563,7 +711,14 @@ class EternalLLM(LLMModel):
         if info.supports_presence_penalty:
             kwargs["presence_penalty"] = self.presence_penalty
 
-        return ChatOpenAI(**kwargs)
+        return shared_instance(
+            ChatOpenAI,
+            LLMProvider.ETERNAL.value,
+            info.api_base,
+            config.eternal_api_key,
+            config,
+            **kwargs,
+        )
 
 
 class ReigentLLM(LLMModel):
@@ -585,7 +740,14 @@ class ReigentLLM(LLMModel):
             },
         }
 
-        return ChatOpenAI(**kwargs)
+        return shared_instance(
+            ChatOpenAI,
+            LLMProvider.REIGENT.value,
+            kwargs["openai_api_base"],
+            config.reigent_api_key,
+            config,
+            **kwargs,
+        )
 
 
 # Factory function to create the appropriate LLM model based on the model name
@@ -640,14 +802,106 @@ def get_available_models() -> Dict[str, LLMModelInfo]:
 
 def get_model_info(model_name: str) -> LLMModelInfo:
     """Get information about a specific model."""
-    if model_name not in AVAILABLE_MODELS:
+    info = _catalogue.get(model_name) or AVAILABLE_MODELS.get(model_name)
+    if not info:
         raise ValueError(f"Unknown model: {model_name}")
-    return AVAILABLE_MODELS[model_name]
+    return info
 
 
 async def get_model_cost(
-    model_name: str, input_tokens: int, output_tokens: int
+    model_name: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0
 ) -> Decimal:
     """Get the cost of a specific model."""
+    await refresh_model_catalogue()
     info = get_model_info(model_name)
-    return await info.calculate_cost(input_tokens, output_tokens)
+    return info.calculate_cost(input_tokens, output_tokens, cached_tokens)
+
+
+async def _catalogue_stamp() -> tuple:
+    """Cheap version stamp of the model table, payment settings and redis key."""
+    async with get_session() as session:
+        row = (
+            await session.execute(
+                select(
+                    select(func.count())
+                    .select_from(LLMModelInfoTable)
+                    .scalar_subquery(),
+                    select(func.max(LLMModelInfoTable.updated_at)).scalar_subquery(),
+                    select(AppSettingTable.updated_at)
+                    .where(AppSettingTable.key == "payment")
+                    .scalar_subquery(),
+                )
+            )
+        ).one()
+    bumped = None
+    try:
+        bumped = await get_redis().get(CATALOGUE_VERSION_KEY)
+    except RuntimeError:
+        pass
+    return (*row, bumped)
+
+
+async def load_model_catalogue() -> None:
+    """Load all model info and the credit price into the process catalogue.
+
+    Models in the database override the built-in AVAILABLE_MODELS.
+    """
+    global _catalogue, _credit_per_usdc, _catalogue_version, _catalogue_checked_at
+    version = await _catalogue_stamp()
+    async with get_session() as session:
+        rows = await session.scalars(select(LLMModelInfoTable))
+        catalogue = dict(AVAILABLE_MODELS)
+        for row in rows:
+            catalogue[row.id] = LLMModelInfo.model_validate(row)
+        setting = await session.scalar(
+            select(AppSettingTable).where(AppSettingTable.key == "payment")
+        )
+    payment = PaymentSettings(**setting.value) if setting else PaymentSettings()
+    _catalogue = catalogue
+    _credit_per_usdc = payment.credit_per_usdc
+    _catalogue_version = version
+    _catalogue_checked_at = time.monotonic()
+    logger.info(f"model catalogue loaded, {len(catalogue)} models")
+
+
+async def refresh_model_catalogue(force: bool = False) -> None:
+    """Reload the catalogue if its version stamp changed.
+
+    The stamp is checked at most once per CATALOGUE_CHECK_INTERVAL, so in the
+    common case this returns without any I/O. If the check fails, the loaded
+    catalogue keeps serving.
+    """
+    global _catalogue_checked_at
+    if (
+        not force
+        and _catalogue
+        and time.monotonic() - _catalogue_checked_at < CATALOGUE_CHECK_INTERVAL
+    ):
+        return
+    async with _catalogue_lock:
+        if (
+            not force
+            and _catalogue
+            and time.monotonic() - _catalogue_checked_at < CATALOGUE_CHECK_INTERVAL
+        ):
+            return
+        if force or not _catalogue:
+            await load_model_catalogue()
+            return
+        try:
+            if await _catalogue_stamp() != _catalogue_version:
+                await load_model_catalogue()
+            else:
+                _catalogue_checked_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"failed to refresh model catalogue: {e}")
+            _catalogue_checked_at = time.monotonic()
+
+
+async def bump_model_catalogue_version() -> None:
+    """Make all processes reload the catalogue at their next check.
+
+    Edits that change updated_at or the number of models are picked up
+    without it, see scripts/reload_model_catalogue.py for the other ones.
+    """
+    await get_redis().incr(CATALOGUE_VERSION_KEY)
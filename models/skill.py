@@ -1,7 +1,7 @@
 import json
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Annotated, Any, Dict, Optional
+from typing import Annotated, Any, Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy import (
@@ -16,6 +16,7 @@ from sqlalchemy import (
     select,
 )
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from models.base import Base
 from models.db import get_session
@@ -54,6 +55,16 @@ class AgentSkillDataCreate(BaseModel):
     key: Annotated[str, Field(description="Key for this specific piece of data")]
     data: Annotated[Dict[str, Any], Field(description="JSON data stored for this key")]
 
+    @staticmethod
+    def _upsert(records: List["AgentSkillDataCreate"]):
+        stmt = pg_insert(AgentSkillDataTable).values(
+            [record.model_dump() for record in records]
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=["agent_id", "skill", "key"],
+            set_={"data": stmt.excluded.data, "updated_at": func.now()},
+        )
+
     async def save(self) -> "AgentSkillData":
         """Save or update skill data.
 
@@ -62,23 +73,24 @@ class AgentSkillDataCreate(BaseModel):
         """
         async with get_session() as db:
             record = await db.scalar(
-                select(AgentSkillDataTable).where(
-                    AgentSkillDataTable.agent_id == self.agent_id,
-                    AgentSkillDataTable.skill == self.skill,
-                    AgentSkillDataTable.key == self.key,
-                )
+                self._upsert([self]).returning(AgentSkillDataTable)
             )
+            saved = AgentSkillData.model_validate(record)
+            await db.commit()
+            return saved
 
-            if record:
-                # Update existing record
-                record.data = self.data
-            else:
-                # Create new record
-                record = AgentSkillDataTable(**self.model_dump())
-            db.add(record)
+    @classmethod
+    async def save_all(cls, records: List["AgentSkillDataCreate"]) -> None:
+        """Save or update many skill data records in one statement.
+
+        Args:
+            records: Records to save, at most one for each key
+        """
+        if not records:
+            return
+        async with get_session() as db:
+            await db.execute(cls._upsert(records))
             await db.commit()
-            await db.refresh(record)
-            return AgentSkillData.model_validate(record)
 
 
 class AgentSkillData(AgentSkillDataCreate):
@@ -174,6 +186,20 @@ class ThreadSkillDataCreate(BaseModel):
     agent_id: Annotated[str, Field(description="ID of the agent that owns this thread")]
     data: Annotated[Dict[str, Any], Field(description="JSON data stored for this key")]
 
+    @staticmethod
+    def _upsert(records: List["ThreadSkillDataCreate"]):
+        stmt = pg_insert(ThreadSkillDataTable).values(
+            [record.model_dump() for record in records]
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=["thread_id", "skill", "key"],
+            set_={
+                "data": stmt.excluded.data,
+                "agent_id": stmt.excluded.agent_id,
+                "updated_at": func.now(),
+            },
+        )
+
     async def save(self) -> "ThreadSkillData":
         """Save or update skill data.
 
@@ -182,24 +208,24 @@ class ThreadSkillDataCreate(BaseModel):
         """
         async with get_session() as db:
             record = await db.scalar(
-                select(ThreadSkillDataTable).where(
-                    ThreadSkillDataTable.thread_id == self.thread_id,
-                    ThreadSkillDataTable.skill == self.skill,
-                    ThreadSkillDataTable.key == self.key,
-                )
+                self._upsert([self]).returning(ThreadSkillDataTable)
             )
+            saved = ThreadSkillData.model_validate(record)
+            await db.commit()
+            return saved
 
-            if record:
-                # Update existing record
-                record.data = self.data
-                record.agent_id = self.agent_id
-            else:
-                # Create new record
-                record = ThreadSkillDataTable(**self.model_dump())
-            db.add(record)
+    @classmethod
+    async def save_all(cls, records: List["ThreadSkillDataCreate"]) -> None:
+        """Save or update many skill data records in one statement.
+
+        Args:
+            records: Records to save, at most one for each key
+        """
+        if not records:
+            return
+        async with get_session() as db:
+            await db.execute(cls._upsert(records))
             await db.commit()
-            await db.refresh(record)
-            return ThreadSkillData.model_validate(record)
 
 
 class ThreadSkillData(ThreadSkillDataCreate):
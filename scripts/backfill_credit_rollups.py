@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily credit rollups from the credit events.
+
+Run it once after upgrading, with the services that post credit events
+stopped. Each UTC day is rebuilt in its own short transaction, which locks
+the rollups table against writes first. A posting that still runs either
+commits before the lock and is read by the rebuild, or waits for it and adds
+its event on top of the rebuilt day, it is never lost or counted twice.
+
+Usage:
+  python -m scripts.backfill_credit_rollups
+"""
+
+import asyncio
+import logging
+from datetime import datetime, time, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.config.config import config
+from models.credit import CreditEventTable, CreditRollupTable, Direction
+from models.db import get_engine, init_db
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Each event counts for its account, and for the accounts it paid a fee to
+ROLLUP_SOURCES = (
+    "SELECT account_id, created_at, event_type, direction, total_amount, "
+    "total_amount AS amount FROM {events}",
+    "SELECT fee_agent_account, created_at, event_type, '{income}', total_amount, "
+    "fee_agent_amount FROM {events} "
+    "WHERE fee_agent_account IS NOT NULL AND fee_agent_amount > 0",
+    "SELECT fee_dev_account, created_at, event_type, '{income}', total_amount, "
+    "fee_dev_amount FROM {events} "
+    "WHERE fee_dev_account IS NOT NULL AND fee_dev_amount > 0",
+)
+
+
+async def main():
+    """
+    Main entry point for the script.
+    """
+    # Initialize the database connection, this also creates the rollups table
+    await init_db(**config.db)
+
+    events = CreditEventTable.__tablename__
+    rollups = CreditRollupTable.__tablename__
+    sources = " UNION ALL ".join(
+        source.format(events=events, income=Direction.INCOME.value)
+        + (" AND " if "WHERE" in source else " WHERE ")
+        + "created_at >= :start AND created_at < :end"
+        for source in ROLLUP_SOURCES
+    )
+    rebuild = text(
+        f"INSERT INTO {rollups} (account_id, day, event_type, direction, "
+        "event_count, total_amount, amount, updated_at) "
+        "SELECT account_id, CAST(:day AS DATE), event_type, direction, "
+        "count(*), sum(total_amount), sum(amount), now() "
+        f"FROM ({sources}) AS e(account_id, created_at, event_type, "
+        "direction, total_amount, amount) "
+        "GROUP BY 1, 3, 4 "
+        # the upsert of CreditEvent.add_rollups, rows of the day are deleted first
+        "ON CONFLICT (account_id, day, event_type, direction) DO UPDATE SET "
+        f"event_count = {rollups}.event_count + excluded.event_count, "
+        f"total_amount = {rollups}.total_amount + excluded.total_amount, "
+        f"amount = {rollups}.amount + excluded.amount, "
+        "updated_at = excluded.updated_at"
+    )
+
+    async with get_engine().connect() as conn:
+        first = await conn.scalar(text(f"SELECT min(created_at) FROM {events}"))
+    if first is None:
+        logger.info("No credit events to roll up")
+        return
+
+    day = first.astimezone(timezone.utc).date()
+    today = datetime.now(timezone.utc).date()
+    total = 0
+    while day <= today:
+        start = datetime.combine(day, time(), tzinfo=timezone.utc)
+        params = {"day": day, "start": start, "end": start + timedelta(days=1)}
+        # one day at a time, so postings wait for one day only
+        async with get_engine().begin() as conn:
+            # blocks add_rollups until the day is rebuilt, but not reads
+            await conn.execute(
+                text(f"LOCK TABLE {rollups} IN SHARE ROW EXCLUSIVE MODE")
+            )
+            await conn.execute(
+                text(f"DELETE FROM {rollups} WHERE day = CAST(:day AS DATE)"),
+                params,
+            )
+            result = await conn.execute(rebuild, params)
+        total += result.rowcount
+        day += timedelta(days=1)
+    logger.info(f"Rebuilt {total} credit rollups")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
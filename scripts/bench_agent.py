@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Offline throughput benchmark of execute_agent, to compare the hot path between commits.
+
+The agent runs for real against local Postgres and Redis (DB_* and REDIS_*
+env, use a throwaway database), only the LLM and the skills are replaced:
+
+- a scripted chat model answers at once, or first calls the bench skills
+- bench skills sleep for a configurable latency and return a fixed output
+
+Scenarios cover cold start, warm chat and tool heavy turns, with payment
+on and off. For each one the report has throughput, p50/p95/p99 latency and
+database statements per turn, plus the memory of a cached agent. The report
+is JSON, pass an earlier report with --compare to print the changes.
+
+Usage:
+    python scripts/bench_agent.py [--turns N] [--concurrency N] [--scenario NAME ...]
+        [--llm-latency S] [--skill-latency S] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from epyxid import XID  # noqa: E402
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.tools import BaseTool  # noqa: E402
+from psycopg import AsyncCursor  # noqa: E402
+from pydantic import BaseModel  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import app.core.engine as engine  # noqa: E402
+import models.llm  # noqa: E402
+from app.config.config import config  # noqa: E402
+from app.core.credit import recharge  # noqa: E402
+from models.agent import AgentCreate  # noqa: E402
+from models.chat import AuthorType, ChatMessageCreate  # noqa: E402
+from models.db import get_engine, get_session, init_db  # noqa: E402
+from models.llm import LLMModel, load_model_catalogue  # noqa: E402
+from models.redis import init_redis  # noqa: E402
+from models.skill import SkillTable  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+BENCH_OWNER = "bench-owner"
+BENCH_SKILL_CATEGORY = "bench"
+BENCH_SKILLS = [f"bench_skill_{i}" for i in range(4)]
+
+
+@dataclass
+class Scenario:
+    """What a benchmark turn does."""
+
+    tool_calls: int = 0
+    payment: bool = False
+    # drop the cached executor before every turn
+    cold: bool = False
+
+
+SCENARIOS = {
+    "cold_start": Scenario(cold=True),
+    "warm_chat": Scenario(),
+    "tool_heavy": Scenario(tool_calls=len(BENCH_SKILLS)),
+    "warm_chat_paid": Scenario(payment=True),
+    "tool_heavy_paid": Scenario(tool_calls=len(BENCH_SKILLS), payment=True),
+}
+
+_create_llm_model = models.llm.create_llm_model
+_load_skill_package = engine.load_skill_package
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that calls the bound bench skills once, then answers."""
+
+    tool_calls: int = 0
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=tools, **kwargs)
+
+    def _generate(self, *args, **kwargs) -> ChatResult:
+        raise NotImplementedError("Use _agenerate instead")
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager=None,
+        tools: Optional[list[dict]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        usage = {
+            "input_tokens": sum(len(str(m.content)) // 4 for m in messages),
+            "output_tokens": 20,
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        names = [
+            t["function"]["name"]
+            for t in tools or []
+            if t["function"]["name"].startswith("bench_")
+        ]
+        if self.tool_calls and names and not isinstance(messages[-1], ToolMessage):
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": name, "args": {}, "id": f"call_{XID()}"}
+                    for name in names[: self.tool_calls]
+                ],
+                usage_metadata=usage,
+            )
+        else:
+            message = AIMessage(content="bench answer", usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class BenchLLMModel(LLMModel):
+    """LLM model creating the scripted chat model, priced as the agent model."""
+
+    tool_calls: int = 0
+    latency: float = 0.0
+
+    async def create_instance(self, config: Any) -> ScriptedChatModel:
+        return ScriptedChatModel(tool_calls=self.tool_calls, latency=self.latency)
+
+
+class BenchSkillInput(BaseModel):
+    """Bench skills take no input."""
+
+
+class BenchSkill(BaseTool):
+    """Skill that waits and returns a fixed output."""
+
+    description: str = "Benchmark skill"
+    args_schema: type[BaseModel] = BenchSkillInput
+    latency: float = 0.0
+    output_size: int = 2000
+
+    def _run(self) -> str:
+        raise NotImplementedError("Use _arun instead")
+
+    async def _arun(self) -> str:
+        await asyncio.sleep(self.latency)
+        return "x" * self.output_size
+
+
+class StatementCounter:
+    """Count the SQL statements of SQLAlchemy and of the checkpointer pool."""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self) -> None:
+        def before_cursor_execute(*args, **kwargs):
+            self.count += 1
+
+        event.listen(
+            get_engine().sync_engine, "before_cursor_execute", before_cursor_execute
+        )
+        counter = self
+        for name in ("execute", "executemany"):
+            original = getattr(AsyncCursor, name)
+
+            async def counted(self, *args, _original=original, **kwargs):
+                counter.count += 1
+                return await _original(self, *args, **kwargs)
+
+            setattr(AsyncCursor, name, counted)
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def _setup(args) -> list[str]:
+    """Create the bench agents, skill prices and owner credits."""
+    async with get_session() as db:
+        for name in BENCH_SKILLS:
+            await db.merge(
+                SkillTable(
+                    name=name,
+                    category=BENCH_SKILL_CATEGORY,
+                    price=Decimal("1"),
+                    price_self_key=Decimal("1"),
+                )
+            )
+        await db.commit()
+    async with get_session() as db:
+        await recharge(db, BENCH_OWNER, Decimal("100000000"), str(XID()), "benchmark")
+        await db.commit()
+    agent_ids = []
+    for _ in range(args.concurrency):
+        agent = await AgentCreate(
+            id=f"bench-{XID()}",
+            name="Bench Agent",
+            owner=BENCH_OWNER,
+            model=args.model,
+            prompt="You are a benchmark agent.",
+            skills={
+                BENCH_SKILL_CATEGORY: {
+                    "enabled": True,
+                    "states": {name: "public" for name in BENCH_SKILLS},
+                }
+            },
+        ).create()
+        agent_ids.append(agent.id)
+    return agent_ids
+
+
+def _patch(args, scenario: Scenario) -> None:
+    """Point the engine at the scripted model and the bench skills."""
+
+    def create_llm_model(model_name: str, **kwargs) -> LLMModel:
+        # keep the validation and pricing of the real model
+        _create_llm_model(model_name, **kwargs)
+        return BenchLLMModel(
+            model_name=model_name,
+            tool_calls=scenario.tool_calls,
+            latency=args.llm_latency,
+            **kwargs,
+        )
+
+    async def get_skills(skill_config, is_private, skill_store, **kwargs):
+        return [
+            BenchSkill(
+                name=name,
+                latency=args.skill_latency,
+                output_size=args.skill_output_size,
+            )
+            for name in BENCH_SKILLS
+        ]
+
+    def load_skill_package(name: str):
+        if name == BENCH_SKILL_CATEGORY:
+            return SimpleNamespace(get_skills=get_skills)
+        return _load_skill_package(name)
+
+    models.llm.create_llm_model = create_llm_model
+    engine.load_skill_package = load_skill_package
+    config.payment_enabled = scenario.payment
+
+
+def _drop_cached_agents() -> None:
+    for cache in (
+        engine._agents,
+        engine._private_agents,
+        engine._agents_updated,
+        engine._private_agents_updated,
+    ):
+        cache.clear()
+
+
+async def run_scenario(
+    args, name: str, scenario: Scenario, agent_ids: list[str], counter: StatementCounter
+) -> dict:
+    _patch(args, scenario)
+    _drop_cached_agents()
+    if not scenario.cold:
+        # warm up, the cold start has its own scenario
+        for agent_id in agent_ids:
+            await engine.agent_executor(agent_id, True)
+
+    latencies: list[float] = []
+    errors = 0
+    turns = iter(range(args.turns))
+
+    async def worker(agent_id: str):
+        nonlocal errors
+        for _ in turns:
+            if scenario.cold:
+                _drop_cached_agents()
+            message = ChatMessageCreate(
+                id=str(XID()),
+                agent_id=agent_id,
+                chat_id=f"bench-{XID()}",
+                user_id=BENCH_OWNER,
+                author_id=BENCH_OWNER,
+                author_type=AuthorType.WEB,
+                thread_type=AuthorType.WEB,
+                message="hello",
+            )
+            start = time.perf_counter()
+            resp = await engine.execute_agent(message)
+            latencies.append(time.perf_counter() - start)
+            if any(m.author_type == AuthorType.SYSTEM for m in resp):
+                errors += 1
+
+    statements = counter.count
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(agent_id) for agent_id in agent_ids))
+    elapsed = time.perf_counter() - start
+    statements = counter.count - statements
+    return {
+        **asdict(scenario),
+        "turns": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "db_statements_per_turn": statements / len(latencies),
+    }
+
+
+async def measure_agent_memory(args, agent_ids: list[str]) -> float:
+    """Bytes retained by each cached agent executor."""
+    _patch(args, SCENARIOS["tool_heavy"])
+    _drop_cached_agents()
+    # load the shared state (model catalogue, encoders, skill modules) first
+    await engine.initialize_agent(agent_ids[0], True)
+    _drop_cached_agents()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for agent_id in agent_ids:
+        await engine.initialize_agent(agent_id, True)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(agent_ids)
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """Print the relative change of every scenario metric."""
+    print(f"compared with {baseline.get('commit')}:")
+    for name, metrics in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        changes = []
+        for key in ("throughput", "p50", "p95", "p99", "db_statements_per_turn"):
+            if base.get(key):
+                changes.append(f"{key} {(metrics[key] / base[key] - 1) * 100:+.1f}%")
+        print(f"  {name}: {', '.join(changes)}")
+    if baseline.get("memory_per_agent"):
+        change = report["memory_per_agent"] / baseline["memory_per_agent"] - 1
+        print(f"  memory_per_agent: {change * 100:+.1f}%")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200, help="turns per scenario")
+    parser.add_argument(
+        "--concurrency", type=int, default=10, help="agents in parallel"
+    )
+    parser.add_argument(
+        "--scenario", action="append", choices=list(SCENARIOS), help="default all"
+    )
+    parser.add_argument("--model", default="gpt-4o-mini", help="model to price turns")
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--skill-latency", type=float, default=0.0)
+    parser.add_argument("--skill-output-size", type=int, default=2000)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report to compare with")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    await init_db(**config.db)
+    if not config.redis_host:
+        parser.error("REDIS_HOST is required, app settings are read through redis")
+    await init_redis(host=config.redis_host, port=config.redis_port)
+    await load_model_catalogue()
+
+    agent_ids = await _setup(args)
+    counter = StatementCounter()
+    counter.install()
+    scenarios = {}
+    for name in args.scenario or list(SCENARIOS):
+        scenarios[name] = await run_scenario(
+            args, name, SCENARIOS[name], agent_ids, counter
+        )
+        logger.warning(f"{name}: {scenarios[name]}")
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    report = {
+        "commit": commit,
+        "settings": {
+            k: v for k, v in vars(args).items() if k not in ("output", "compare")
+        },
+        "scenarios": scenarios,
+        "memory_per_agent": await measure_agent_memory(args, agent_ids),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Create the model indexes that existing tables are missing.
+
+safe_migrate creates indexes only together with new tables, a plain
+CREATE INDEX on a large table like chat_messages or credit_events would block
+its writes during a deploy. This script builds the missing indexes with
+CREATE INDEX CONCURRENTLY, outside of a transaction, so the services can keep
+running. Partitioned tables build the index on each partition and attach it.
+
+An index whose columns changed in the model but kept its name is reported,
+with --rebuild it is dropped and built again, queries lose it meanwhile.
+
+Usage:
+  python -m scripts.create_indexes [--rebuild]
+"""
+
+import argparse
+import asyncio
+import logging
+
+# import the models, so their tables are in the metadata
+import models.agent  # noqa: F401
+import models.app_setting  # noqa: F401
+import models.chat  # noqa: F401
+import models.checkpoint  # noqa: F401
+import models.credit  # noqa: F401
+import models.llm  # noqa: F401
+import models.skill  # noqa: F401
+from app.config.config import config
+from models.base import Base
+from models.db import get_engine, init_db
+from models.db_mig import create_index
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+async def main(rebuild: bool):
+    """
+    Main entry point for the script.
+    """
+    # Initialize the database connection, this also creates missing tables
+    await init_db(**config.db)
+
+    async with get_engine().connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in Base.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                try:
+                    await create_index(conn, index, rebuild=rebuild)
+                except Exception as e:
+                    logger.error(f"Failed to create index {index.name}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="drop and build again the indexes that differ from the model",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.rebuild))
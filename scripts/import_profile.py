@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Report the import time of the process entrypoints, to track startup regressions.
+
+Each entrypoint module is imported in a fresh interpreter with `-X importtime`,
+and the slowest modules by cumulative time are printed. Skill packages are
+loaded lazily, so they should not show up here; the script also imports every
+skill package on its own to see what an agent pays when it first enables one.
+
+Usage:
+    python scripts/import_profile.py [--top N] [--skills] [module ...]
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules imported at startup by the api, telegram, twitter and autonomous processes
+ENTRYPOINTS = [
+    "app.api",
+    "app.entrypoints.tg",
+    "app.twitter",
+    "app.autonomous",
+]
+
+
+def profile(module: str) -> tuple[float, list[tuple[int, str]]]:
+    """Import a module in a fresh interpreter.
+
+    Returns:
+        The total import time in seconds and the (cumulative us, module) list
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        entries.append((int(parts[1]), parts[2].rstrip()))
+    total = max((us for us, name in entries if name.strip() == module), default=0)
+    return total / 1e6, sorted(entries, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=ENTRYPOINTS)
+    parser.add_argument("--top", type=int, default=15, help="modules to list")
+    parser.add_argument(
+        "--skills", action="store_true", help="also profile every skill package"
+    )
+    args = parser.parse_args()
+
+    modules = list(args.modules)
+    if args.skills:
+        sys.path.insert(0, str(PROJECT_ROOT))
+        from skills import __all__ as skill_categories
+
+        modules += [f"skills.{name}" for name in skill_categories]
+
+    failed = False
+    for module in modules:
+        try:
+            total, entries = profile(module)
+        except RuntimeError as e:
+            print(f"{module}: import failed, {e}")
+            failed = True
+            continue
+        print(f"{module}: {total:.3f}s")
+        for us, name in entries[: args.top]:
+            print(f"  {us / 1e6:8.3f}s {name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Convert the append-only tables into tables partitioned by month.
+
+chat_messages, credit_events and credit_transactions are created partitioned
+on new databases. On existing databases each table is renamed to
+<table>_legacy and attached as the partition of all rows before next month,
+then the monthly partitions are created. Attaching scans the old table and
+builds its new primary key while holding an exclusive lock, so stop the
+services first. Indexes added to the models later are created by
+scripts/create_indexes.py.
+
+Usage:
+  python -m scripts.partition_tables
+"""
+
+import asyncio
+import logging
+
+from app.config.config import config
+from models.chat import ChatMessageTable  # noqa: F401
+from models.credit import CreditEventTable
+from models.db import get_engine, init_db
+from models.db_mig import (
+    backfill_upstreams,
+    is_partitioned,
+    partition_table,
+    partitioned_tables,
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """
+    Main entry point for the script.
+    """
+    # Initialize the database connection, this also creates missing tables
+    await init_db(**config.db)
+
+    for table in partitioned_tables():
+        async with get_engine().begin() as conn:
+            if await is_partitioned(conn, table.name):
+                logger.info(f"Table {table.name} is already partitioned")
+                continue
+            logger.info(f"Partitioning table {table.name}")
+            await partition_table(conn, table)
+            if table.name == CreditEventTable.__tablename__:
+                await backfill_upstreams(conn)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Make every process reload its model catalogue.
+
+Processes reload the catalogue on their own when a row of llm_models or the
+payment settings gets a new updated_at, or when models are added or removed.
+Run this after editing model prices with SQL that leaves updated_at alone.
+Each process picks the change up within CATALOGUE_CHECK_INTERVAL seconds of
+its next model lookup.
+
+Usage:
+  python -m scripts.reload_model_catalogue
+"""
+
+import asyncio
+import logging
+
+from app.config.config import config
+from models.llm import bump_model_catalogue_version
+from models.redis import init_redis
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """
+    Main entry point for the script.
+    """
+    if not config.redis_host:
+        raise SystemExit("REDIS_HOST is required, the catalogue version is in redis")
+    await init_redis(host=config.redis_host, port=config.redis_port)
+    await bump_model_catalogue_version()
+    logger.info("Model catalogue version bumped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,52 @@
+import importlib
+import logging
 import os
 import pkgutil
+import re
+import time
+from types import ModuleType
+
+logger = logging.getLogger(__name__)
 
 # Get the directory containing this __init__.py file
 package_dir = os.path.dirname(__file__)
 
-# Discover all modules in the skills directory
+
+def _is_skill_package(name: str) -> bool:
+    """Whether a package defines a skill loader, read from source without importing it."""
+    try:
+        with open(os.path.join(package_dir, name, "__init__.py")) as f:
+            source = f.read()
+    except OSError:
+        return False
+    return (
+        re.search(rf"^(async )?def get_(skills|{name}_skill)\(", source, re.M)
+        is not None
+    )
+
+
+# Discover the skill packages in the skills directory, helper modules are left out
 __all__ = [
     name
-    for _, name, _ in pkgutil.iter_modules([package_dir])
-    if not name.startswith("_") and not name == "base"
+    for _, name, is_pkg in pkgutil.iter_modules([package_dir])
+    if is_pkg and not name.startswith("_") and _is_skill_package(name)
 ]
+
+# Seconds spent importing each skill package, recorded at first use and
+# reported on /health
+import_times: dict[str, float] = {}
+
+
+def load_skill_package(name: str) -> ModuleType:
+    """Import a skill package when an agent first uses it.
+
+    Skill packages pull in heavy SDKs, so none of them is imported at process
+    startup. Later calls are served from the module cache.
+    """
+    module_name = f"skills.{name}"
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if name not in import_times:
+        import_times[name] = time.perf_counter() - start
+        logger.info(f"skill package {name} imported in {import_times[name]:.3f}s")
+    return module
@@ -1,7 +1,11 @@
+import asyncio
+import functools
 import logging
+import time
+from contextvars import ContextVar
 from typing import Any, Callable, Dict, Literal, NotRequired, Optional, TypedDict, Union
 
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, ensure_config
 from langchain_core.tools import BaseTool
 from langchain_core.tools.base import ToolException
 from pydantic import (
@@ -15,9 +19,55 @@ from abstracts.exception import RateLimitExceeded
 from abstracts.skill import SkillStoreABC
 from models.agent import Agent
 from models.redis import get_redis
+from skills.circuit_breaker import CircuitSettings, guarded_call
+from skills.hedging import hedging
 
 SkillState = Literal["disabled", "public", "private"]
 
+# Set while a skill runs as a tool, only tool calls are guarded
+_tool_call: ContextVar[bool] = ContextVar("skill_tool_call", default=False)
+
+
+def _guarded(arun: Callable) -> Callable:
+    """Wrap a skill _arun, so tool calls are guarded.
+
+    Tool calls go through the circuit breaker of the skill upstream, and are
+    cancelled at the skill deadline or at the turn deadline, whichever comes
+    first. Their GETs are hedged if the skill allows it. Direct calls of _arun, and nested calls through super(), are not
+    guarded.
+    """
+
+    @functools.wraps(arun)
+    async def wrapper(self, *args, **kwargs):
+        if not _tool_call.get():
+            return await arun(self, *args, **kwargs)
+        timeout = self.deadline
+        turn_deadline = ensure_config().get("configurable", {}).get("deadline")
+        if turn_deadline:
+            timeout = min(timeout, turn_deadline - time.monotonic())
+        if timeout <= 0:
+            raise ToolException("No time left in this turn to call the tool")
+
+        async def call():
+            try:
+                return await asyncio.wait_for(arun(self, *args, **kwargs), timeout)
+            except asyncio.TimeoutError as e:
+                raise ToolException(
+                    f"{self.name} did not finish in {timeout:.0f} seconds"
+                ) from e
+
+        token = _tool_call.set(False)
+        hedge_token = hedging.set(self.hedge)
+        try:
+            return await guarded_call(
+                self.name, self.upstream, self.circuit_settings(), call
+            )
+        finally:
+            hedging.reset(hedge_token)
+            _tool_call.reset(token)
+
+    return wrapper
+
 
 class SkillConfig(TypedDict):
     """Abstract base class for skill configuration."""
@@ -55,11 +105,50 @@ class IntentKitSkill(BaseTool):
     # Logger for the class
     logger: logging.Logger = logging.getLogger(__name__)
 
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        arun = cls.__dict__.get("_arun")
+        if arun is not None:
+            cls._arun = _guarded(arun)
+
+    async def arun(self, *args: Any, **kwargs: Any) -> Any:
+        token = _tool_call.set(True)
+        try:
+            return await super().arun(*args, **kwargs)
+        finally:
+            _tool_call.reset(token)
+
     @property
     def category(self) -> str:
         """Get the category of the skill."""
         raise NotImplementedError
 
+    @property
+    def upstream(self) -> str:
+        """The upstream API of the skill, skills of one upstream share a circuit."""
+        return self.category
+
+    @property
+    def deadline(self) -> float:
+        """Seconds a call of the skill may take before it is cancelled."""
+        return self.skill_store.get_system_config("skill_deadline_seconds")
+
+    @property
+    def hedge(self) -> bool:
+        """Whether slow GETs of the skill may be hedged, see skills/hedging.py."""
+        return False
+
+    def circuit_settings(self) -> CircuitSettings:
+        get = self.skill_store.get_system_config
+        return CircuitSettings(
+            error_rate=get("skill_circuit_error_rate"),
+            min_calls=get("skill_circuit_min_calls"),
+            window=get("skill_circuit_window"),
+            open_seconds=get("skill_circuit_open_seconds"),
+            slow_call_seconds=get("skill_slow_call_seconds"),
+        )
+
     async def user_rate_limit(
         self, user_id: str, limit: int, minutes: int, key: str
     ) -> None:
@@ -0,0 +1,257 @@
+"""Circuit breakers for the upstream APIs of skills.
+
+Every skill call made by an agent is timed per skill and upstream. A call
+fails if the upstream failed it: a transport error, a timeout, or a 5xx
+response, raised or returned as an error result. Tool errors, invalid input
+and user rate limits say nothing about the upstream and are not counted.
+Slow calls are labelled in the histogram only, the deadline of the skill
+cancels calls that are too slow, which counts as a timeout.
+
+When the failure rate of an upstream in the current window reaches the
+threshold, its circuit opens, and calls fail fast with a tool error instead
+of waiting on the upstream. After the open period one probe call at a time
+is let through, and the circuit closes again when a probe succeeds.
+
+The breaker state is kept in redis, so all workers share it. Without redis
+the calls are only timed.
+"""
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+from langchain_core.tools.base import ToolException
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from abstracts.exception import RateLimitExceeded
+from models.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "intentkit:circuit:"
+# How long a tripped circuit is remembered, it is half open once the open key expires
+TRIPPED_TTL = 3600
+
+SKILL_CALL_SECONDS = Histogram(
+    "intentkit_skill_upstream_seconds",
+    "Time of skill calls by upstream and result",
+    ["skill", "upstream", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CIRCUIT_OPEN = Gauge(
+    "intentkit_skill_circuit_open",
+    "1 while the circuit of an upstream is open, as last seen by this worker",
+    ["upstream"],
+    multiprocess_mode="max",
+)
+CIRCUIT_REJECTED = Counter(
+    "intentkit_skill_circuit_rejected",
+    "Skill calls failed fast because the circuit of their upstream is open",
+    ["upstream"],
+)
+
+
+class CircuitOpenError(ToolException):
+    """The upstream of a skill is failing, the call was not made."""
+
+
+@dataclass
+class CircuitSettings:
+    """When the circuit of an upstream opens and for how long."""
+
+    error_rate: float
+    min_calls: int
+    window: int
+    open_seconds: int
+    slow_call_seconds: float
+
+
+def _redis():
+    try:
+        return get_redis()
+    except RuntimeError:
+        return None
+
+
+# Error results of skills that report the status of a failed upstream response
+_SERVER_ERROR_RESULT = re.compile(r"status code 5\d\d\b")
+
+
+def _is_upstream_failure(error: Optional[BaseException]) -> bool:
+    """Whether an exception, or one it was raised from, is a failure of the upstream."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+            return True
+        # httpx and the API SDKs built on it carry the status of the response
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(
+            response, "status_code", None
+        )
+        if isinstance(status, int) and status >= 500:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _is_error_result(result: Any) -> bool:
+    """Skills often catch upstream errors and return them as a result."""
+    if isinstance(result, dict):
+        error = result.get("error")
+    elif isinstance(result, BaseModel):
+        error = getattr(result, "error", None)
+    else:
+        return False
+    return bool(error) and bool(_SERVER_ERROR_RESULT.search(str(error)))
+
+
+async def _allow(upstream: str, settings: CircuitSettings) -> tuple[bool, bool]:
+    """Check the circuit of an upstream.
+
+    Returns:
+        Whether the call may go on, and whether it is the half open probe
+    """
+    redis = _redis()
+    if redis is None:
+        return True, False
+    key = KEY_PREFIX + upstream
+    try:
+        opened, tripped = await redis.mget(f"{key}:open", f"{key}:tripped")
+        if opened:
+            return False, False
+        if not tripped:
+            return True, False
+        probe_ttl = int(settings.slow_call_seconds) + 1
+        if await redis.set(f"{key}:probe", 1, nx=True, ex=probe_ttl):
+            return True, True
+        return False, False
+    except RedisError as e:
+        logger.info(f"Redis error in circuit breaker of {upstream}: {e}")
+        return True, False
+
+
+async def _open(redis, upstream: str, settings: CircuitSettings) -> None:
+    key = KEY_PREFIX + upstream
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(f"{key}:open", 1, ex=settings.open_seconds)
+        pipe.set(f"{key}:tripped", 1, ex=TRIPPED_TTL)
+        pipe.delete(f"{key}:probe")
+        await pipe.execute()
+    CIRCUIT_OPEN.labels(upstream=upstream).set(1)
+    logger.warning(f"circuit of {upstream} opened for {settings.open_seconds}s")
+
+
+async def _record(
+    upstream: str, settings: CircuitSettings, failed: bool, probe: bool
+) -> None:
+    redis = _redis()
+    if redis is None:
+        return
+    key = KEY_PREFIX + upstream
+    try:
+        if probe:
+            if failed:
+                await _open(redis, upstream, settings)
+            else:
+                await redis.delete(f"{key}:tripped", f"{key}:probe")
+                CIRCUIT_OPEN.labels(upstream=upstream).set(0)
+                logger.info(f"circuit of {upstream} closed")
+            return
+        # the call was let through a closed circuit, other workers may have
+        # closed it since this one saw it open
+        CIRCUIT_OPEN.labels(upstream=upstream).set(0)
+        window = int(time.time() // settings.window)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.incr(f"{key}:calls:{window}")
+            pipe.expire(f"{key}:calls:{window}", settings.window * 2)
+            if failed:
+                pipe.incr(f"{key}:failures:{window}")
+                pipe.expire(f"{key}:failures:{window}", settings.window * 2)
+            results = await pipe.execute()
+        if not failed:
+            return
+        calls, failures = results[0], results[2]
+        if calls >= settings.min_calls and failures / calls >= settings.error_rate:
+            await _open(redis, upstream, settings)
+    except RedisError as e:
+        logger.info(f"Redis error in circuit breaker of {upstream}: {e}")
+
+
+async def _release_probe(upstream: str) -> None:
+    """Let the next call probe, this one said nothing about the upstream."""
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        await redis.delete(f"{KEY_PREFIX}{upstream}:probe")
+    except RedisError as e:
+        logger.info(f"Redis error in circuit breaker of {upstream}: {e}")
+
+
+async def guarded_call(
+    skill: str,
+    upstream: str,
+    settings: CircuitSettings,
+    call: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Make a skill call through the circuit of its upstream.
+
+    Raises:
+        CircuitOpenError: If the circuit is open, the call is not made
+    """
+    allowed, probe = await _allow(upstream, settings)
+    if not allowed:
+        CIRCUIT_OPEN.labels(upstream=upstream).set(1)
+        CIRCUIT_REJECTED.labels(upstream=upstream).inc()
+        raise CircuitOpenError(
+            f"{upstream} is temporarily unavailable, please try again later"
+        )
+    start = time.perf_counter()
+    status: Optional[str] = None
+    try:
+        result = await call()
+    except RateLimitExceeded:
+        # the user is limited, not the upstream
+        status = "rate_limited"
+        raise
+    except Exception as e:
+        # tool errors and invalid input are passed through like rate limits
+        status = "error" if _is_upstream_failure(e) else "tool_error"
+        raise
+    else:
+        if _is_error_result(result):
+            status = "error"
+        elif time.perf_counter() - start >= settings.slow_call_seconds:
+            status = "slow"
+        else:
+            status = "success"
+        return result
+    finally:
+        if status is not None:
+            SKILL_CALL_SECONDS.labels(
+                skill=skill, upstream=upstream, status=status
+            ).observe(time.perf_counter() - start)
+            if status in ("rate_limited", "tool_error"):
+                if probe:
+                    await _release_probe(upstream)
+            else:
+                await _record(upstream, settings, status == "error", probe)
+
+
+async def circuit_states() -> dict[str, str]:
+    """Upstreams whose circuit is open or half open, for operators."""
+    redis = _redis()
+    if redis is None:
+        return {}
+    states = {}
+    async for key in redis.scan_iter(match=f"{KEY_PREFIX}*:tripped"):
+        upstream = key[len(KEY_PREFIX) : -len(":tripped")]
+        opened = await redis.exists(f"{KEY_PREFIX}{upstream}:open")
+        states[upstream] = "open" if opened else "half_open"
+    return states
@@ -36,6 +36,10 @@ class CryptoCompareBaseTool(IntentKitSkill):
     def category(self) -> str:
         return "cryptocompare"
 
+    @property
+    def upstream(self) -> str:
+        return "min-api.cryptocompare.com"
+
     async def check_rate_limit(
         self, agent_id: str, max_requests: int = 1, interval: int = 15
     ) -> None:
@@ -5,6 +5,8 @@ from typing import List, Optional
 
 import httpx
 
+from skills.hedging import hedged_get
+
 DEFILLAMA_TVL_BASE_URL = "https://api.llama.fi"
 DEFILLAMA_COINS_BASE_URL = "https://coins.llama.fi"
 DEFILLAMA_STABLECOINS_BASE_URL = "https://stablecoins.llama.fi"
@@ -18,7 +20,7 @@ async def fetch_protocols() -> dict:
     """List all protocols on defillama along with their TVL."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/protocols"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -28,7 +30,7 @@ async def fetch_protocol(protocol: str) -> dict:
     """Get historical TVL of a protocol and breakdowns by token and chain."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/protocol/{protocol}"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -38,7 +40,7 @@ async def fetch_historical_tvl() -> dict:
     """Get historical TVL of DeFi on all chains."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/v2/historicalChainTvl"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -48,7 +50,7 @@ async def fetch_chain_historical_tvl(chain: str) -> dict:
     """Get historical TVL of a specific chain."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/v2/historicalChainTvl/{chain}"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -58,7 +60,7 @@ async def fetch_protocol_current_tvl(protocol: str) -> dict:
     """Get current TVL of a protocol."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/tvl/{protocol}"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -68,7 +70,7 @@ async def fetch_chains() -> dict:
     """Get current TVL of all chains."""
     url = f"{DEFILLAMA_TVL_BASE_URL}/v2/chains"
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -81,7 +83,7 @@ async def fetch_current_prices(coins: List[str]) -> dict:
     url = f"{DEFILLAMA_COINS_BASE_URL}/prices/current/{coins_str}?searchWidth=4h"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -93,7 +95,7 @@ async def fetch_historical_prices(timestamp: int, coins: List[str]) -> dict:
     url = f"{DEFILLAMA_COINS_BASE_URL}/prices/historical/{timestamp}/{coins_str}?searchWidth=4h"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -104,8 +106,8 @@ async def fetch_batch_historical_prices(coins_timestamps: dict) -> dict:
     url = f"{DEFILLAMA_COINS_BASE_URL}/batchHistorical"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(
-            url, params={"coins": coins_timestamps, "searchWidth": "600"}
+        response = await hedged_get(
+            client, url, params={"coins": coins_timestamps, "searchWidth": "600"}
         )
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
@@ -121,7 +123,7 @@ async def fetch_price_chart(coins: List[str]) -> dict:
     params = {"start": start_time, "span": 10, "period": "2d", "searchWidth": "600"}
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -136,7 +138,7 @@ async def fetch_price_percentage(coins: List[str]) -> dict:
     params = {"timestamp": current_timestamp, "lookForward": "false", "period": "24h"}
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -148,7 +150,7 @@ async def fetch_first_price(coins: List[str]) -> dict:
     url = f"{DEFILLAMA_COINS_BASE_URL}/prices/first/{coins_str}"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -160,7 +162,7 @@ async def fetch_block(chain: str) -> dict:
     url = f"{DEFILLAMA_COINS_BASE_URL}/block/{chain}/{current_timestamp}"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -173,7 +175,7 @@ async def fetch_stablecoins() -> dict:
     params = {"includePrices": "true"}
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -190,7 +192,7 @@ async def fetch_stablecoin_charts(
     url = f"{base_url}{endpoint}?stablecoin={stablecoin_id}"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -201,7 +203,7 @@ async def fetch_stablecoin_chains() -> dict:
     url = f"{DEFILLAMA_STABLECOINS_BASE_URL}/stablecoinchains"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -216,7 +218,7 @@ async def fetch_stablecoin_prices() -> dict:
     url = f"{DEFILLAMA_STABLECOINS_BASE_URL}/stablecoinprices"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -228,7 +230,7 @@ async def fetch_pools() -> dict:
     url = f"{DEFILLAMA_YIELDS_BASE_URL}/pools"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -239,7 +241,7 @@ async def fetch_pool_chart(pool_id: str) -> dict:
     url = f"{DEFILLAMA_YIELDS_BASE_URL}/chart/{pool_id}"
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+        response = await hedged_get(client, url)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -256,7 +258,7 @@ async def fetch_dex_overview() -> dict:
     }
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -272,7 +274,7 @@ async def fetch_dex_summary(protocol: str) -> dict:
     }
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -288,7 +290,7 @@ async def fetch_options_overview() -> dict:
     }
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
@@ -309,7 +311,7 @@ async def fetch_fees_overview() -> dict:
     }
 
     async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
+        response = await hedged_get(client, url, params=params)
     if response.status_code != 200:
         return {"error": f"API returned status code {response.status_code}"}
     return response.json()
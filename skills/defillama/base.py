@@ -38,6 +38,15 @@ class DefiLlamaBaseTool(IntentKitSkill):
     def category(self) -> str:
         return "defillama"
 
+    @property
+    def deadline(self) -> float:
+        return 20
+
+    @property
+    def hedge(self) -> bool:
+        # public API, not billed or limited by request
+        return True
+
     async def check_rate_limit(
         self, context: SkillContext, max_requests: int = 30, interval: int = 5
     ) -> tuple[bool, str | None]:
@@ -26,3 +26,7 @@ class ElfaBaseTool(IntentKitSkill):
     @property
     def category(self) -> str:
         return "elfa"
+
+    @property
+    def deadline(self) -> float:
+        return 20
@@ -42,3 +42,7 @@ class EnsoBaseTool(IntentKitSkill):
     @property
     def category(self) -> str:
         return "enso"
+
+    @property
+    def upstream(self) -> str:
+        return "api.enso.finance"
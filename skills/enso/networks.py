@@ -90,6 +90,7 @@ class EnsoGetNetworks(EnsoBaseTool):
                     "enso_get_networks",
                     "networks",
                     networks_memory,
+                    buffer=True,
                 )
 
                 return EnsoGetNetworksOutput(res=networks)
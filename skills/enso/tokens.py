@@ -208,6 +208,7 @@ class EnsoGetTokens(EnsoBaseTool):
                     "enso_get_tokens",
                     "decimals",
                     token_decimals,
+                    buffer=True,
                 )
 
                 return res
@@ -0,0 +1,109 @@
+"""Hedged GET requests for skill upstreams with a long latency tail.
+
+The latency of recent requests is tracked per upstream host. When a request
+takes longer than the p95 of its upstream, a second identical request is
+sent, and the first response that is not a server error wins. Until an
+upstream has enough samples, requests are not hedged.
+
+A hedge can double the requests sent to an upstream, so it is only done for
+skills whose category sets the hedge property, as a tool call. Only
+idempotent GETs of upstreams that do not bill or limit by request should be
+hedged.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+
+import httpx
+from prometheus_client import Counter
+
+# Recent request latencies kept per upstream, and needed before hedging
+HEDGE_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+# Never hedge sooner than this, in seconds
+HEDGE_MIN_DELAY = 0.2
+
+HEDGED_REQUESTS = Counter(
+    "intentkit_skill_hedged_requests",
+    "Skill GET requests that sent a second request after the p95 delay",
+    ["upstream"],
+)
+
+# Set while a skill of a category that allows hedging runs as a tool
+hedging: ContextVar[bool] = ContextVar("skill_hedging", default=False)
+
+_latencies: dict[str, deque[float]] = {}
+
+
+def hedge_delay(upstream: str) -> float | None:
+    """The p95 latency of an upstream, None if it has too few samples."""
+    samples = _latencies.get(upstream)
+    if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return max(HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+
+async def _get(
+    client: httpx.AsyncClient,
+    upstream: str,
+    url: str,
+    sample_cancelled: bool,
+    **kwargs,
+) -> httpx.Response:
+    """One GET, sampled from its own start whether it succeeds or fails."""
+    start = time.perf_counter()
+    cancelled = False
+    try:
+        return await client.get(url, **kwargs)
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        # a first request cancelled because the hedge won took at least this
+        # long, a cancelled hedge says nothing about the upstream
+        if not cancelled or sample_cancelled:
+            _latencies.setdefault(upstream, deque(maxlen=HEDGE_SAMPLES)).append(
+                time.perf_counter() - start
+            )
+
+
+def _accepted(task: asyncio.Task) -> bool:
+    return task.exception() is None and task.result().status_code < 500
+
+
+async def _first_accepted(tasks: set[asyncio.Task]) -> httpx.Response:
+    """The first response that is not a server error.
+
+    If every request failed, the outcome of the last one is returned or raised.
+    """
+    while True:
+        done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if _accepted(task):
+                return task.result()
+        if not tasks:
+            return done.pop().result()
+
+
+async def hedged_get(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """GET a url, hedging with a second request after the upstream p95 delay."""
+    upstream = httpx.URL(url).host
+    delay = hedge_delay(upstream) if hedging.get() else None
+    first = asyncio.ensure_future(_get(client, upstream, url, True, **kwargs))
+    tasks = {first}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                HEDGED_REQUESTS.labels(upstream=upstream).inc()
+                tasks.add(
+                    asyncio.ensure_future(_get(client, upstream, url, False, **kwargs))
+                )
+        return await _first_accepted(tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
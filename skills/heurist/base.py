@@ -1,11 +1,13 @@
 """Base class for Heurist AI skills."""
 
+from dataclasses import replace
 from typing import Type
 
 from pydantic import BaseModel, Field
 
 from abstracts.skill import SkillStoreABC
 from skills.base import IntentKitSkill
+from skills.circuit_breaker import CircuitSettings
 
 
 class HeuristBaseTool(IntentKitSkill):
@@ -24,3 +26,11 @@ class HeuristBaseTool(IntentKitSkill):
     @property
     def category(self) -> str:
         return "heurist"
+
+    @property
+    def upstream(self) -> str:
+        return "sequencer.heurist.xyz"
+
+    def circuit_settings(self) -> CircuitSettings:
+        # image generation is slow even when the upstream is healthy
+        return replace(super().circuit_settings(), slow_call_seconds=120)
@@ -43,6 +43,10 @@ class WalletBaseTool(IntentKitSkill):
     def category(self) -> str:
         return "moralis"
 
+    @property
+    def upstream(self) -> str:
+        return "deep-index.moralis.io"
+
     def _get_chain_name(self, chain_id: int) -> str:
         """Convert chain ID to chain name for API calls.
 
@@ -93,6 +93,10 @@ class FetchSolanaPortfolio(WalletBaseTool):
     )
     args_schema: Type[BaseModel] = SolanaPortfolioInput
 
+    @property
+    def upstream(self) -> str:
+        return "solana-gateway.moralis.io"
+
     async def _arun(
         self,
         address: str,
@@ -19,3 +19,7 @@ class TavilyBaseTool(IntentKitSkill):
     @property
     def category(self) -> str:
         return "tavily"
+
+    @property
+    def deadline(self) -> float:
+        return 20
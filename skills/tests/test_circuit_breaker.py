@@ -0,0 +1,193 @@
+"""Tests for the circuit breakers of skill upstreams."""
+
+import unittest
+from unittest.mock import patch
+
+import httpx
+from langchain_core.tools.base import ToolException
+from prometheus_client import REGISTRY
+
+from abstracts.exception import RateLimitExceeded
+from skills.circuit_breaker import (
+    CircuitOpenError,
+    CircuitSettings,
+    circuit_states,
+    guarded_call,
+)
+
+SETTINGS = CircuitSettings(
+    error_rate=0.5, min_calls=4, window=60, open_seconds=30, slow_call_seconds=10
+)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+
+        return queue
+
+    async def execute(self):
+        return [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+class FakeRedis:
+    """The redis commands the circuit breaker uses, kept in a dict, without expiry."""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def scan_iter(self, match):
+        suffix = match.split("*")[-1]
+        for key in list(self.data):
+            if key.startswith(match.split("*")[0]) and key.endswith(suffix):
+                yield key
+
+
+def _server_error(status: int = 503) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://upstream.test")
+    response = httpx.Response(status, request=request)
+    return httpx.HTTPStatusError("failed", request=request, response=response)
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+    """Test what counts as a failure and the states of the circuit."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch("skills.circuit_breaker.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upstream = f"upstream-{self._testMethodName}"
+
+    async def call(self, error=None, result="ok"):
+        async def run():
+            if error is not None:
+                raise error
+            return result
+
+        return await guarded_call("skill", self.upstream, SETTINGS, run)
+
+    async def fail(self, error):
+        with self.assertRaises(type(error)):
+            await self.call(error)
+
+    def gauge(self):
+        return REGISTRY.get_sample_value(
+            "intentkit_skill_circuit_open", {"upstream": self.upstream}
+        )
+
+    async def test_upstream_failures_open_the_circuit(self):
+        """Transport errors, timeouts and 5xx open the circuit at the error rate."""
+        await self.call()
+        await self.fail(httpx.ConnectError("refused"))
+        await self.fail(_server_error(502))
+        self.assertEqual(await circuit_states(), {})
+        await self.fail(TimeoutError())
+        self.assertEqual(await circuit_states(), {self.upstream: "open"})
+        self.assertEqual(self.gauge(), 1)
+        with self.assertRaises(CircuitOpenError):
+            await self.call()
+
+    async def test_tool_errors_are_not_counted(self):
+        """Tool errors, invalid input, 4xx and user rate limits pass through."""
+        for _ in range(3):
+            await self.fail(ToolException("no such token"))
+            await self.fail(ValueError("invalid address"))
+            await self.fail(_server_error(404))
+            await self.fail(RateLimitExceeded())
+        self.assertEqual(await circuit_states(), {})
+        self.assertEqual(await self.call(), "ok")
+
+    async def test_tool_error_raised_from_a_timeout_is_counted(self):
+        """The deadline turns a timeout into a tool error, it still counts."""
+        for _ in range(4):
+            try:
+                raise TimeoutError()
+            except TimeoutError as e:
+                error = ToolException("skill did not finish")
+                error.__cause__ = e
+            await self.fail(error)
+        self.assertEqual(await circuit_states(), {self.upstream: "open"})
+
+    async def test_error_results(self):
+        """Only error results reporting a 5xx response are counted."""
+        for _ in range(4):
+            await self.call(result={"error": "Token not found"})
+        self.assertEqual(await circuit_states(), {})
+        for _ in range(4):
+            await self.call(result={"error": "API returned status code 503"})
+        self.assertEqual(await circuit_states(), {self.upstream: "open"})
+
+    async def test_half_open_probe(self):
+        """After the open period one probe runs, it closes or reopens the circuit."""
+        for _ in range(4):
+            await self.fail(httpx.ReadTimeout("timed out"))
+        key = f"intentkit:circuit:{self.upstream}"
+
+        # the open period is over
+        await self.redis.delete(f"{key}:open")
+        self.assertEqual(await circuit_states(), {self.upstream: "half_open"})
+        await self.fail(_server_error())
+        self.assertEqual(await circuit_states(), {self.upstream: "open"})
+        self.assertEqual(self.gauge(), 1)
+
+        await self.redis.delete(f"{key}:open")
+        # a tool error says nothing about the upstream, the next call probes
+        await self.fail(ToolException("bad input"))
+        self.assertEqual(await circuit_states(), {self.upstream: "half_open"})
+        self.assertEqual(await self.call(), "ok")
+        self.assertEqual(await circuit_states(), {})
+        self.assertEqual(self.gauge(), 0)
+
+    async def test_gauge_follows_circuits_closed_elsewhere(self):
+        """A worker that saw the circuit open resets its gauge on the next call."""
+        for _ in range(4):
+            await self.fail(httpx.ConnectError("refused"))
+        self.assertEqual(self.gauge(), 1)
+        # another worker ran the successful probe
+        self.redis.data.clear()
+        await self.call()
+        self.assertEqual(self.gauge(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for hedged GET requests."""
+
+import asyncio
+import unittest
+from collections import deque
+
+import httpx
+from prometheus_client import REGISTRY
+
+from skills import hedging
+from skills.hedging import HEDGE_MIN_SAMPLES, hedge_delay, hedged_get
+
+
+class TestHedgedGet(unittest.IsolatedAsyncioTestCase):
+    """Test when a second request is sent, which response wins, and sampling."""
+
+    def setUp(self):
+        hedging._latencies.clear()
+        self.requests = 0
+        # status and delay of each request, in the order they are sent
+        self.replies: list[tuple[int, float]] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        status, delay = self.replies[self.requests]
+        self.requests += 1
+        await asyncio.sleep(delay)
+        return httpx.Response(status, json={"n": self.requests})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+    def warm_up(self, host: str = "upstream.test", latency: float = 0.01):
+        hedging._latencies[host] = deque(
+            [latency] * HEDGE_MIN_SAMPLES, maxlen=hedging.HEDGE_SAMPLES
+        )
+
+    def hedged(self) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                "intentkit_skill_hedged_requests_total", {"upstream": "upstream.test"}
+            )
+            or 0
+        )
+
+    async def test_not_hedged_unless_the_skill_allows_it(self):
+        """Without the hedging flag a slow request is not hedged."""
+        self.warm_up()
+        self.replies = [(200, 0.3), (200, 0)]
+        async with self.client() as client:
+            response = await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.requests, 1)
+
+    async def test_not_hedged_without_enough_samples(self):
+        """An upstream needs samples before its requests are hedged."""
+        hedging.hedging.set(True)
+        self.replies = [(200, 0.3), (200, 0)]
+        async with self.client() as client:
+            await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(self.requests, 1)
+        self.assertIsNone(hedge_delay("upstream.test"))
+
+    async def test_slow_request_is_hedged(self):
+        """A request slower than the p95 gets a second one, the first reply wins."""
+        hedging.hedging.set(True)
+        self.warm_up()
+        before = self.hedged()
+        self.replies = [(200, 1), (200, 0)]
+        async with self.client() as client:
+            response = await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(response.json(), {"n": 2})
+        self.assertEqual(self.hedged() - before, 1)
+
+    async def test_server_error_does_not_win(self):
+        """A 5xx reply of the hedge does not beat a slower good reply."""
+        hedging.hedging.set(True)
+        self.warm_up()
+        self.replies = [(200, 0.4), (503, 0)]
+        async with self.client() as client:
+            response = await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(response.status_code, 200)
+
+    async def test_server_error_is_returned_if_nothing_better(self):
+        """When every request fails, the failed reply is returned."""
+        hedging.hedging.set(True)
+        self.warm_up()
+        self.replies = [(502, 0.4), (503, 0)]
+        async with self.client() as client:
+            response = await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(response.status_code, 502)
+
+    async def test_failures_and_requests_are_sampled_from_their_start(self):
+        """Failed requests are sampled, a hedge is timed from its own start."""
+        self.replies = [(500, 0.05)]
+        async with self.client() as client:
+            await hedged_get(client, "https://upstream.test/a")
+        self.assertEqual(len(hedging._latencies["upstream.test"]), 1)
+
+        hedging.hedging.set(True)
+        self.warm_up()
+        self.requests = 0
+        self.replies = [(200, 1), (200, 0)]
+        async with self.client() as client:
+            await hedged_get(client, "https://upstream.test/a")
+        # let the cancelled first request record its sample
+        await asyncio.sleep(0.05)
+        samples = list(hedging._latencies["upstream.test"])[HEDGE_MIN_SAMPLES:]
+        hedge_sample, first_sample = samples
+        # the hedge was sent after the p95 delay, its sample leaves it out
+        self.assertLess(hedge_sample, hedging.HEDGE_MIN_DELAY)
+        self.assertGreaterEqual(first_sample, hedging.HEDGE_MIN_DELAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 S3 utility module for storing and retrieving images from AWS S3.
 """
 
+import asyncio
 import logging
 from io import BytesIO
 from typing import Optional
@@ -172,3 +173,44 @@ async def store_image_bytes(
     except ClientError as e:
         logger.error(f"Failed to upload image bytes to S3: {str(e)}")
         raise
+
+
+def s3_ready() -> bool:
+    """Whether S3 is initialized."""
+    return bool(_client and _bucket and _prefix)
+
+
+async def store_file(path: str, key: str, content_type: str) -> str:
+    """
+    Store a local file to S3, it is not served by the CDN.
+
+    Args:
+        path: Path of the local file
+        key: Key to store the file under (without prefix)
+        content_type: Content type of the file
+
+    Returns:
+        str: The S3 key of the stored file
+
+    Raises:
+        ClientError: If the upload fails
+        ValueError: If S3 is not initialized
+    """
+    if not s3_ready():
+        raise ValueError("S3 is not initialized")
+
+    prefixed_key = f"{_prefix}{key}"
+    try:
+        # upload_file blocks, and archives can be large
+        await asyncio.to_thread(
+            _client.upload_file,
+            path,
+            _bucket,
+            prefixed_key,
+            ExtraArgs={"ContentType": content_type},
+        )
+    except ClientError as e:
+        logger.error(f"Failed to upload {path} to S3: {str(e)}")
+        raise
+    logger.info(f"{path} is uploaded to s3://{_bucket}/{prefixed_key}")
+    return prefixed_key